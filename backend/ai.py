@@ -1,55 +1,315 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, ChatSession
 from google.cloud import storage
 import mimetypes
-from typing import Dict, Tuple, List, Set, Optional, Union, Any, LiteralString
+from typing import Dict, Tuple, List, Set, Optional, Union, Any, LiteralString, NamedTuple, AsyncIterator
 import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import hashlib
 import os
 from dotenv import load_dotenv
 import json
 import re
-
-# Database imports for token logging
-from backend.database import SessionLocal
-from backend.models import LLMTokenUsage
-# User model is not directly used here if user_id is passed,
-# but good to keep in mind if context changes.
-# from backend.models import User
-# No need to import datetime if relying on server_default for timestamp in LLMTokenUsage
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from backend.assessment_prefetch import (
+    ASSESSMENT_PREFETCH_ENABLED, ASSESSMENT_PREFETCH_TTL_SECONDS, PrefetchBudget, PrefetchStats,
+    answer_is_correct, prefetch_budget, prefetch_stats,
+)
+from backend.chat_history_store import ChatHistoryStore, StoredSession, chat_history_store
+from backend.file_transfer import file_transfer_metrics, should_inline
+from backend.gcs_cache import gcs_file_cache
+from backend.llm_backend import LLMBackend, get_llm_backend
+from backend.llm_resilience import llm_resilience
+from backend.llm_scheduler import llm_scheduler
+from backend.session_store import ChatSessionStore, SessionEntry
+# Token usage is recorded in batches off the request path
+from backend.services.llm_usage_recorder import record_llm_usage
 
 load_dotenv()
 
+# --- File Fetch Configuration ---
+# Lesson files for one call are fetched in parallel; this caps concurrent GCS fetches per process
+GCS_FETCH_CONCURRENCY = int(os.getenv("GCS_FETCH_CONCURRENCY", "8"))
+_file_fetch_pool = ThreadPoolExecutor(max_workers=GCS_FETCH_CONCURRENCY, thread_name_prefix="gcs-fetch")
+
+
+class FilePart(NamedTuple):
+    """A file ready to send: its content key, Part, size and whether it goes by gs:// URI."""
+    key: str
+    part: Any
+    nbytes: int
+    by_reference: bool
+    gs_uri: str
+    mime_type: str
+
+
+def _flatten_files(files: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    """[{gs_uri: mime_type}, ...] -> [(gs_uri, mime_type), ...] in request order."""
+    return [(gs_uri, mime_type) for file_info in files for gs_uri, mime_type in file_info.items()]
+
 
 class ChatManager:
     """Manages chat sessions, optimizing for file reuse, system instructions, and parallel sessions per user."""
 
-    def __init__(self, project_id: str, location: str, model_name: str):
+    def __init__(self, project_id: str, location: str, model_name: str,
+                 history_store: Optional[ChatHistoryStore] = chat_history_store,
+                 backend: Optional[LLMBackend] = None):
         self.project_id = project_id
         self.location = location
         self.model_name = model_name
-        self.model = GenerativeModel(model_name)
-        # Store sessions using a tuple (user_id, session_id) as the key
-        self.sessions: Dict[Tuple[str, str], ChatSession] = {}
+        self.backend = backend or get_llm_backend()
+        self.model = self.backend.get_model(project_id, location, model_name)  # Shared across managers
+        # Sessions keyed by (user_id, session_id), each with the hashes of files already sent in it.
+        # Bounded: LRU eviction, idle TTL, per-user cap and an approximate byte budget.
+        self.sessions = ChatSessionStore()
         self.lock = threading.Lock()
-        # Store file hashes per session (using (user_id, session_id) tuple as key)
-        self.processed_files: Dict[Tuple[str, str], Set[str]] = {}
+        self._gcs_client: Optional[storage.Client] = None
+        # Shared with other workers: sessions continue wherever the next request lands
+        self.history_store = history_store
+
+    def _get_or_create_entry(self, user_id: str, session_id: str) -> SessionEntry:
+        """Returns the session, first reloading it if another worker has stored a newer version."""
+        key = (user_id, session_id)
+        entry = self.sessions.get_or_create(key, self.model.start_chat)
+        if self.history_store is not None:
+            try:
+                stored = self.history_store.load_if_newer(key, entry.history_version)
+                if stored is not None:
+                    self._restore_entry(entry, stored)
+            except Exception as e:
+                self.history_store.count("errors")
+                print(f"Error loading stored chat session {key}: {e}")
+        return entry
+
+    def _restore_entry(self, entry: SessionEntry, stored: StoredSession) -> None:
+        """Rebuilds the chat from stored history; file references are re-read via the disk cache."""
+        file_refs: Dict[str, Dict[str, str]] = {}
+        history = []
+        for stored_content in stored.history:
+            parts = []
+            for stored_part in stored_content["parts"]:
+                ref = stored_part.get("file_ref")
+                if ref is None:
+                    parts.append(self.backend.part_from_dict(stored_part))
+                    continue
+                storage_client = self._storage_client()
+                file_bytes = gcs_file_cache.read(storage_client, gcs_file_cache.stat(storage_client, ref["gs_uri"]))
+                file_refs[hashlib.md5(file_bytes).hexdigest()] = ref
+                parts.append(self.backend.data_part(file_bytes, ref["mime_type"]))
+            history.append(self.backend.content(stored_content["role"], parts))
+
+        chat = self.model.start_chat(history=history)
+        with self.lock:
+            entry.chat = chat
+            entry.processed_files = set(stored.processed_files)
+            entry.serialized_history = list(stored.history)
+            entry.file_refs = file_refs
+            entry.history_version = stored.version
+
+    def _persist_entry(self, key: Tuple[str, str], entry: SessionEntry) -> None:
+        """Stores the session's new history turns and processed files; never fails the caller."""
+        if self.history_store is None:
+            return
+        with self.lock:
+            # History is append-only, so only turns added since the last save are serialized
+            for content in entry.chat.history[len(entry.serialized_history):]:
+                stored_content = content.to_dict()
+                for index, part in enumerate(content.parts):
+                    if "inline_data" in stored_content["parts"][index]:
+                        ref = entry.file_refs.get(hashlib.md5(part.inline_data.data).hexdigest())
+                        if ref is not None:
+                            stored_content["parts"][index] = {"file_ref": ref}
+                entry.serialized_history.append(stored_content)
+            entry.history_version += 1
+            stored = StoredSession(
+                history=list(entry.serialized_history),
+                processed_files=sorted(entry.processed_files),
+                version=entry.history_version,
+            )
+        try:
+            self.history_store.save(key, stored)
+        except Exception as e:
+            self.history_store.count("errors")
+            print(f"Error storing chat session {key}: {e}")
+
+    def _persist_if_live(self, key: Tuple[str, str]) -> None:
+        """Stores the session unless it was evicted meanwhile. Blocking; async callers run it in a thread."""
+        session_entry = self.sessions.peek(key)
+        if session_entry is not None:
+            self._persist_entry(key, session_entry)
 
-    def get_or_create_session(self, user_id: str, session_id: str) -> ChatSession:
+    def get_or_create_session(self, user_id: str, session_id: str) -> Any:
         """Gets a specific chat session.  Creates it if it doesn't exist."""
-        with self.lock:
-            if (user_id, session_id) not in self.sessions:
-                new_session = self.model.start_chat()
-                self.sessions[(user_id, session_id)] = new_session
-                self.processed_files[(user_id, session_id)] = set()
-                return new_session
-            else:
-                return self.sessions[(user_id, session_id)]
+        return self._get_or_create_entry(user_id, session_id).chat
 
     def _file_hash(self, file_bytes: bytes) -> str:
         """Calculates the SHA256 hash of file content."""
         return hashlib.sha256(file_bytes).hexdigest()
 
+    def _storage_client(self) -> Optional[storage.Client]:
+        """Returns this manager's GCS client, creating it on first use (None outside GCP)."""
+        if os.getenv("GCP_ENV", "false").lower() != "true":
+            print("⚠️ Skipping GCS client initialization in local development")
+            return None
+        with self.lock:
+            if self._gcs_client is None:
+                self._gcs_client = storage.Client()
+                print("✅ Google Cloud Storage client initialized")
+            return self._gcs_client
+
+    def _fetch_file_part(
+            self,
+            session_entry: SessionEntry,
+            storage_client: Optional[storage.Client],
+            gs_uri: str,
+            mime_type: str,
+    ) -> Optional[FilePart]:
+        """
+        Builds one file's Part; None if the session already has it. Small files are downloaded
+        (via the disk cache) and inlined; large or media files are sent by URI. Blocking I/O.
+        """
+        try:
+            if not mime_type:  # If mime_type is empty
+                inferred_mime_type, _ = mimetypes.guess_type(gs_uri)
+                if inferred_mime_type is None:
+                    raise ValueError(f"MIME type is required for {gs_uri} and could not be inferred.")
+                mime_type = inferred_mime_type
+            if storage_client is None:
+                # No GCS access here (local development): the model backend resolves the URI itself
+                uri_key = f"uri-{gs_uri}"
+                with self.lock:
+                    if uri_key in session_entry.processed_files:
+                        return None
+                return FilePart(uri_key, self.backend.uri_part(gs_uri, mime_type), 0, True, gs_uri, mime_type)
+
+            # Dedup on content metadata (md5/generation) so files already in the session
+            # are never downloaded; new ones come from the local content-addressed cache
+            blob_info = gcs_file_cache.stat(storage_client, gs_uri)
+            with self.lock:
+                if blob_info.key in session_entry.processed_files:
+                    return None
+            if not should_inline(mime_type, blob_info.size):
+                # Large or media files are read by Vertex straight from GCS; nothing is held in memory
+                return FilePart(blob_info.key, self.backend.uri_part(gs_uri, mime_type), blob_info.size, True, gs_uri, mime_type)
+            file_bytes = gcs_file_cache.read(storage_client, blob_info)
+            return FilePart(blob_info.key, self.backend.data_part(file_bytes, mime_type), len(file_bytes), False, gs_uri, mime_type)
+        except Exception as e:
+            raise ValueError(f"Error processing file {gs_uri}: {e}") from e
+
+    def _assemble_parts(
+            self,
+            session_entry: SessionEntry,
+            fetched: List[Optional[FilePart]],
+            question: str,
+            system_instruction: Optional[str],
+    ) -> Tuple[List[Any], int]:
+        """Orders fetched file Parts as requested and marks them sent; identical content is sent once."""
+        parts = []
+        sent_bytes = reference_bytes = inline_files = reference_files = 0
+        if system_instruction:
+            parts.append(self.backend.text_part(system_instruction))
+        with self.lock:
+            for item in fetched:
+                if item is None or item.key in session_entry.processed_files:
+                    continue
+                parts.append(item.part)
+                session_entry.processed_files.add(item.key)
+                if item.by_reference:
+                    reference_files += 1
+                    reference_bytes += item.nbytes
+                else:
+                    inline_files += 1
+                    sent_bytes += item.nbytes
+                    if self.history_store is not None:
+                        # Lets the stored history refer to this file instead of embedding its bytes
+                        digest = hashlib.md5(item.part.inline_data.data).hexdigest()
+                        session_entry.file_refs[digest] = {"gs_uri": item.gs_uri, "mime_type": item.mime_type}
+        parts.append(self.backend.text_part(question))
+        file_transfer_metrics.record_call(inline_files, sent_bytes, reference_files, reference_bytes)
+        return parts, sent_bytes
+
+    def _build_parts(
+            self,
+            session_entry: SessionEntry,
+            storage_client: Optional[storage.Client],
+            files: List[Dict[str, str]],
+            question: str,
+            system_instruction: Optional[str],
+    ) -> Tuple[List[Any], int]:
+        """Builds the message parts, fetching all new files concurrently (bounded by the fetch pool)."""
+        file_items = _flatten_files(files)
+        fetched: List[Optional[FilePart]] = [None] * len(file_items)
+        futures = {
+            _file_fetch_pool.submit(self._fetch_file_part, session_entry, storage_client, gs_uri, mime_type): index
+            for index, (gs_uri, mime_type) in enumerate(file_items)
+        }
+        try:
+            # Each Part is built as soon as its file arrives; total wait is the slowest file
+            for future in as_completed(futures):
+                fetched[futures[future]] = future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        return self._assemble_parts(session_entry, fetched, question, system_instruction)
+
+    async def _build_parts_async(
+            self,
+            session_entry: SessionEntry,
+            storage_client: Optional[storage.Client],
+            files: List[Dict[str, str]],
+            question: str,
+            system_instruction: Optional[str],
+    ) -> Tuple[List[Any], int]:
+        """Async _build_parts; fetches run on the shared fetch pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        tasks = [
+            loop.run_in_executor(_file_fetch_pool, self._fetch_file_part, session_entry, storage_client, gs_uri, mime_type)
+            for gs_uri, mime_type in _flatten_files(files)
+        ]
+        try:
+            fetched = await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        return self._assemble_parts(session_entry, list(fetched), question, system_instruction)
+
+    def _after_response(
+            self,
+            response: Any,
+            user_id: str,
+            session_id: str,
+            question: str,
+            system_instruction: Optional[str],
+            sent_bytes: int,
+            action: str,
+            started: float,
+    ) -> None:
+        """Accounts session memory and queues token usage for a completed model call; persisting is separate."""
+        # Memory accounting: the session history now holds the inline files, prompt and answer
+        self.sessions.add_bytes(
+            (user_id, session_id),
+            sent_bytes + len(question) + len(system_instruction or "") + len(response.text or ""),
+        )
+
+        # Queue token usage for the background writer (never fails the main operation)
+        try:
+            record_llm_usage(
+                response,
+                user_id=user_id,
+                action=action,
+                model_name=self.model_name,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                session_id=session_id,
+            )
+        except Exception as log_exc:
+            print(f"Error logging token usage: {log_exc}")
+
     def generate_answer(
             self,
             user_id: str,
@@ -64,109 +324,167 @@ class ChatManager:
         Now returns only the answer string.
         """
 
-        chat_session = self.get_or_create_session(user_id, session_id)  # Get or create
-        # No need to check chat_session for None.
-
-        # parts = []
-        # storage_client = storage.Client()
-
-        parts = []
-        if os.getenv("GCP_ENV", "false").lower() == "true":
-            storage_client = storage.Client()
-            print("✅ Google Cloud Storage client initialized")
-        else:
-            storage_client = None
-            print("⚠️ Skipping GCS client initialization in local development")
-
+        session_entry = self._get_or_create_entry(user_id, session_id)  # Get or create
+        chat_session = session_entry.chat
+        with self.lock:
+            already_sent = set(session_entry.processed_files)
+        parts, sent_bytes = self._build_parts(
+            session_entry, self._storage_client(), files, question, system_instruction
+        )
 
-        if system_instruction:
-            parts.append(Part.from_text(system_instruction))
-
-        for file_info in files:
-            for gs_uri, mime_type in file_info.items():  # Iterate through the dictionary
-                try:
-                    path_parts = gs_uri.replace("gs://", "").split("/", 1)
-                    bucket_name = path_parts[0]
-                    blob_name = path_parts[1]
-
-                    bucket = storage_client.bucket(bucket_name)
-                    blob = bucket.blob(blob_name)
-                    file_bytes = blob.download_as_bytes()
-                    file_hash_str = self._file_hash(file_bytes)
-
-                    with self.lock:
-                        if file_hash_str not in self.processed_files[(user_id, session_id)]:
-                            if not mime_type:  # If mime_type is empty
-                                inferred_mime_type, _ = mimetypes.guess_type(gs_uri)
-                                if inferred_mime_type is None:
-                                    raise ValueError(f"MIME type is required for {gs_uri} and could not be inferred.")
-                                mime_type = inferred_mime_type
-                            parts.append(Part.from_data(data=file_bytes, mime_type=mime_type))
-                            self.processed_files[(user_id, session_id)].add(file_hash_str)
-
-                except Exception as e:
-                    raise ValueError(f"Error processing file {gs_uri}: {e}") from e
-
-        parts.append(Part.from_text(question))
+        def attempt():
+            nonlocal started
+            started = time.perf_counter()
+            return chat_session.send_message(parts)
 
         try:
-            response = chat_session.send_message(parts)
-
-            # Log token usage
-            db = None  # Initialize db to None for finally block
-            try:
-                if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                    prompt_tokens = response.usage_metadata.prompt_token_count
-                    candidates_tokens = response.usage_metadata.candidates_token_count
-                    total_tokens = prompt_tokens + candidates_tokens
-
-                    db = SessionLocal()
-                    token_usage_entry = LLMTokenUsage(
-                        user_id=int(user_id) if user_id.isdigit() else None, # Assuming user_id can be converted to int
-                        session_id=session_id,
-                        action=action,
-                        model_name=self.model_name,
-                        input_tokens=prompt_tokens,
-                        output_tokens=candidates_tokens,
-                        total_tokens=total_tokens
-                        # timestamp is server_default
-                    )
-                    db.add(token_usage_entry)
-                    db.commit()
-                else:
-                    # Log or handle missing usage_metadata if necessary
-                    print(f"Warning: usage_metadata not found for action '{action}', user_id '{user_id}', session_id '{session_id}'. Skipping token logging.")
-            except Exception as log_exc:
-                # Log any exception during token logging but don't let it fail the main operation
-                print(f"Error logging token usage: {log_exc}")
-                if db:
-                    db.rollback() # Rollback in case of error during logging
-            finally:
-                if db:
-                    db.close()
-
+            started = time.perf_counter()
+            # Retried on transient errors (a failed send doesn't touch the chat history); never hedged
+            response = llm_resilience.call(action, attempt, model_name=self.model_name, user_id=user_id)
+            self._after_response(response, user_id, session_id, question, system_instruction, sent_bytes, action, started)
+            self._persist_if_live((user_id, session_id))
             return response.text  # Return only the answer text
 
+        except HTTPException:
+            self._unmark_files(session_entry, already_sent)
+            raise
         except Exception as e:
+            self._unmark_files(session_entry, already_sent)
             # It might be good to log the action that failed here too if possible
             raise ValueError(f"Vertex AI model failed to generate content for action '{action}': {e}") from e
 
+    async def generate_answer_async(
+            self,
+            user_id: str,
+            session_id: str,
+            files: List[Dict[str, str]],  # List of dictionaries: {gs_uri: mime_type}
+            question: str,
+            system_instruction: str = None,
+            action: str = "unknown_action",
+    ) -> str:
+        """
+        Async generate_answer: the model call awaits send_message_async and GCS I/O runs off the
+        event loop, so a worker can hold many in-flight calls. Calls within one session are
+        serialized by the session's asyncio lock, keeping the chat history in order.
+        """
+        session_entry = await asyncio.to_thread(self._get_or_create_entry, user_id, session_id)
+        async with session_entry.async_lock:
+            chat_session = session_entry.chat
+            with self.lock:
+                already_sent = set(session_entry.processed_files)
+            storage_client = await asyncio.to_thread(self._storage_client)
+            parts, sent_bytes = await self._build_parts_async(
+                session_entry, storage_client, files, question, system_instruction
+            )
+
+            async def attempt():
+                nonlocal started
+                started = time.perf_counter()
+                return await chat_session.send_message_async(parts)
+
+            try:
+                started = time.perf_counter()
+                response = await llm_resilience.call_async(action, attempt, model_name=self.model_name, user_id=user_id)
+                self._after_response(response, user_id, session_id, question, system_instruction, sent_bytes, action, started)
+                # Still under the session lock, so saves land in history order
+                await asyncio.to_thread(self._persist_if_live, (user_id, session_id))
+                return response.text
+
+            except HTTPException:
+                self._unmark_files(session_entry, already_sent)
+                raise
+            except Exception as e:
+                self._unmark_files(session_entry, already_sent)
+                raise ValueError(f"Vertex AI model failed to generate content for action '{action}': {e}") from e
+
+    async def generate_answer_stream_async(
+            self,
+            user_id: str,
+            session_id: str,
+            files: List[Dict[str, str]],  # List of dictionaries: {gs_uri: mime_type}
+            question: str,
+            system_instruction: str = None,
+            action: str = "unknown_action",
+    ) -> AsyncIterator[str]:
+        """
+        Streaming generate_answer: yields answer text chunks as the model produces them.
+        Usage is recorded once the stream completes. If the stream fails or the caller stops
+        reading, files sent in this call are un-marked so the next question resends them.
+        """
+        session_entry = await asyncio.to_thread(self._get_or_create_entry, user_id, session_id)
+        async with session_entry.async_lock:
+            chat_session = session_entry.chat
+            with self.lock:
+                already_sent = set(session_entry.processed_files)
+            storage_client = await asyncio.to_thread(self._storage_client)
+            parts, sent_bytes = await self._build_parts_async(
+                session_entry, storage_client, files, question, system_instruction
+            )
+
+            completed = False
+            try:
+                # The slot is held until the stream ends
+                async with llm_scheduler.slot_async(self.model_name, user_id, action):
+                    started = time.perf_counter()
+                    chunks = []
+                    last_chunk = None
+                    async for chunk in await chat_session.send_message_async(parts, stream=True):
+                        last_chunk = chunk
+                        text = chunk.text if chunk.candidates and chunk.candidates[0].content.parts else ""
+                        if text:
+                            chunks.append(text)
+                            yield text
+                completed = True
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise ValueError(f"Vertex AI model failed to stream content for action '{action}': {e}") from e
+            finally:
+                if not completed:
+                    self._unmark_files(session_entry, already_sent)
+
+            # The final chunk carries the usage metadata for the whole exchange
+            streamed = SimpleNamespace(
+                text="".join(chunks),
+                usage_metadata=getattr(last_chunk, "usage_metadata", None),
+                candidates=getattr(last_chunk, "candidates", None),
+            )
+            self._after_response(streamed, user_id, session_id, question, system_instruction, sent_bytes, action, started)
+            await asyncio.to_thread(self._persist_if_live, (user_id, session_id))
+
+    def _unmark_files(self, session_entry: SessionEntry, already_sent: Set[str]) -> None:
+        """After a failed call, forgets files marked sent by it so the next question resends them."""
+        with self.lock:
+            session_entry.processed_files.intersection_update(already_sent)
+
     def clear_session(self, user_id: str, session_id: str) -> None:
         """Clears a specific chat session and its processed files."""
-        with self.lock:
-            if (user_id, session_id) in self.sessions:
-                del self.sessions[(user_id, session_id)]
-                del self.processed_files[(user_id, session_id)]
-                print(f"Cleared session {session_id} for user {user_id}")
+        if self.history_store is not None:
+            self.history_store.delete((user_id, session_id))
+        if self.sessions.pop((user_id, session_id)) is not None:
+            print(f"Cleared session {session_id} for user {user_id}")
 
     def clear_all_sessions_for_user(self, user_id: str) -> None:
         """Clears all chat sessions for a given user."""
-        with self.lock:
-            keys_to_remove = [k for k in self.sessions if k[0] == user_id]
-            for key in keys_to_remove:
-                del self.sessions[key]
-                del self.processed_files[key]
-            print(f"Cleared all sessions for user {user_id}")
+        if self.history_store is not None:
+            self.history_store.delete_user(user_id)
+        self.sessions.pop_user(user_id)
+        print(f"Cleared all sessions for user {user_id}")
+
+
+_chat_managers: Dict[Tuple[str, str, str], ChatManager] = {}
+_chat_managers_lock = threading.Lock()
+
+
+def get_chat_manager(project_id: str, location: str, model_name: str) -> ChatManager:
+    """Returns the process-wide ChatManager for (project, location, model), so sessions and file dedup persist."""
+    key = (project_id, location, model_name)
+    with _chat_managers_lock:
+        manager = _chat_managers.get(key)
+        if manager is None:
+            manager = ChatManager(project_id, location, model_name)
+            _chat_managers[key] = manager
+        return manager
 
 
 class VirtualTeacherClient:
@@ -176,8 +494,7 @@ class VirtualTeacherClient:
         self.project_id = project_id
         self.location = location
         self.model_name = model_name
-        self.chat_manager = ChatManager(project_id, location, model_name)
-        vertexai.init(project=project_id, location=location)
+        self.chat_manager = get_chat_manager(project_id, location, model_name)
 
     def ask_question(
             self,
@@ -197,7 +514,35 @@ class VirtualTeacherClient:
         )
         return answer
 
-    def get_or_create_session(self, user_id: str, session_id: str) -> ChatSession:
+    async def ask_question_async(
+            self,
+            user_id: str,
+            session_id: str,
+            question: str,
+            files: Optional[List[Dict[str, str]]] = None,
+            system_instruction: Optional[str] = None,
+            action: str = "ask_question_via_client",
+    ) -> str:
+        """Async ask_question; awaits the model without blocking the event loop."""
+        return await self.chat_manager.generate_answer_async(
+            user_id, session_id, files or [], question, system_instruction, action=action
+        )
+
+    def ask_question_stream(
+            self,
+            user_id: str,
+            session_id: str,
+            question: str,
+            files: Optional[List[Dict[str, str]]] = None,
+            system_instruction: Optional[str] = None,
+            action: str = "ask_question_via_client",
+    ) -> AsyncIterator[str]:
+        """Streaming ask_question; returns an async iterator of answer text chunks."""
+        return self.chat_manager.generate_answer_stream_async(
+            user_id, session_id, files or [], question, system_instruction, action=action
+        )
+
+    def get_or_create_session(self, user_id: str, session_id: str) -> Any:
         """Gets a specific chat session.  Creates it if it doesn't exist."""
         return self.chat_manager.get_or_create_session(user_id, session_id)
 
@@ -218,13 +563,33 @@ location = os.environ.get("LOCATION")
 model_name = os.environ.get("MODEL_NAME", "gemini-1.5-pro-002")
 bucket_name = os.environ.get("BUCKET_NAME")  # Still needed for file access
 
-if not all([project_id, location]):
-    raise ValueError(
-        "Please set PROJECT_ID and LOCATION in your .env file."
-    )
+_client: Optional[VirtualTeacherClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> VirtualTeacherClient:
+    """Returns the shared client, created on first use so importing this module never needs Vertex AI."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            if get_llm_backend().name == "vertex" and not all([project_id, location]):
+                raise ValueError(
+                    "Please set PROJECT_ID and LOCATION in your .env file."
+                )
+            _client = VirtualTeacherClient(project_id, location, model_name)
+        return _client
 
-# --- Initialize the client ---
-client = VirtualTeacherClient(project_id, location, model_name)
+
+ASK_QUESTION_INSTRUCTION = """
+        You are an Expert Teacher. 
+        Use the information in the given context to answer the questions.
+    """
+
+TEACHER_NOTES_INSTRUCTION = """
+        Use the information in the given context.
+        Generate a detailed notes for the teacher.
+        Teacher will use this notes to conduct the training for the students.
+    """
 
 
 def ask_question(
@@ -233,31 +598,58 @@ def ask_question(
         question: str,
         files: List[Dict[str, str]]
 ):
-    system_instruction = """
-        You are an Expert Teacher. 
-        Use the information in the given context to answer the questions.
-    """
-    answer = client.ask_question(user_id, session_id, question, files, system_instruction, action="ask_question")
+    answer = get_client().ask_question(user_id, session_id, question, files, ASK_QUESTION_INSTRUCTION, action="ask_question")
 
     return answer
 
 
+async def ask_question_async(
+        user_id: str,
+        session_id: str,
+        question: str,
+        files: List[Dict[str, str]]
+):
+    return await get_client().ask_question_async(user_id, session_id, question, files, ASK_QUESTION_INSTRUCTION, action="ask_question")
+
+
+def ask_question_stream(
+        user_id: str,
+        session_id: str,
+        question: str,
+        files: List[Dict[str, str]]
+) -> AsyncIterator[str]:
+    return get_client().ask_question_stream(user_id, session_id, question, files, ASK_QUESTION_INSTRUCTION, action="ask_question")
+
+
 def generate_teacher_notes(
         user_id: str,
         session_id: str,
         user_prompt: str,
         files: List[Dict[str, str]]
 ):
-    system_instruction = """
-        Use the information in the given context.
-        Generate a detailed notes for the teacher.
-        Teacher will use this notes to conduct the training for the students.
-    """
-    answer = client.ask_question(user_id, session_id, user_prompt, files, system_instruction, action="generate_teacher_notes")
+    answer = get_client().ask_question(user_id, session_id, user_prompt, files, TEACHER_NOTES_INSTRUCTION, action="generate_teacher_notes")
 
     return answer
 
 
+async def generate_teacher_notes_async(
+        user_id: str,
+        session_id: str,
+        user_prompt: str,
+        files: List[Dict[str, str]]
+):
+    return await get_client().ask_question_async(user_id, session_id, user_prompt, files, TEACHER_NOTES_INSTRUCTION, action="generate_teacher_notes")
+
+
+def generate_teacher_notes_stream(
+        user_id: str,
+        session_id: str,
+        user_prompt: str,
+        files: List[Dict[str, str]]
+) -> AsyncIterator[str]:
+    return get_client().ask_question_stream(user_id, session_id, user_prompt, files, TEACHER_NOTES_INSTRUCTION, action="generate_teacher_notes")
+
+
 def generate_bulk_assessment_questions(
         user_id: str,
         session_id: str,
@@ -270,7 +662,7 @@ def generate_bulk_assessment_questions(
         Questions can be mix of multi-choice and/or multi-selection questions.
         There must be 4 choices.
     """
-    answer = client.ask_question(user_id, session_id, user_instruction, files, system_instruction, action="generate_bulk_assessment_questions")
+    answer = get_client().ask_question(user_id, session_id, user_instruction, files, system_instruction, action="generate_bulk_assessment_questions")
 
     return answer
 
@@ -323,21 +715,25 @@ def json_markdown_to_string(markdown_string):
     return json_string
 
 
-def generate_assessment_question(
-        user_id: str,
-        session_id: str,
-        previous_question_answer: str,
-        files: List[Dict[str, str]],
-        total_question_count: int,
-        current_question_count: int
-):
+def _assessment_question_prompts(previous_question_answer: str, previous_correct: Optional[bool] = None) -> Tuple[str, str]:
+    """
+    Returns (system_instruction, user_prompt) for the next adaptive assessment question.
+    With `previous_correct` set (speculative prefetch), the difficulty direction is stated
+    instead of left to the model.
+    """
+    if previous_correct is None:
+        difficulty = """If previous question's answer is incorrect, generate little easier question.
+        If it is correct, generate little harder question."""
+    elif previous_correct:
+        difficulty = "The previous question was answered correctly, so generate little harder question."
+    else:
+        difficulty = "The previous question was answered incorrectly, so generate little easier question."
     system_instruction = f"""
         Based on the given context, generate question. 
         Questions can be mix of multi-choice and/or multi-selection questions.
         There must be 4 choices.
 
-        If previous question's answer is incorrect, generate little easier question.
-        If it is correct, generate little harder question.
+        {difficulty}
         """
     user_prompt = f"""
         The question format must be in JSON format with following fields:
@@ -348,7 +744,207 @@ def generate_assessment_question(
           "correct_answer_for_previous_question": "correct answer of previous question",,
           "your_previous_answer": "{previous_question_answer}"
     """
-    answer = client.ask_question(user_id, session_id, user_prompt, files, system_instruction, action="generate_assessment_question")
+    return system_instruction, user_prompt
+
+
+@dataclass
+class _PendingBranches:
+    """Both speculative follow-ups for one session, forked from the chat as it stood after the last question."""
+    correct_answer: Any
+    files: List[Dict[str, str]]
+    base_chat: Any
+    base_turns: int
+    tasks: Dict[bool, "asyncio.Task"]  # previous_correct -> task returning (chat, response)
+    created: float = field(default_factory=time.monotonic)
+
+
+class AssessmentPrefetcher:
+    """
+    Speculative prefetch for adaptive assessments. After serving a question, the harder and
+    easier follow-ups are generated in the background on copies of the session's chat. When the
+    answer arrives, the matching branch's chat replaces the session's and its question is served;
+    the other branch is discarded. Anything that can't be matched falls back to a normal call.
+
+    Pending branches live in this process only; an answer that lands on another worker is
+    simply generated there.
+    """
+
+    action = "generate_assessment_question"
+
+    def __init__(self, chat_manager: ChatManager, budget: PrefetchBudget = prefetch_budget,
+                 stats: PrefetchStats = prefetch_stats, ttl_seconds: float = ASSESSMENT_PREFETCH_TTL_SECONDS):
+        self.chat_manager = chat_manager
+        self.budget = budget
+        self.stats = stats
+        self.ttl_seconds = ttl_seconds
+        self._pending: Dict[Tuple[str, str], _PendingBranches] = {}
+
+    async def next_question(
+            self,
+            user_id: str,
+            session_id: str,
+            previous_question_answer: str,
+            files: List[Dict[str, str]],
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the next question (served from a prefetched branch when possible) and prefetches its follow-ups."""
+        key = (user_id, session_id)
+        self._prune()
+        pending = self._pending.pop(key, None)
+        question = None
+        if pending is None:
+            self.stats.count("no_prefetch")
+        else:
+            question = await self._serve(key, pending, previous_question_answer, files)
+            self.stats.count("hits" if question is not None else "misses")
+
+        if question is None:
+            system_instruction, user_prompt = _assessment_question_prompts(previous_question_answer)
+            answer = await self.chat_manager.generate_answer_async(
+                user_id, session_id, files, user_prompt, system_instruction, action=self.action
+            )
+            question = json_markdown_to_dict(answer)
+
+        if question is not None and ASSESSMENT_PREFETCH_ENABLED:
+            self._speculate(key, question, files)
+        return question
+
+    def _speculate(self, key: Tuple[str, str], question: Dict[str, Any], files: List[Dict[str, str]]) -> None:
+        """Starts the harder and easier follow-ups for `question`, within the budget."""
+        correct_answer = question.get("correct_answer")
+        entry = self.chat_manager.sessions.peek(key)
+        if correct_answer in (None, "", []) or entry is None:
+            return
+        if not self.budget.try_acquire(2):
+            self.stats.count("skipped_budget")
+            return
+        base_chat = entry.chat
+        history = list(base_chat.history)
+        tasks = {}
+        for previous_correct in (True, False):
+            task = asyncio.create_task(self._generate_branch(key, history, previous_correct))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Discarded failures aren't errors
+            tasks[previous_correct] = task
+        self._pending[key] = _PendingBranches(
+            correct_answer=correct_answer, files=files, base_chat=base_chat, base_turns=len(history), tasks=tasks,
+        )
+        self.stats.count("started")
+
+    async def _generate_branch(self, key: Tuple[str, str], history: List[Any], previous_correct: bool) -> Tuple[Any, Any]:
+        """Generates one follow-up on a fork of the chat; usage is recorded whether or not it is served."""
+        backend = self.chat_manager.backend
+        chat = self.chat_manager.model.start_chat(history=history)
+        system_instruction, user_prompt = _assessment_question_prompts("", previous_correct)
+        async with llm_scheduler.slot_async(self.chat_manager.model_name, key[0], f"{self.action}_prefetch"):
+            started = time.perf_counter()
+            response = await chat.send_message_async([backend.text_part(system_instruction), backend.text_part(user_prompt)])
+        usage = getattr(response, "usage_metadata", None)
+        self.budget.spend(getattr(usage, "total_token_count", 0) or 0)
+        try:
+            record_llm_usage(
+                response,
+                user_id=key[0],
+                action=f"{self.action}_prefetch",
+                model_name=self.chat_manager.model_name,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                session_id=key[1],
+            )
+        except Exception as log_exc:
+            print(f"Error logging token usage: {log_exc}")
+        return chat, response
+
+    async def _serve(
+            self,
+            key: Tuple[str, str],
+            pending: _PendingBranches,
+            previous_question_answer: str,
+            files: List[Dict[str, str]],
+    ) -> Optional[Dict[str, Any]]:
+        """Adopts the branch matching the answer; None if no branch can be used."""
+        previous_correct = answer_is_correct(previous_question_answer, pending.correct_answer)
+        if previous_correct is None or files != pending.files:
+            self._discard(pending)
+            return None
+        task = pending.tasks.pop(previous_correct)
+        self._discard(pending)
+        try:
+            chat, response = await task
+        except Exception as e:
+            print(f"Prefetched assessment question failed for session {key}: {e}")
+            return None
+        finally:
+            self.budget.release()
+
+        question = json_markdown_to_dict(response.text)
+        session_entry = await asyncio.to_thread(self.chat_manager._get_or_create_entry, *key)
+        async with session_entry.async_lock:
+            # The branch is only valid if nothing else was said in the session since it forked
+            if question is None or session_entry.chat is not pending.base_chat \
+                    or len(session_entry.chat.history) != pending.base_turns:
+                return None
+            with self.chat_manager.lock:
+                session_entry.chat = chat
+            self.chat_manager.sessions.add_bytes(key, len(response.text or ""))
+            await asyncio.to_thread(self.chat_manager._persist_entry, key, session_entry)
+        question["your_previous_answer"] = previous_question_answer
+        return question
+
+    def _discard(self, pending: _PendingBranches) -> None:
+        """Cancels (or drops the result of) every branch still held in `pending`."""
+        for task in pending.tasks.values():
+            task.cancel()
+            self.budget.release()
+            self.stats.count("discarded")
+        pending.tasks.clear()
+
+    def _prune(self) -> None:
+        """Drops prefetches whose answer never came (abandoned assessments)."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [key for key, pending in self._pending.items() if pending.created < cutoff]:
+            self._discard(self._pending.pop(key))
+
+
+_prefetcher: Optional[AssessmentPrefetcher] = None
+
+
+def get_assessment_prefetcher() -> AssessmentPrefetcher:
+    """Returns the prefetcher for the shared client's sessions."""
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = AssessmentPrefetcher(get_client().chat_manager)
+    return _prefetcher
+
+
+def generate_assessment_question(
+        user_id: str,
+        session_id: str,
+        previous_question_answer: str,
+        files: List[Dict[str, str]],
+        total_question_count: int,
+        current_question_count: int
+):
+    system_instruction, user_prompt = _assessment_question_prompts(previous_question_answer)
+    answer = get_client().ask_question(user_id, session_id, user_prompt, files, system_instruction, action="generate_assessment_question")
+
+    return json_markdown_to_dict(answer)
+
+
+async def generate_assessment_question_async(
+        user_id: str,
+        session_id: str,
+        previous_question_answer: str,
+        files: List[Dict[str, str]],
+        total_question_count: int,
+        current_question_count: int,
+        prefetch: bool = False,
+):
+    """
+    Async generate_assessment_question. With `prefetch`, the harder and easier follow-ups are
+    generated while the student answers, and the matching one is served on the next call.
+    """
+    if prefetch:
+        return await get_assessment_prefetcher().next_question(user_id, session_id, previous_question_answer, files)
+    system_instruction, user_prompt = _assessment_question_prompts(previous_question_answer)
+    answer = await get_client().ask_question_async(user_id, session_id, user_prompt, files, system_instruction, action="generate_assessment_question")
 
     return json_markdown_to_dict(answer)
 
@@ -376,12 +972,8 @@ def generate_question_paper(
     Returns:
         Dict[str, Any]: JSON formatted question paper
     """
-    # Initialize ChatManager
-    chat_manager = ChatManager(
-        project_id=project_id,
-        location=location,
-        model_name=model_name
-    )
+    # Shared ChatManager: the model client and already-sent files carry over between papers
+    chat_manager = get_chat_manager(project_id, location, model_name)
 
     #####################################
     # Generate question format json.
@@ -459,12 +1051,8 @@ def generate_question_paper2(
     Returns:
         Dict[str, Any]: JSON formatted question paper
     """
-    # Initialize ChatManager
-    chat_manager = ChatManager(
-        project_id=project_id,
-        location=location,
-        model_name=model_name
-    )
+    # Shared ChatManager: the model client and already-sent files carry over between papers
+    chat_manager = get_chat_manager(project_id, location, model_name)
 
     # Prepare files list in the format expected by ChatManager
     files = [
@@ -0,0 +1,113 @@
+# backend/assessment_prefetch.py
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Prefetch Configuration ---
+ASSESSMENT_PREFETCH_ENABLED = os.getenv("ASSESSMENT_PREFETCH_ENABLED", "true").lower() == "true"
+# Speculative branches held per process, from launch until served or discarded (bounds calls and memory)
+ASSESSMENT_PREFETCH_MAX_OUTSTANDING = int(os.getenv("ASSESSMENT_PREFETCH_MAX_OUTSTANDING", "40"))
+ASSESSMENT_PREFETCH_TOKENS_PER_HOUR = int(os.getenv("ASSESSMENT_PREFETCH_TOKENS_PER_HOUR", "2000000"))  # 0 = no token cap
+ASSESSMENT_PREFETCH_TTL_SECONDS = float(os.getenv("ASSESSMENT_PREFETCH_TTL_SECONDS", "900"))  # Unused prefetches are dropped after this
+
+
+def _normalize(value: Any) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def answer_is_correct(answer: Optional[str], correct_answer: Any) -> Optional[bool]:
+    """
+    Compares a student's answer with the question's correct answer. Multi-select answers
+    may be a list or comma-separated. None means it can't be decided (no answer given).
+    """
+    if answer is None or not str(answer).strip() or correct_answer in (None, "", []):
+        return None
+    if isinstance(correct_answer, list):
+        expected = {_normalize(item) for item in correct_answer}
+        given = {_normalize(item) for item in str(answer).split(",") if item.strip()}
+        return given == expected
+    return _normalize(answer) == _normalize(correct_answer)
+
+
+class PrefetchBudget:
+    """Caps speculative generation: outstanding branches, plus tokens spent per clock hour."""
+
+    def __init__(self, max_outstanding: int = ASSESSMENT_PREFETCH_MAX_OUTSTANDING,
+                 tokens_per_hour: int = ASSESSMENT_PREFETCH_TOKENS_PER_HOUR):
+        self.max_outstanding = max_outstanding
+        self.tokens_per_hour = tokens_per_hour
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self._hour = int(time.time() // 3600)
+        self.tokens_this_hour = 0
+
+    def _roll(self) -> None:
+        hour = int(time.time() // 3600)
+        if hour != self._hour:
+            self._hour, self.tokens_this_hour = hour, 0
+
+    def try_acquire(self, branches: int) -> bool:
+        with self.lock:
+            self._roll()
+            if self.outstanding + branches > self.max_outstanding:
+                return False
+            if self.tokens_per_hour > 0 and self.tokens_this_hour >= self.tokens_per_hour:
+                return False
+            self.outstanding += branches
+            return True
+
+    def release(self, branches: int = 1) -> None:
+        with self.lock:
+            self.outstanding -= branches
+
+    def spend(self, tokens: int) -> None:
+        with self.lock:
+            self._roll()
+            self.tokens_this_hour += tokens
+
+
+class PrefetchStats:
+    """Hit/miss counters for speculative assessment questions."""
+
+    def __init__(self, budget: PrefetchBudget):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.counters = {
+            "started": 0,  # Pairs of speculative (harder, easier) calls launched
+            "hits": 0,  # Next question served from a prefetched branch
+            "misses": 0,  # Prefetch existed but couldn't be used (undecidable answer, new files, failure, history moved on)
+            "no_prefetch": 0,  # Nothing prefetched for the session (first question, expired, budget)
+            "skipped_budget": 0,
+            "discarded": 0,  # Branches generated (or cancelled) without being served
+        }
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            counters = dict(self.counters)
+        decided = counters["hits"] + counters["misses"]
+        with self.budget.lock:
+            budget = {
+                "outstanding": self.budget.outstanding,
+                "max_outstanding": self.budget.max_outstanding,
+                "tokens_this_hour": self.budget.tokens_this_hour,
+                "tokens_per_hour": self.budget.tokens_per_hour,
+            }
+        return {
+            "enabled": ASSESSMENT_PREFETCH_ENABLED,
+            **counters,
+            "hit_rate": round(counters["hits"] / decided, 3) if decided else None,
+            "budget": budget,
+        }
+
+
+prefetch_budget = PrefetchBudget()
+prefetch_stats = PrefetchStats(prefetch_budget)
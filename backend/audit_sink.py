@@ -0,0 +1,33 @@
+# backend/audit_sink.py
+import os
+
+from dotenv import load_dotenv
+
+from backend.batch_writer import BatchedInsertWriter, create_writer_engine
+
+load_dotenv()
+
+# --- Sink Configuration ---
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "250"))  # Max time an event waits before a flush
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))  # Flush as soon as this many events are queued
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))
+AUDIT_ENQUEUE_TIMEOUT_MS = int(os.getenv("AUDIT_ENQUEUE_TIMEOUT_MS", "50"))  # Caller blocks this long on a full queue, then the event is dropped
+AUDIT_DRAIN_TIMEOUT_SECONDS = float(os.getenv("AUDIT_DRAIN_TIMEOUT_SECONDS", "10"))
+
+
+def _audit_table():
+    from backend import models  # Imported lazily; models may import logger_utils
+    return models.AuditLog.__table__
+
+
+# Background writer for logger_utils.log_activity
+audit_sink = BatchedInsertWriter(
+    name="audit-log",
+    table_factory=_audit_table,
+    engine_factory=create_writer_engine,
+    flush_interval_ms=AUDIT_FLUSH_INTERVAL_MS,
+    batch_size=AUDIT_BATCH_SIZE,
+    queue_max=AUDIT_QUEUE_MAX,
+    enqueue_timeout_ms=AUDIT_ENQUEUE_TIMEOUT_MS,
+    drain_timeout_seconds=AUDIT_DRAIN_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,158 @@
+# backend/auth_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend import models
+
+load_dotenv()
+
+# --- Cache Configuration ---
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))  # 0 disables the cache
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "1024"))
+
+# Tables whose rows are part of the cached principal (User plus its role profile)
+_PRINCIPAL_MODELS = (models.User, models.Teacher, models.Student, models.Parent)
+_PENDING_KEY = "principal_cache_invalidations"
+_CLEAR_ALL = "*"
+
+
+class UserPrincipalCache:
+    """Bounded LRU/TTL cache of detached User objects keyed by token subject (username)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # username -> (expires_at, user)
+        self._user_keys: Dict[int, str] = {}  # user id -> username, for invalidation by id
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, username: str) -> Optional[models.User]:
+        if not self.enabled:
+            return None
+        with self.lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                self._remove(username)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return user
+
+    def put(self, username: str, user: models.User) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self._remove(username)
+            self._entries[username] = (time.monotonic() + self.ttl_seconds, user)
+            self._user_keys[user.id] = username
+            while len(self._entries) > self.max_entries:
+                oldest, (_, oldest_user) = self._entries.popitem(last=False)
+                self._drop_user_key(oldest, oldest_user.id)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self.lock:
+            username = self._user_keys.get(user_id)
+            if username is not None:
+                self._remove(username)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, username: str) -> None:
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self._drop_user_key(username, entry[1].id)
+
+    def _drop_user_key(self, username: str, user_id: int) -> None:
+        if self._user_keys.get(user_id) == username:
+            del self._user_keys[user_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+user_principal_cache = UserPrincipalCache(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_MAX_ENTRIES)
+
+
+# --- Invalidation Hooks ---
+# Changes are collected at flush time and applied after commit, so a concurrent request
+# can't re-cache the old row between the flush and the commit. Applies to sync and async sessions.
+
+def _principal_user_id(obj) -> Optional[int]:
+    # Read loaded state only; lazy-loading attributes from inside a flush event isn't safe
+    loaded = inspect(obj).dict
+    return loaded.get("id") if isinstance(obj, models.User) else loaded.get("user_id")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session, flush_context):
+    pending: Set = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _PRINCIPAL_MODELS):
+            user_id = _principal_user_id(obj)
+            pending.add(user_id if user_id is not None else _CLEAR_ALL)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_principal_changes(orm_execute_state):
+    # Query.update()/delete() and update()/delete() statements bypass the unit of work
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, _PRINCIPAL_MODELS):
+        orm_execute_state.session.info.setdefault(_PENDING_KEY, set()).add(_CLEAR_ALL)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_principal_invalidations(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if _CLEAR_ALL in pending:
+        user_principal_cache.clear()
+        return
+    for user_id in pending:
+        user_principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_invalidations(session):
+    session.info.pop(_PENDING_KEY, None)
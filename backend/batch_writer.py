@@ -0,0 +1,214 @@
+# backend/batch_writer.py
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Table, create_engine, insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+
+from backend.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedInsertWriter:
+    """Background writer that batches queued rows into multi-row INSERTs on its own connection."""
+
+    def __init__(
+        self,
+        name: str,
+        table_factory: Callable[[], Table],
+        engine_factory: Callable[[], Engine],
+        flush_interval_ms: int,
+        batch_size: int,
+        queue_max: int,
+        enqueue_timeout_ms: int,
+        drain_timeout_seconds: float = 10,
+        after_insert: Optional[Callable[[Connection, List[Dict[str, Any]]], None]] = None,
+    ):
+        self.name = name
+        self._after_insert = after_insert  # Runs in the same transaction as the batch INSERT
+        self._table_factory = table_factory
+        self._engine_factory = engine_factory
+        self._engine: Optional[Engine] = None
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.drain_timeout = drain_timeout_seconds
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_max)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.flush_ms = Histogram()
+        self.batch_rows = Histogram(buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000))
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped_queue_full = 0
+        self.dropped_write_error = 0
+        self.max_depth = 0
+
+    # --- Producer side ---
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Queues one row; returns False if it was dropped because the queue stayed full."""
+        self.start()
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self.lock:
+                self.dropped_queue_full += 1
+            logger.warning(f"{self.name} queue full; dropped row Action={row.get('action')}")
+            return False
+        with self.lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    # --- Writer thread ---
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Signals the writer to stop, flushes whatever is still queued and joins it."""
+        thread = self._thread
+        if thread is None:
+            return
+        timeout = self.drain_timeout if timeout is None else timeout
+        self._stop.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error(f"{self.name} writer did not drain within {timeout}s; {self._queue.qsize()} rows left unwritten.")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+        # Drain on shutdown
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def _collect_batch(self) -> List[Dict[str, Any]]:
+        """Blocks until batch_size rows are queued or flush_interval has passed since the first one."""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        if self._engine is None:
+            self._engine = self._engine_factory()
+        with self._engine.begin() as conn:
+            conn.execute(insert(self._table_factory()).values(rows))
+            if self._after_insert is not None:
+                self._after_insert(conn, rows)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        # One retry covers a connection dropped by the server between batches
+        written = len(batch)
+        for attempt in (1, 2):
+            try:
+                self._insert(batch)
+                break
+            except Exception as e:
+                if attempt == 1:
+                    logger.warning(f"{self.name}: batch insert failed, retrying once: {e}")
+                    continue
+                if _is_connection_error(e):
+                    with self.lock:
+                        self.dropped_write_error += len(batch)
+                    logger.error(f"{self.name}: failed to write {len(batch)} rows; dropping them. Error: {e}", exc_info=False)
+                    return
+                # Likely a bad row (FK violation, oversized value): write row by row so only it is lost
+                logger.warning(f"{self.name}: batch of {len(batch)} rows failed again, writing rows individually: {e}")
+                written = self._write_individually(batch)
+        self.flush_ms.observe((time.perf_counter() - started) * 1000)
+        self.batch_rows.observe(written)
+        with self.lock:
+            self.written += written
+            self.batches += 1
+
+    def _write_individually(self, batch: List[Dict[str, Any]]) -> int:
+        """Inserts each row in its own transaction, dropping only the ones that fail. Returns rows written."""
+        written = 0
+        for row in batch:
+            try:
+                self._insert([row])
+                written += 1
+            except Exception as e:
+                with self.lock:
+                    self.dropped_write_error += 1
+                logger.error(f"{self.name}: dropping row Action={row.get('action')} that failed to write: {e}", exc_info=False)
+        return written
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            state = {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self._queue.maxsize,
+                "max_depth_seen": self.max_depth,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "dropped_queue_full": self.dropped_queue_full,
+                "dropped_write_error": self.dropped_write_error,
+            }
+        state["flush_ms"] = self.flush_ms.snapshot()
+        state["batch_rows"] = self.batch_rows.snapshot()
+        return state
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Errors that would fail every row alike (lost connection, server gone), so per-row retry is pointless."""
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (DisconnectionError, InterfaceError, OperationalError))
+
+
+def create_writer_engine() -> Engine:
+    """Dedicated single-connection engine so background writes never compete for the request pool."""
+    from backend.database import DB_POOL_RECYCLE, engine
+
+    if engine.url.get_backend_name() == "sqlite":
+        return engine
+    return create_engine(
+        engine.url, pool_size=1, max_overflow=0, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True
+    )
+
@@ -0,0 +1,204 @@
+# backend/chat_history_store.py
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Store Configuration ---
+# "sqlite" (shared by workers on one host), "none", or "package.module:ClassName" for a networked store
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "sqlite")
+CHAT_HISTORY_PATH = os.getenv("CHAT_HISTORY_PATH", os.path.join(tempfile.gettempdir(), "lms-chat-history.sqlite3"))
+CHAT_HISTORY_TTL_SECONDS = float(os.getenv("CHAT_HISTORY_TTL_SECONDS", str(7 * 24 * 3600)))
+
+SessionKey = Tuple[str, str]  # (user_id, session_id)
+
+
+@dataclass
+class StoredSession:
+    """Compact, JSON-serializable chat state; inline file bytes are replaced by `file_ref` parts."""
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    processed_files: List[str] = field(default_factory=list)
+    version: int = 0  # Incremented on every save; workers reload when the stored version is newer
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "StoredSession":
+        return cls(**json.loads(payload))
+
+
+class ChatHistoryStore(ABC):
+    """Where chat sessions live between requests, so any worker can continue any session."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {"saves": 0, "loads": 0, "deletes": 0, "errors": 0}
+
+    @abstractmethod
+    def load_if_newer(self, key: SessionKey, version: int) -> Optional[StoredSession]:
+        """Returns the stored session if its version is greater than `version`, else None."""
+
+    @abstractmethod
+    def save(self, key: SessionKey, session: StoredSession) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: SessionKey) -> None:
+        ...
+
+    @abstractmethod
+    def delete_user(self, user_id: str) -> None:
+        ...
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"backend": type(self).__name__, **self.counters}
+
+
+class SQLiteChatHistoryStore(ChatHistoryStore):
+    """Single-file store; every worker on the host shares it (WAL mode allows concurrent readers)."""
+
+    def __init__(self, path: str = CHAT_HISTORY_PATH, ttl_seconds: float = CHAT_HISTORY_TTL_SECONDS):
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                " user_id TEXT NOT NULL, session_id TEXT NOT NULL, version INTEGER NOT NULL,"
+                " payload TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (user_id, session_id))"
+            )
+        return self._conn
+
+    def load_if_newer(self, key: SessionKey, version: int) -> Optional[StoredSession]:
+        with self._db_lock:
+            # Version is compared in SQL so an up-to-date worker never reads the payload
+            row = self._connection().execute(
+                "SELECT payload FROM chat_sessions WHERE user_id = ? AND session_id = ? AND version > ? AND updated_at > ?",
+                (key[0], key[1], version, time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            return None
+        self.count("loads")
+        return StoredSession.from_json(row[0])
+
+    def save(self, key: SessionKey, session: StoredSession) -> None:
+        now = time.time()
+        with self._db_lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (user_id, session_id, version, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key[0], key[1], session.version, session.to_json(), now),
+            )
+            conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+        self.count("saves")
+
+    def delete(self, key: SessionKey) -> None:
+        with self._db_lock:
+            self._connection().execute(
+                "DELETE FROM chat_sessions WHERE user_id = ? AND session_id = ?", (key[0], key[1])
+            )
+        self.count("deletes")
+
+    def delete_user(self, user_id: str) -> None:
+        with self._db_lock:
+            self._connection().execute("DELETE FROM chat_sessions WHERE user_id = ?", (user_id,))
+        self.count("deletes")
+
+
+class KeyValueChatHistoryStore(ChatHistoryStore):
+    """
+    Base for networked stores (Redis, Memcached, a cache service, ...). Subclasses implement
+    the three raw operations; sessions are stored as JSON under `chat:{user}:{session}` with
+    a per-user index for delete_user. Point CHAT_HISTORY_BACKEND at the subclass to use it.
+    """
+
+    def __init__(self, ttl_seconds: float = CHAT_HISTORY_TTL_SECONDS, prefix: str = "chat"):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    @abstractmethod
+    def get_value(self, name: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set_value(self, name: str, value: str, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete_values(self, *names: str) -> None:
+        ...
+
+    def _session_name(self, key: SessionKey) -> str:
+        return f"{self.prefix}:{key[0]}:{key[1]}"
+
+    def _index_name(self, user_id: str) -> str:
+        return f"{self.prefix}-index:{user_id}"
+
+    def load_if_newer(self, key: SessionKey, version: int) -> Optional[StoredSession]:
+        payload = self.get_value(self._session_name(key))
+        if payload is None:
+            return None
+        session = StoredSession.from_json(payload)
+        if session.version <= version:
+            return None
+        self.count("loads")
+        return session
+
+    def save(self, key: SessionKey, session: StoredSession) -> None:
+        self.set_value(self._session_name(key), session.to_json(), self.ttl_seconds)
+        index = set(json.loads(self.get_value(self._index_name(key[0])) or "[]"))
+        if key[1] not in index:
+            index.add(key[1])
+            self.set_value(self._index_name(key[0]), json.dumps(sorted(index)), self.ttl_seconds)
+        self.count("saves")
+
+    def delete(self, key: SessionKey) -> None:
+        self.delete_values(self._session_name(key))
+        self.count("deletes")
+
+    def delete_user(self, user_id: str) -> None:
+        session_ids = json.loads(self.get_value(self._index_name(user_id)) or "[]")
+        self.delete_values(self._index_name(user_id), *(self._session_name((user_id, s)) for s in session_ids))
+        self.count("deletes")
+
+
+def create_history_store(backend: str = CHAT_HISTORY_BACKEND) -> Optional[ChatHistoryStore]:
+    """Builds the configured store; None keeps sessions in process memory only."""
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        return SQLiteChatHistoryStore()
+    module_name, _, class_name = backend.partition(":")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class()
+
+
+chat_history_store = create_history_store()
@@ -1,19 +1,80 @@
 # backend/database.py
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+from backend.db_metrics import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    async_pool_metrics,
+    pool_metrics,
+)
+
 load_dotenv()  # Load environment variables from .env
 
 # Database URL
 DATABASE_URL = os.getenv("DATABASE_URL") # Get from environment variable
 
-engine = create_engine(DATABASE_URL)
+# --- Connection Pool Configuration ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Keep below MySQL wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# --- Async Driver Mapping ---
+# Sync driver -> async driver used by the AsyncEngine. Override with ASYNC_DATABASE_URL if needed.
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _engine_kwargs(database_url: str, poolclass) -> dict:
+    """Builds create_engine() pool arguments from the environment."""
+    if database_url and database_url.startswith("sqlite"):
+        # SQLite uses its own pool classes that don't accept sizing arguments
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def to_async_url(database_url: str) -> str:
+    """Converts a sync DATABASE_URL (e.g. mysql+pymysql://) to its async-driver equivalent."""
+    url = make_url(database_url)
+    backend_name = url.get_backend_name()
+    if backend_name not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend_name}'.")
+    return url.set(drivername=ASYNC_DRIVERS[backend_name]).render_as_string(hide_password=False)
+
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL, InstrumentedQueuePool))
+pool_metrics.attach(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Async Engine (used by read-heavy endpoints such as the dashboards) ---
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL, InstrumentedAsyncAdaptedQueuePool)
+)
+async_pool_metrics.attach(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -24,5 +85,45 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# --- Additive Schema Upgrades ---
+# create_all() creates missing tables but never alters existing ones. Columns added to a table
+# that may already exist in a deployed database are listed here and added on startup.
+ADDED_COLUMNS = {
+    "llm_token_usage": ("latency_ms", "finish_reason"),
+    # Buckets written before this column existed read 0 and show no average until rebuilt
+    "llm_usage_hourly": ("latency_count",),
+    "llm_usage_daily": ("latency_count",),
+}
+
+
+def add_missing_columns(bind, metadata, added_columns=ADDED_COLUMNS) -> list:
+    """Issues ALTER TABLE ... ADD COLUMN for listed columns the live table lacks. Returns "table.column" names added."""
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    added = []
+    with bind.begin() as conn:
+        for table_name, column_names in added_columns.items():
+            if not inspector.has_table(table_name):
+                continue  # create_all() made it with every column
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            for name in column_names:
+                if name in existing:
+                    continue
+                column = metadata.tables[table_name].c[name]
+                ddl = f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(name)} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                added.append(f"{table_name}.{name}")
+    return added
+
 # In your database configuration:
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
\ No newline at end of file
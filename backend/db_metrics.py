@@ -0,0 +1,127 @@
+# backend/db_metrics.py
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from backend.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+_CHECKOUT_STARTED_KEY = "checkout_started_at"
+
+
+class PoolMetrics:
+    """Collects connection pool statistics from SQLAlchemy pool events."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkout_wait_ms = Histogram()
+        self.checkout_duration_ms = Histogram()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self._engine: Engine = None
+
+    def attach(self, engine: Engine) -> None:
+        """Registers the pool event listeners on the given engine."""
+        self._engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info[_CHECKOUT_STARTED_KEY] = time.perf_counter()
+        with self.lock:
+            self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop(_CHECKOUT_STARTED_KEY, None)
+        if started is not None:
+            self.checkout_duration_ms.observe((time.perf_counter() - started) * 1000)
+        with self.lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.lock:
+            self.invalidations += 1
+        if exception is not None:
+            logger.warning(f"Pooled DB connection invalidated: {exception}")
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False) -> None:
+        self.checkout_wait_ms.observe(wait_ms)
+        if timed_out:
+            with self.lock:
+                self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the current pool state together with the collected counters and histograms."""
+        pool = self._engine.pool if self._engine is not None else None
+        pool_state: Dict[str, Any] = {"pool_class": type(pool).__name__ if pool else None}
+        if isinstance(pool, QueuePool):
+            pool_state.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout_seconds": pool.timeout(),
+                "recycle_seconds": pool._recycle,
+                "pre_ping": pool._pre_ping,
+            })
+        if pool is not None:
+            pool_state["status"] = pool.status()
+        with self.lock:
+            counters = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checkout_timeouts": self.timeouts,
+            }
+        return {
+            "pool": pool_state,
+            "counters": counters,
+            "checkout_wait_ms": self.checkout_wait_ms.snapshot(),
+            "checkout_duration_ms": self.checkout_duration_ms.snapshot(),
+        }
+
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+class _WaitTimingMixin:
+    """Pool mixin that records how long callers wait for a free connection."""
+
+    metrics: PoolMetrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metrics.record_wait((time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        self.metrics.record_wait((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    metrics = pool_metrics
+
+
+class InstrumentedAsyncAdaptedQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
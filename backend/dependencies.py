@@ -1,17 +1,25 @@
 # backend/dependencies.py
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 from backend import schemas, models
+from backend.auth_cache import user_principal_cache
 from backend.database import get_db
 from backend.utils import SECRET_KEY, ALGORITHM
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login") #tokenUrl is login endpoint
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Verifies the JWT token and returns the user."""
+
+def decode_access_token(token: str) -> schemas.TokenData:
+    """Verifies the JWT signature/expiry and returns its claims."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -22,11 +30,111 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         username: str = payload.get("sub")  # Extract username from subject
         if username is None:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
+        return schemas.TokenData(
+            username=username,
+            user_type=payload.get("user_type"),
+            entity_id=payload.get("entity_id"),
+            section_id=payload.get("section_id"),
+        )
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Verifies the JWT token and returns the user."""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = decode_access_token(token)
+
+    # Cache hit skips the users lookup entirely; entries are invalidated on commit of any
+    # users/teachers/students/parents change (see backend/auth_cache.py)
+    user = user_principal_cache.get(token_data.username)
+    if user is not None:
+        return user
+
+    user = db.query(models.User).options(
+        joinedload(models.User.teacher),
+        joinedload(models.User.student),
+        joinedload(models.User.parent),
+    ).filter(models.User.username == token_data.username).first()
     if user is None:
         raise credentials_exception
+    # Detach so the cached instance can be shared across requests and sessions
+    db.expunge(user)
+    user_principal_cache.put(token_data.username, user)
     return user
 
+
+
+# --- Principal (user + role entity) ---
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user together with the role entity ID and current section from the token."""
+    user: models.User
+    user_type: str
+    entity_id: Optional[int]
+    section_id: Optional[int] = None
+
+
+def _profile_entity_id(user: models.User) -> Optional[int]:
+    """Entity ID from the user's eager-loaded role profile (no query)."""
+    if user.user_type == "Admin":
+        return user.id
+    profile = {"Teacher": user.teacher, "Student": user.student, "Parent": user.parent}.get(user.user_type)
+    return profile.id if profile else None
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    current_user: models.User = Depends(get_current_user),
+) -> Principal:
+    """Returns the caller's principal, preferring the signed token claims over profile lookups."""
+    token_data = decode_access_token(token)
+    if token_data.user_type == current_user.user_type and token_data.entity_id is not None:
+        return Principal(
+            user=current_user,
+            user_type=current_user.user_type,
+            entity_id=token_data.entity_id,
+            section_id=token_data.section_id,
+        )
+    # Tokens issued before the claims existed, or after a role change
+    return Principal(
+        user=current_user,
+        user_type=current_user.user_type,
+        entity_id=_profile_entity_id(current_user),
+    )
+
+
+def _require_role(principal: Principal, user_type: str, audience: str) -> Principal:
+    if principal.user_type != user_type:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Access restricted to {audience}."
+        )
+    if principal.entity_id is None:
+        user = principal.user
+        logger.error(f"No {user_type.lower()} profile found for user_id {user.id} ('{user.username}')")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{user_type} profile not found for the logged-in user."
+        )
+    return principal
+
+
+async def get_current_student(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """Principal of the logged-in student (403 for other roles)."""
+    return _require_role(principal, "Student", "students")
+
+
+async def get_current_teacher(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """Principal of the logged-in teacher (403 for other roles)."""
+    return _require_role(principal, "Teacher", "teachers")
+
+
+async def get_current_parent(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """Principal of the logged-in parent (403 for other roles)."""
+    return _require_role(principal, "Parent", "parents")
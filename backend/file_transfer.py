@@ -0,0 +1,75 @@
+# backend/file_transfer.py
+import logging
+import os
+import threading
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from backend.metrics import Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Transfer Strategy Configuration ---
+# Files up to this size are downloaded and sent inline; larger ones are passed to Vertex by gs:// URI
+GCS_INLINE_MAX_BYTES = int(os.getenv("GCS_INLINE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Same limit for video/audio; the default 0 always sends media by reference
+GCS_INLINE_MEDIA_MAX_BYTES = int(os.getenv("GCS_INLINE_MEDIA_MAX_BYTES", "0"))
+
+BYTE_BUCKETS = tuple(2 ** n * 1024 for n in range(6, 21, 2))  # 64KB .. 1GB
+
+_MEDIA_PREFIXES = ("video/", "audio/")
+
+
+def should_inline(mime_type: str, size: int) -> bool:
+    """True if a file should be downloaded and embedded; False to send it by URI instead."""
+    limit = GCS_INLINE_MEDIA_MAX_BYTES if mime_type.startswith(_MEDIA_PREFIXES) else GCS_INLINE_MAX_BYTES
+    return size <= limit
+
+
+class FileTransferMetrics:
+    """Per-call inline vs by-reference file volumes for model requests."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.inline_files = 0
+        self.reference_files = 0
+        self.inline_bytes_total = 0
+        self.reference_bytes_total = 0
+        self.inline_bytes_per_call = Histogram(buckets=BYTE_BUCKETS)  # Memory held by one call's Parts
+        self.reference_bytes_per_call = Histogram(buckets=BYTE_BUCKETS)  # Read by Vertex directly from GCS
+
+    def record_call(self, inline_files: int, inline_bytes: int, reference_files: int, reference_bytes: int) -> None:
+        with self.lock:
+            self.calls += 1
+            self.inline_files += inline_files
+            self.reference_files += reference_files
+            self.inline_bytes_total += inline_bytes
+            self.reference_bytes_total += reference_bytes
+        self.inline_bytes_per_call.observe(inline_bytes)
+        self.reference_bytes_per_call.observe(reference_bytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            totals = {
+                "calls": self.calls,
+                "inline_files": self.inline_files,
+                "reference_files": self.reference_files,
+                "inline_bytes_total": self.inline_bytes_total,
+                "reference_bytes_total": self.reference_bytes_total,
+            }
+        return {
+            **totals,
+            "inline_bytes_per_call": self.inline_bytes_per_call.snapshot(),
+            "reference_bytes_per_call": self.reference_bytes_per_call.snapshot(),
+            "limits": {
+                "inline_max_bytes": GCS_INLINE_MAX_BYTES,
+                "inline_media_max_bytes": GCS_INLINE_MEDIA_MAX_BYTES,
+            },
+        }
+
+
+file_transfer_metrics = FileTransferMetrics()
@@ -0,0 +1,203 @@
+# backend/gcs_cache.py
+import base64
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Cache Configuration ---
+GCS_CACHE_DIR = os.getenv("GCS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "lms-gcs-cache"))
+GCS_CACHE_MAX_BYTES = int(os.getenv("GCS_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+GCS_METADATA_TTL_SECONDS = float(os.getenv("GCS_METADATA_TTL_SECONDS", "60"))  # How long blob metadata is trusted
+
+
+@dataclass(frozen=True)
+class BlobInfo:
+    """Metadata for one GCS object; `key` identifies its content without downloading it."""
+    gs_uri: str
+    bucket_name: str
+    blob_name: str
+    key: str
+    size: int
+    generation: Optional[int]
+    content_type: Optional[str]
+
+
+def split_gs_uri(gs_uri: str) -> Tuple[str, str]:
+    path_parts = gs_uri.replace("gs://", "").split("/", 1)
+    return path_parts[0], path_parts[1]
+
+
+def content_key(bucket_name: str, blob_name: str, md5_hash: Optional[str], generation: Optional[int]) -> str:
+    """MD5 when GCS reports it (dedups identical files across paths), else bucket/name/generation."""
+    if md5_hash:
+        return "md5-" + base64.b64decode(md5_hash).hex()
+    # Composite objects have no MD5; a generation is immutable, so it's still a safe key
+    safe_name = blob_name.replace("/", "_")
+    return f"gen-{bucket_name}-{safe_name}-{generation}"
+
+
+class GCSFileCache:
+    """On-disk, content-addressed cache of GCS objects with a byte cap and LRU eviction."""
+
+    def __init__(self, cache_dir: str = GCS_CACHE_DIR, max_bytes: int = GCS_CACHE_MAX_BYTES,
+                 metadata_ttl_seconds: float = GCS_METADATA_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.metadata_ttl_seconds = metadata_ttl_seconds
+        self.lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> size, least recently used first
+        self._metadata: Dict[str, Tuple[float, BlobInfo]] = {}  # gs_uri -> (expires_at, info)
+        self._loaded = False
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.metadata_lookups = 0
+        self.bytes_downloaded = 0
+        self.bytes_from_cache = 0
+        self.evictions = 0
+
+    def _load_index(self) -> None:
+        """Rebuilds the LRU index from files left by a previous process (oldest access first)."""
+        if self._loaded:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".part"):
+                os.remove(path)  # Interrupted download
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_atime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self.total_bytes += size
+        self._loaded = True
+
+    def stat(self, storage_client: Any, gs_uri: str) -> BlobInfo:
+        """Returns the object's metadata (one metadata GET, memoized briefly); never downloads bytes."""
+        now = time.monotonic()
+        with self.lock:
+            cached = self._metadata.get(gs_uri)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        bucket_name, blob_name = split_gs_uri(gs_uri)
+        blob = storage_client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"GCS object not found: {gs_uri}")
+        info = BlobInfo(
+            gs_uri=gs_uri,
+            bucket_name=bucket_name,
+            blob_name=blob_name,
+            key=content_key(bucket_name, blob_name, blob.md5_hash, blob.generation),
+            size=blob.size or 0,
+            generation=blob.generation,
+            content_type=blob.content_type,
+        )
+        with self.lock:
+            self.metadata_lookups += 1
+            self._metadata[gs_uri] = (now + self.metadata_ttl_seconds, info)
+        return info
+
+    def read(self, storage_client: Any, info: BlobInfo) -> bytes:
+        """Returns the object's bytes from disk, downloading (pinned to its generation) on a miss."""
+        path = os.path.join(self.cache_dir, info.key)
+        with self.lock:
+            self._load_index()
+            hit = info.key in self._index
+            if hit:
+                self._index.move_to_end(info.key)
+        if hit:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # Keeps LRU order across restarts
+                with self.lock:
+                    self.hits += 1
+                    self.bytes_from_cache += len(data)
+                return data
+            except FileNotFoundError:
+                with self.lock:  # Removed behind our back; fall through to a download
+                    self.total_bytes -= self._index.pop(info.key, 0)
+
+        blob = storage_client.bucket(info.bucket_name).blob(info.blob_name, generation=info.generation)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        blob.download_to_filename(tmp_path)  # Verifies the MD5/CRC32C checksum
+        os.replace(tmp_path, path)
+        with open(path, "rb") as f:
+            data = f.read()
+
+        with self.lock:
+            self.misses += 1
+            self.bytes_downloaded += len(data)
+            if info.key not in self._index:
+                self._index[info.key] = len(data)
+                self.total_bytes += len(data)
+            self._evict_over_budget(keep=info.key)
+        return data
+
+    def _evict_over_budget(self, keep: str) -> None:
+        while self.max_bytes > 0 and self.total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = next(iter(self._index.items()))
+            if key == keep:
+                break
+            del self._index[key]
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "cache_dir": self.cache_dir,
+                "files": len(self._index),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "metadata_lookups": self.metadata_lookups,
+                "bytes_downloaded": self.bytes_downloaded,
+                "bytes_from_cache": self.bytes_from_cache,
+                "evictions": self.evictions,
+            }
+
+
+gcs_file_cache = GCSFileCache()
+
+_shared_client: Optional[Any] = None
+_shared_client_lock = threading.Lock()
+
+
+def shared_storage_client() -> Optional[Any]:
+    """Process-wide GCS client, or None outside GCP (GCP_ENV != true)."""
+    global _shared_client
+    if os.getenv("GCP_ENV", "false").lower() != "true":
+        return None
+    with _shared_client_lock:
+        if _shared_client is None:
+            from google.cloud import storage  # Imported lazily; only needed on GCP
+            _shared_client = storage.Client()
+        return _shared_client
+
+
+def content_keys(gs_uris: List[str]) -> Optional[List[str]]:
+    """Content keys for the given objects from metadata only; None if GCS isn't reachable here."""
+    storage_client = shared_storage_client()
+    if storage_client is None:
+        return None
+    return [gcs_file_cache.stat(storage_client, gs_uri).key for gs_uri in gs_uris]
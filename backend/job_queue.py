@@ -0,0 +1,349 @@
+# backend/job_queue.py
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from backend.metrics import Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Job Queue Configuration ---
+JOB_WORKERS_ENABLED = os.getenv("JOB_WORKERS_ENABLED", "true").lower() == "true"  # False on API-only replicas
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))  # Jobs run at once per process
+# Optional per-kind caps within the pool, e.g. "analyze_assignment_sample=1,generate_assessment_questions=2"
+JOB_KIND_CONCURRENCY = os.getenv("JOB_KIND_CONCURRENCY", "")
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))  # Idle workers look for jobs from other processes
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))  # Running jobs without a heartbeat this long are requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))  # Counts claims; only a lost worker causes another attempt
+JOB_SSE_POLL_SECONDS = float(os.getenv("JOB_SSE_POLL_SECONDS", "1"))
+
+# Queue wait and run time in milliseconds
+JOB_MS_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000, 600000)
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+
+def parse_kind_limits(spec: str) -> Dict[str, int]:
+    """"kind=2,other=1" -> {"kind": 2, "other": 1}."""
+    limits = {}
+    for item in spec.split(","):
+        kind, _, limit = item.strip().partition("=")
+        if kind and limit:
+            limits[kind] = int(limit)
+    return limits
+
+
+class JobContext:
+    """What a handler sees of its job: identity, payload and a way to report progress."""
+
+    def __init__(self, queue: "JobQueue", job_id: str, kind: str, user_id: int, payload: Dict[str, Any]):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.user_id = user_id
+        self.payload = payload
+
+    async def progress(self, percent: int, message: Optional[str] = None) -> None:
+        """Stores progress (0-100) for status polls and SSE subscribers; also refreshes the heartbeat."""
+        await asyncio.to_thread(self.queue._update_progress, self.id, percent, message)
+
+
+JobHandler = Callable[[JobContext], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Database-backed queue of long-running AI jobs (the generation_jobs table) and the
+    in-process worker pool that runs them.
+
+    Any process can enqueue; every process with workers enabled claims queued jobs with a
+    conditional UPDATE, so each job runs once even with several workers. Results stay in the
+    table, so they can be fetched after the submitting client has gone. Jobs held by a worker
+    that died are requeued once their heartbeat goes stale.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None,
+                 concurrency: int = JOB_WORKER_CONCURRENCY, kind_limits: Optional[Dict[str, int]] = None,
+                 poll_interval: float = JOB_POLL_INTERVAL_SECONDS, stale_seconds: float = JOB_STALE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self._session_factory = session_factory
+        self.concurrency = concurrency
+        self.kind_limits = parse_kind_limits(JOB_KIND_CONCURRENCY) if kind_limits is None else kind_limits
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self.lock = threading.Lock()
+        self.running: Dict[str, str] = {}  # job_id -> kind, for jobs this process is running
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._last_stale_check = 0.0
+        self.counters = {"enqueued": 0, "claimed": 0, "succeeded": 0, "failed": 0, "requeued": 0}
+        self.queue_wait_ms = Histogram(buckets=JOB_MS_BUCKETS)
+        self.run_ms = Histogram(buckets=JOB_MS_BUCKETS)
+
+    def _session(self):
+        if self._session_factory is None:
+            from backend.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        """Decorator registering the coroutine that runs jobs of `kind`."""
+        def register(func: JobHandler) -> JobHandler:
+            self.handlers[kind] = func
+            return func
+        return register
+
+    # --- Submitting and reading jobs ---
+    def enqueue(self, db: Any, kind: str, user_id: int, payload: Dict[str, Any]) -> Any:
+        """Stores a queued job (committing `db`) and wakes this process's idle workers."""
+        from backend import models
+        if kind not in self.handlers:
+            raise ValueError(f"No job handler registered for '{kind}'.")
+        job = models.GenerationJob(
+            id=str(uuid.uuid4()), kind=kind, status="queued", user_id=user_id,
+            payload=jsonable_encoder(payload), progress=0, attempts=0, created_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._count("enqueued")
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)  # Endpoints may run in the threadpool
+        return job
+
+    def fetch(self, job_id: str) -> Optional[Any]:
+        """Loads a job on a short-lived session (for pollers outside a request's session)."""
+        from backend import models
+        db = self._session()
+        try:
+            job = db.get(models.GenerationJob, job_id)
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    # --- Worker side (sync; called through asyncio.to_thread) ---
+    def _claimable_kinds(self) -> Optional[List[str]]:
+        """Kinds this process may start now, or None for "any"."""
+        if not self.kind_limits:
+            return None
+        with self.lock:
+            busy = list(self.running.values())
+        return [kind for kind in self.handlers if busy.count(kind) < self.kind_limits.get(kind, self.concurrency)]
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Takes the oldest queued job this process can run; None if there is none."""
+        from backend import models
+        Job = models.GenerationJob
+        db = self._session()
+        try:
+            if time.monotonic() - self._last_stale_check > self.stale_seconds / 2:
+                self._last_stale_check = time.monotonic()
+                self._requeue_stale(db)
+            kinds = self._claimable_kinds()
+            if kinds == []:
+                return None
+            query = db.query(Job.id).filter(Job.status == "queued", Job.kind.in_(kinds or list(self.handlers)))
+            for (job_id,) in query.order_by(Job.created_at).limit(self.concurrency).all():
+                now = datetime.utcnow()
+                claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+                    Job.status: "running", Job.worker_id: self.worker_id, Job.started_at: now,
+                    Job.heartbeat_at: now, Job.attempts: Job.attempts + 1,
+                }, synchronize_session=False)
+                db.commit()
+                if claimed != 1:
+                    continue  # Another worker got there first
+                job = db.get(Job, job_id)
+                with self.lock:
+                    self.running[job.id] = job.kind
+                self._count("claimed")
+                self.queue_wait_ms.observe((now - job.created_at).total_seconds() * 1000)
+                return {"id": job.id, "kind": job.kind, "user_id": job.user_id, "payload": job.payload}
+            return None
+        finally:
+            db.close()
+
+    def _requeue_stale(self, db: Any) -> None:
+        """Requeues jobs whose worker stopped heartbeating (or fails them once out of attempts)."""
+        from backend import models
+        Job = models.GenerationJob
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        stale = Job.status == "running", Job.heartbeat_at < cutoff
+        failed = db.query(Job).filter(*stale, Job.attempts >= self.max_attempts).update({
+            Job.status: "failed", Job.error: "The worker running this job stopped responding.",
+            Job.finished_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        requeued = db.query(Job).filter(*stale, Job.attempts < self.max_attempts).update(
+            {Job.status: "queued", Job.worker_id: None}, synchronize_session=False
+        )
+        db.commit()
+        if failed or requeued:
+            logger.warning(f"Stale generation jobs: {requeued} requeued, {failed} failed.")
+            with self.lock:
+                self.counters["requeued"] += requeued
+
+    def _update_progress(self, job_id: str, percent: int, message: Optional[str]) -> None:
+        from backend import models
+        Job = models.GenerationJob
+        db = self._session()
+        try:
+            db.query(Job).filter(Job.id == job_id, Job.worker_id == self.worker_id).update({
+                Job.progress: max(0, min(100, int(percent))), Job.progress_message: (message or "")[:255] or None,
+                Job.heartbeat_at: datetime.utcnow(),
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _heartbeat(self) -> None:
+        from backend import models
+        Job = models.GenerationJob
+        with self.lock:
+            job_ids = list(self.running)
+        if not job_ids:
+            return
+        db = self._session()
+        try:
+            db.query(Job).filter(Job.id.in_(job_ids), Job.worker_id == self.worker_id).update(
+                {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        from backend import models
+        Job = models.GenerationJob
+        values = {Job.status: status, Job.finished_at: datetime.utcnow(), Job.result: result, Job.error: error}
+        if status == "succeeded":
+            values.update({Job.progress: 100, Job.progress_message: None})
+        db = self._session()
+        try:
+            db.query(Job).filter(Job.id == job_id, Job.worker_id == self.worker_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _release_running(self) -> None:
+        """On shutdown, hands this process's unfinished jobs back to the queue."""
+        from backend import models
+        Job = models.GenerationJob
+        db = self._session()
+        try:
+            requeued = db.query(Job).filter(Job.status == "running", Job.worker_id == self.worker_id).update(
+                {Job.status: "queued", Job.worker_id: None, Job.attempts: Job.attempts - 1}, synchronize_session=False
+            )
+            db.commit()
+            if requeued:
+                logger.info(f"Returned {requeued} unfinished generation job(s) to the queue.")
+        finally:
+            db.close()
+
+    # --- Worker pool ---
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        """Runs one claimed job and stores its result or error."""
+        context = JobContext(self, job["id"], job["kind"], job["user_id"], job["payload"])
+        started = time.perf_counter()
+        try:
+            result = await self.handlers[job["kind"]](context)
+            await asyncio.to_thread(self._finish, job["id"], "succeeded", jsonable_encoder(result))
+            self._count("succeeded")
+        except asyncio.CancelledError:
+            raise  # Shutdown; _release_running requeues it
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+            logger.error(f"Generation job {job['id']} ({job['kind']}) failed: {error}", exc_info=not isinstance(e, HTTPException))
+            await asyncio.to_thread(self._finish, job["id"], "failed", None, str(error))
+            self._count("failed")
+        finally:
+            self.run_ms.observe((time.perf_counter() - started) * 1000)
+            with self.lock:
+                self.running.pop(job["id"], None)
+
+    async def _worker_loop(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Error claiming generation job: {e}")
+                job = None
+            if job is not None:
+                await self.run_job(job)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(self._heartbeat)
+            except Exception as e:
+                logger.error(f"Error refreshing generation job heartbeats: {e}")
+
+    def start(self) -> None:
+        """Starts the worker pool on the running event loop."""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        logger.info(f"Generation job workers started ({self.concurrency} slots, id {self.worker_id}).")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await asyncio.to_thread(self._release_running)
+        except Exception as e:
+            logger.error(f"Error requeuing unfinished generation jobs: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            counters = dict(self.counters)
+            running = dict(self.running)
+        return {
+            "worker_id": self.worker_id,
+            "workers_started": bool(self._tasks),
+            "concurrency": self.concurrency,
+            "kind_limits": self.kind_limits,
+            "running": running,
+            **counters,
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "run_ms": self.run_ms.snapshot(),
+        }
+
+
+job_queue = JobQueue()
+
+
+def job_urls(job_id: str) -> Dict[str, str]:
+    return {"status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
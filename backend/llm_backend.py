@@ -0,0 +1,131 @@
+# backend/llm_backend.py
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+try:
+    from vertexai.generative_models import Content, GenerationConfig, Part
+except ImportError:
+    Content = None
+    GenerationConfig = None
+    Part = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Backend Configuration ---
+LLM_BACKEND = os.getenv("LLM_BACKEND", "vertex")  # "vertex" or "fake" (offline load tests)
+
+
+class LLMBackend(ABC):
+    """
+    What the AI code needs from a model provider.
+
+    Models returned by get_model expose `generate_content_async(contents, generation_config=None)`
+    and `start_chat(history=None)`; chats expose `send_message(parts)`,
+    `send_message_async(parts, stream=False)` and `history`. Responses (and stream chunks) carry
+    `text`, `candidates[0].finish_reason` and `usage_metadata` token counts.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def is_configured(self, project: Optional[str], location: Optional[str]) -> bool:
+        """True if models can be served for this project/location."""
+        return self.available
+
+    @abstractmethod
+    def get_model(self, project: Optional[str], location: Optional[str], model_name: str) -> Any:
+        ...
+
+    @abstractmethod
+    def text_part(self, text: str) -> Any:
+        ...
+
+    @abstractmethod
+    def uri_part(self, uri: str, mime_type: str) -> Any:
+        ...
+
+    @abstractmethod
+    def data_part(self, data: bytes, mime_type: str) -> Any:
+        ...
+
+    @abstractmethod
+    def part_from_dict(self, part: Dict[str, Any]) -> Any:
+        ...
+
+    @abstractmethod
+    def content(self, role: str, parts: List[Any]) -> Any:
+        ...
+
+    def json_generation_config(self) -> Any:
+        """Generation config asking for a JSON response (None if the backend has no such option)."""
+        return None
+
+    def warmup(self, keys: Iterable[Tuple[str, str, str]]) -> None:
+        """Prepares models ahead of the first request; a no-op by default."""
+
+
+class VertexBackend(LLMBackend):
+    """Vertex AI Gemini; model clients are shared through the model registry."""
+
+    name = "vertex"
+
+    @property
+    def available(self) -> bool:
+        return Part is not None
+
+    def is_configured(self, project: Optional[str], location: Optional[str]) -> bool:
+        return self.available and bool(project and location)
+
+    def get_model(self, project: Optional[str], location: Optional[str], model_name: str) -> Any:
+        from backend.model_registry import model_registry
+        return model_registry.get(project, location, model_name)
+
+    def text_part(self, text: str) -> Any:
+        return Part.from_text(text)
+
+    def uri_part(self, uri: str, mime_type: str) -> Any:
+        return Part.from_uri(uri=uri, mime_type=mime_type)
+
+    def data_part(self, data: bytes, mime_type: str) -> Any:
+        return Part.from_data(data=data, mime_type=mime_type)
+
+    def part_from_dict(self, part: Dict[str, Any]) -> Any:
+        return Part.from_dict(part)
+
+    def content(self, role: str, parts: List[Any]) -> Any:
+        return Content(role=role, parts=parts)
+
+    def json_generation_config(self) -> Any:
+        return GenerationConfig(response_mime_type="application/json")
+
+    def warmup(self, keys: Iterable[Tuple[str, str, str]]) -> None:
+        from backend.model_registry import model_registry
+        model_registry.warmup(keys)
+
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend() -> LLMBackend:
+    """Returns the process-wide backend selected by LLM_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if LLM_BACKEND == "fake":
+                from backend.llm_fake import FakeBackend
+                _backend = FakeBackend()
+                logger.warning("Using the fake LLM backend; responses are canned.")
+            else:
+                _backend = VertexBackend()
+        return _backend
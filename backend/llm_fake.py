@@ -0,0 +1,265 @@
+# backend/llm_fake.py
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from backend.llm_backend import LLMBackend
+
+load_dotenv()
+
+# --- Fake Backend Configuration ---
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "200"))  # Per response (split across stream chunks)
+LLM_FAKE_STREAM_CHUNKS = int(os.getenv("LLM_FAKE_STREAM_CHUNKS", "8"))
+# Optional JSON list of {"match": "<prompt substring>", "text": "<response>"}; first match wins
+LLM_FAKE_RESPONSES_PATH = os.getenv("LLM_FAKE_RESPONSES_PATH")
+
+
+class FakeFinishReason(Enum):
+    STOP = 1
+
+
+@dataclass
+class FakeBlob:
+    data: bytes
+    mime_type: str
+
+
+@dataclass
+class FakePart:
+    text: Optional[str] = None
+    inline_data: Optional[FakeBlob] = None
+    file_uri: Optional[str] = None
+    mime_type: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.inline_data is not None:
+            data = base64.b64encode(self.inline_data.data).decode()
+            return {"inline_data": {"mime_type": self.inline_data.mime_type, "data": data}}
+        if self.file_uri is not None:
+            return {"file_data": {"mime_type": self.mime_type, "file_uri": self.file_uri}}
+        return {"text": self.text}
+
+    @classmethod
+    def from_dict(cls, part: Dict[str, Any]) -> "FakePart":
+        if "inline_data" in part:
+            blob = part["inline_data"]
+            return cls(inline_data=FakeBlob(base64.b64decode(blob["data"]), blob["mime_type"]))
+        if "file_data" in part:
+            return cls(file_uri=part["file_data"]["file_uri"], mime_type=part["file_data"]["mime_type"])
+        return cls(text=part.get("text", ""))
+
+
+@dataclass
+class FakeContent:
+    role: str
+    parts: List[FakePart]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "parts": [part.to_dict() for part in self.parts]}
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+
+    @property
+    def total_token_count(self) -> int:
+        return self.prompt_token_count + self.candidates_token_count
+
+
+@dataclass
+class FakeCandidate:
+    content: FakeContent
+    finish_reason: FakeFinishReason = FakeFinishReason.STOP
+
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: Optional[FakeUsage] = None
+    candidates: List[FakeCandidate] = field(default_factory=list)
+
+
+def _as_parts(contents: Any) -> List[FakePart]:
+    items = contents if isinstance(contents, list) else [contents]
+    return [FakePart(text=item) if isinstance(item, str) else item for item in items]
+
+
+def _count_tokens(parts: List[FakePart]) -> int:
+    """Roughly 4 characters (or bytes) per token; URI files are charged a flat amount."""
+    total = 0
+    for part in parts:
+        if part.inline_data is not None:
+            total += len(part.inline_data.data) // 4
+        elif part.file_uri is not None:
+            total += 1000
+        else:
+            total += len(part.text or "") // 4
+    return max(total, 1)
+
+
+def _response(text: str, prompt_tokens: int) -> FakeResponse:
+    return FakeResponse(
+        text=text,
+        usage_metadata=FakeUsage(prompt_tokens, max(len(text) // 4, 1)),
+        candidates=[FakeCandidate(content=FakeContent("model", [FakePart(text=text)]))],
+    )
+
+
+def _canned_questions(prompt: str) -> str:
+    """
+    Fills every "- N questions of type 'X'" line in a generation prompt. Texts carry a tag
+    from the prompt so separately generated parts (fan-out chunks) don't look like duplicates.
+    """
+    tag = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+    questions = []
+    for count, question_type in re.findall(r"- (\d+) questions of type '([\w.]+)'", prompt):
+        question_type = question_type.split(".")[-1].lower()  # Tolerates "QuestionTypeEnum.X"
+        for _ in range(int(count)):
+            number = len(questions) + 1
+            question = {
+                "question_number": number,
+                "question_type": question_type,
+                "question_text": f"Fake {question_type} question {number} ({tag})?",
+                "correct_answer": "A",
+                "explanation": "Canned output from the fake LLM backend.",
+                "reference_page": 1,
+            }
+            if question_type in ("single_select", "multi_select", "match_following"):
+                question["options"] = ["A", "B", "C", "D"]
+            if question_type == "multi_select":
+                question["correct_answer"] = ["A", "B"]
+            questions.append(question)
+    return json.dumps({"generated_questions": questions})
+
+
+class FakeModel:
+    """Deterministic stand-in for a GenerativeModel with configurable latency and canned output."""
+
+    def __init__(self, model_name: str, canned: List[Dict[str, str]]):
+        self.model_name = model_name
+        self.canned = canned
+
+    def respond(self, parts: List[FakePart]) -> FakeResponse:
+        prompt = "\n".join(part.text for part in parts if part.text)
+        return _response(self._text_for(prompt), _count_tokens(parts))
+
+    def _text_for(self, prompt: str) -> str:
+        for entry in self.canned:
+            if entry["match"] in prompt:
+                return entry["text"]
+        if "question_counts" in prompt:
+            counts = [{"type": "single_select", "count": 5}, {"type": "short_answer", "count": 3}]
+            return json.dumps({"question_counts": counts})
+        if "generated_questions" in prompt:
+            return _canned_questions(prompt)
+        if '"choices"' in prompt:
+            question = {
+                "question": "Fake assessment question?",
+                "choices": ["A", "B", "C", "D"],
+                "choice_type": "multi-choice",
+                "correct_answer": "A",
+            }
+            return f"```json\n{json.dumps(question)}\n```"
+        return f"Fake answer ({self.model_name}): {prompt[-200:].strip()}"
+
+    async def generate_content_async(self, contents: Any, generation_config: Any = None) -> FakeResponse:
+        await asyncio.sleep(LLM_FAKE_LATENCY_MS / 1000)
+        return self.respond(_as_parts(contents))
+
+    def generate_content(self, contents: Any, generation_config: Any = None) -> FakeResponse:
+        time.sleep(LLM_FAKE_LATENCY_MS / 1000)
+        return self.respond(_as_parts(contents))
+
+    def start_chat(self, history: Optional[List[FakeContent]] = None) -> "FakeChat":
+        return FakeChat(self, history)
+
+
+class FakeChat:
+    """Chat over a FakeModel; like Vertex, the whole history counts toward prompt tokens."""
+
+    def __init__(self, model: FakeModel, history: Optional[List[FakeContent]] = None):
+        self.model = model
+        self.history: List[FakeContent] = list(history or [])
+
+    def _reply(self, parts: List[FakePart]) -> FakeResponse:
+        response = self.model.respond(parts)
+        history_parts = [part for content in self.history for part in content.parts]
+        response.usage_metadata.prompt_token_count = _count_tokens(history_parts + parts)
+        return response
+
+    def _commit(self, parts: List[FakePart], text: str) -> None:
+        self.history.append(FakeContent("user", parts))
+        self.history.append(FakeContent("model", [FakePart(text=text)]))
+
+    def send_message(self, content: Any) -> FakeResponse:
+        parts = _as_parts(content)
+        time.sleep(LLM_FAKE_LATENCY_MS / 1000)
+        response = self._reply(parts)
+        self._commit(parts, response.text)
+        return response
+
+    async def send_message_async(self, content: Any, stream: bool = False) -> Any:
+        parts = _as_parts(content)
+        if stream:
+            return self._stream(parts)
+        await asyncio.sleep(LLM_FAKE_LATENCY_MS / 1000)
+        response = self._reply(parts)
+        self._commit(parts, response.text)
+        return response
+
+    async def _stream(self, parts: List[FakePart]) -> AsyncIterator[FakeResponse]:
+        response = self._reply(parts)
+        chunk_count = max(LLM_FAKE_STREAM_CHUNKS, 1)
+        size = max(len(response.text) // chunk_count + 1, 1)
+        pieces = [response.text[i:i + size] for i in range(0, len(response.text), size)] or [""]
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(LLM_FAKE_LATENCY_MS / 1000 / len(pieces))
+            chunk = _response(piece, 0)
+            # Like Vertex, the final chunk carries usage for the whole exchange
+            chunk.usage_metadata = response.usage_metadata if index == len(pieces) - 1 else None
+            yield chunk
+        self._commit(parts, response.text)
+
+
+class FakeBackend(LLMBackend):
+    """Offline backend for load tests and local development (LLM_BACKEND=fake)."""
+
+    name = "fake"
+
+    def __init__(self, responses_path: Optional[str] = LLM_FAKE_RESPONSES_PATH):
+        self.canned: List[Dict[str, str]] = []
+        if responses_path:
+            with open(responses_path) as f:
+                self.canned = json.load(f)
+        self._models: Dict[str, FakeModel] = {}
+
+    def get_model(self, project: Optional[str], location: Optional[str], model_name: str) -> FakeModel:
+        if model_name not in self._models:
+            self._models[model_name] = FakeModel(model_name, self.canned)
+        return self._models[model_name]
+
+    def text_part(self, text: str) -> FakePart:
+        return FakePart(text=text)
+
+    def uri_part(self, uri: str, mime_type: str) -> FakePart:
+        return FakePart(file_uri=uri, mime_type=mime_type)
+
+    def data_part(self, data: bytes, mime_type: str) -> FakePart:
+        return FakePart(inline_data=FakeBlob(data, mime_type))
+
+    def part_from_dict(self, part: Dict[str, Any]) -> FakePart:
+        return FakePart.from_dict(part)
+
+    def content(self, role: str, parts: List[Any]) -> FakeContent:
+        return FakeContent(role, parts)
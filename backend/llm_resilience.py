@@ -0,0 +1,282 @@
+# backend/llm_resilience.py
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from backend.llm_scheduler import LLMScheduler, llm_scheduler
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    RETRYABLE_ERRORS: Tuple[type, ...] = (
+        google_exceptions.TooManyRequests,  # Includes ResourceExhausted (429 quota)
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.GatewayTimeout,  # Includes DeadlineExceeded
+        google_exceptions.Aborted,
+    )
+except ImportError:
+    RETRYABLE_ERRORS = ()
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Resilience Configuration ---
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY_MS = float(os.getenv("LLM_RETRY_BASE_DELAY_MS", "500"))
+LLM_RETRY_MAX_DELAY_MS = float(os.getenv("LLM_RETRY_MAX_DELAY_MS", "8000"))
+LLM_DEFAULT_DEADLINE_SECONDS = float(os.getenv("LLM_DEFAULT_DEADLINE_SECONDS", "120"))
+# Per-action deadlines by action prefix; the longest matching prefix wins
+LLM_ACTION_DEADLINES = os.getenv(
+    "LLM_ACTION_DEADLINES", "ask_question=60,generate_teacher_notes=90,generate_questions_fmt_=300,analyze_assignment_sample=120"
+)
+# Hedging sends a duplicate request once the first is slower than this percentile of recent calls
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # No hedging until the action has this much history
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))  # Recent successful calls kept per action
+
+T = TypeVar("T")
+
+
+def parse_deadlines(spec: str) -> Dict[str, float]:
+    deadlines = {}
+    for item in spec.split(","):
+        prefix, _, seconds = item.strip().partition("=")
+        if prefix and seconds:
+            deadlines[prefix] = float(seconds)
+    return deadlines
+
+
+def action_family(action: str) -> str:
+    """Strips a trailing id ("generate_questions_fmt_12" -> "generate_questions_fmt") so metrics stay bounded."""
+    return re.sub(r"_\d+$", "", action)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, server errors and dropped connections; never the caller's own errors or deadlines."""
+    if isinstance(exc, HTTPException):
+        return False
+    return isinstance(exc, RETRYABLE_ERRORS + (ConnectionError,))
+
+
+class LLMDeadlineExceeded(HTTPException):
+    """An action ran out of time across all its attempts; reported to clients as 504."""
+
+    def __init__(self, action: str, deadline: float):
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"The AI service did not respond within {deadline:.0f}s for '{action_family(action)}'.",
+        )
+
+
+class LLMResilience:
+    """
+    Wraps model calls with jittered exponential retry on transient errors, a deadline per
+    action covering every attempt, and (for idempotent calls) hedging: if the first request
+    is slower than the action's recent latency percentile, a duplicate is sent and whichever
+    finishes first wins; the other is cancelled.
+
+    Given a model_name, each request first takes an `llm_scheduler` slot. Time spent queued
+    for a slot is bounded by the scheduler's own lane timeout and is excluded from the
+    deadline, the latency history and the hedge timer, and a hedge is only sent when the
+    scheduler has a slot free, so hedging never adds to a queue.
+    """
+
+    def __init__(self, max_attempts: int = LLM_RETRY_MAX_ATTEMPTS, base_delay_ms: float = LLM_RETRY_BASE_DELAY_MS,
+                 max_delay_ms: float = LLM_RETRY_MAX_DELAY_MS, default_deadline: float = LLM_DEFAULT_DEADLINE_SECONDS,
+                 deadlines: Optional[Dict[str, float]] = None, hedge_enabled: bool = LLM_HEDGE_ENABLED,
+                 hedge_percentile: float = LLM_HEDGE_PERCENTILE, hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+                 latency_window: int = LLM_LATENCY_WINDOW, scheduler: LLMScheduler = llm_scheduler):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay_ms / 1000
+        self.max_delay = max_delay_ms / 1000
+        self.default_deadline = default_deadline
+        self.deadlines = parse_deadlines(LLM_ACTION_DEADLINES) if deadlines is None else deadlines
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        self.scheduler = scheduler
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, action: str, name: str) -> None:
+        family = action_family(action)
+        with self.lock:
+            counters = self.counters.setdefault(family, {
+                "calls": 0, "retries": 0, "failures": 0, "deadline_exceeded": 0, "hedges": 0, "hedge_wins": 0,
+                "hedges_skipped": 0,
+            })
+            counters[name] += 1
+
+    def deadline_for(self, action: str) -> float:
+        matches = [prefix for prefix in self.deadlines if action.startswith(prefix)]
+        return self.deadlines[max(matches, key=len)] if matches else self.default_deadline
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2^attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _record_latency(self, action: str, seconds: float) -> None:
+        family = action_family(action)
+        with self.lock:
+            window = self.latencies.get(family)
+            if window is None:
+                window = self.latencies[family] = deque(maxlen=self.latency_window)
+            window.append(seconds)
+
+    def hedge_after(self, action: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while the action has too little history."""
+        with self.lock:
+            samples = sorted(self.latencies.get(action_family(action), ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+
+    def _slot_async(self, model_name: Optional[str], user_id: Any, action: str) -> Any:
+        if model_name is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot_async(model_name, user_id, action)
+
+    def _give_up(self, action: str, error: Exception, attempt_number: int, spent: float, deadline: float) -> Optional[float]:
+        """Backoff before the next attempt, or None to re-raise (counting the failure)."""
+        delay = self.backoff(attempt_number)
+        if not is_retryable(error) or attempt_number == self.max_attempts - 1 or spent + delay >= deadline:
+            self._count(action, "failures")
+            return None
+        self._count(action, "retries")
+        logger.warning(f"Retrying '{action}' in {delay:.2f}s after attempt {attempt_number + 1} failed: {error}")
+        return delay
+
+    # --- Async calls ---
+    async def _run(self, action: str, attempt: Callable[[], Awaitable[T]], model_name: Optional[str], user_id: Any,
+                   limit: Callable[[float], float], started: "asyncio.Future[float]") -> T:
+        """One request: waits (untimed) for a slot, then runs `attempt` for at most limit(start) seconds."""
+        async with self._slot_async(model_name, user_id, action):
+            begun = time.monotonic()
+            if not started.done():
+                started.set_result(begun)
+            result = await asyncio.wait_for(attempt(), limit(begun))
+            self._record_latency(action, time.monotonic() - begun)
+            return result
+
+    async def _hedged(self, action: str, attempt: Callable[[], Awaitable[T]], model_name: Optional[str],
+                      user_id: Any, remaining: float, started: "asyncio.Future[float]") -> T:
+        primary = asyncio.create_task(self._run(action, attempt, model_name, user_id, lambda begun: remaining, started))
+        tasks = {primary}
+        try:
+            threshold = self.hedge_after(action)
+            if threshold is not None:
+                # The hedge timer starts once the primary holds a slot: queue wait isn't model latency
+                await asyncio.wait({primary, started}, return_when=asyncio.FIRST_COMPLETED)
+                if not primary.done():
+                    done, _ = await asyncio.wait(tasks, timeout=threshold)
+                    if not done and (model_name is None or self.scheduler.has_free_slot(model_name, user_id, action)):
+                        self._count(action, "hedges")
+                        give_up_at = started.result() + remaining  # The hedge shares the primary's deadline
+                        tasks.add(asyncio.create_task(self._run(
+                            action, attempt, model_name, user_id, lambda begun: give_up_at - begun,
+                            asyncio.get_running_loop().create_future(),
+                        )))
+                    elif not done:
+                        self._count(action, "hedges_skipped")  # Saturated: a hedge would only queue
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finished = done.pop()
+                tasks.discard(finished)
+                if finished.exception() is None or not tasks:
+                    if finished is not primary:
+                        self._count(action, "hedge_wins")
+                    return finished.result()
+                # One request failed while the other is still running: keep waiting for it
+        finally:
+            for task in tasks:
+                task.cancel()  # The loser (or both, if we were cancelled)
+
+    async def call_async(self, action: str, attempt: Callable[[], Awaitable[T]], hedge: bool = False,
+                         model_name: Optional[str] = None, user_id: Any = None) -> T:
+        """
+        Runs `attempt` (a fresh request each time it is called) until it succeeds, a
+        non-retryable error occurs, attempts run out or the action's deadline passes.
+        With model_name, every request runs inside an llm_scheduler slot for that model and user.
+        Only pass hedge=True for calls without side effects (not chat sends).
+        """
+        self._count(action, "calls")
+        deadline = self.deadline_for(action)
+        spent = 0.0  # Time running requests and backing off; queueing for slots doesn't count
+        for attempt_number in range(self.max_attempts):
+            remaining = deadline - spent
+            started = asyncio.get_running_loop().create_future()
+            try:
+                if hedge and self.hedge_enabled:
+                    return await self._hedged(action, attempt, model_name, user_id, remaining, started)
+                return await self._run(action, attempt, model_name, user_id, lambda begun: remaining, started)
+            except asyncio.TimeoutError:
+                self._count(action, "deadline_exceeded")
+                raise LLMDeadlineExceeded(action, deadline)
+            except Exception as e:
+                if started.done():
+                    spent += time.monotonic() - started.result()
+                delay = self._give_up(action, e, attempt_number, spent, deadline)
+                if delay is None:
+                    raise
+                spent += delay
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    # --- Sync calls ---
+    def call(self, action: str, attempt: Callable[[], T], model_name: Optional[str] = None, user_id: Any = None) -> T:
+        """Sync call_async without hedging; the deadline only stops further retries (a running call can't be interrupted)."""
+        self._count(action, "calls")
+        deadline = self.deadline_for(action)
+        spent = 0.0
+        for attempt_number in range(self.max_attempts):
+            begun = None
+            try:
+                with self.scheduler.slot(model_name, user_id, action) if model_name is not None else contextlib.nullcontext():
+                    begun = time.monotonic()
+                    result = attempt()
+                    self._record_latency(action, time.monotonic() - begun)
+                    return result
+            except Exception as e:
+                if begun is not None:
+                    spent += time.monotonic() - begun
+                delay = self._give_up(action, e, attempt_number, spent, deadline)
+                if delay is None:
+                    raise
+                spent += delay
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            counters = {family: dict(values) for family, values in self.counters.items()}
+            latencies = {family: sorted(window) for family, window in self.latencies.items()}
+        actions = {}
+        for family, values in counters.items():
+            samples = latencies.get(family, [])
+            percentile = lambda p: round(samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000, 1) if samples else None
+            actions[family] = {**values, "p50_ms": percentile(50), "p95_ms": percentile(95), "samples": len(samples)}
+        return {
+            "max_attempts": self.max_attempts,
+            "hedge_enabled": self.hedge_enabled,
+            "hedge_percentile": self.hedge_percentile,
+            "actions": actions,
+        }
+
+
+llm_resilience = LLMResilience()
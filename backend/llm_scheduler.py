@@ -0,0 +1,311 @@
+# backend/llm_scheduler.py
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from backend.metrics import Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Scheduler Configuration ---
+# Limits are per process; divide the project's Vertex quota by the number of API processes.
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "16"))
+LLM_BATCH_MAX_CONCURRENT = int(os.getenv("LLM_BATCH_MAX_CONCURRENT", "8"))  # The rest is kept free for interactive calls
+LLM_MAX_CONCURRENT_PER_USER = int(os.getenv("LLM_MAX_CONCURRENT_PER_USER", "4"))
+LLM_MODEL_RPM = float(os.getenv("LLM_MODEL_RPM", "60"))  # Requests per minute per model
+LLM_MODEL_RPM_OVERRIDES = os.getenv("LLM_MODEL_RPM_OVERRIDES", "")  # e.g. "gemini-1.5-pro-002=120,gemini-2.0-flash=300"
+LLM_MODEL_BURST = int(os.getenv("LLM_MODEL_BURST", "10"))  # Calls a model may start at once after being idle
+LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_BATCH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_BATCH_QUEUE_TIMEOUT_SECONDS", "600"))
+# Actions starting with one of these run in the batch lane; everything else is interactive
+LLM_BATCH_ACTION_PREFIXES = os.getenv(
+    "LLM_BATCH_ACTION_PREFIXES",
+    "generate_questions_fmt_,generate_assessment_questions_legacy,analyze_assignment_sample,"
+    "generate_bulk_assessment_questions,generate_assessment_question_prefetch,generate_question_paper",
+)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)  # In priority order
+
+# Queue wait in milliseconds
+QUEUE_WAIT_MS_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000)
+
+
+def parse_rpm_overrides(spec: str) -> Dict[str, float]:
+    overrides = {}
+    for item in spec.split(","):
+        model_name, _, rpm = item.strip().partition("=")
+        if model_name and rpm:
+            overrides[model_name] = float(rpm)
+    return overrides
+
+
+def lane_for_action(action: Optional[str], batch_prefixes: str = LLM_BATCH_ACTION_PREFIXES) -> str:
+    prefixes = tuple(p.strip() for p in batch_prefixes.split(",") if p.strip())
+    return BATCH if action and prefixes and action.startswith(prefixes) else INTERACTIVE
+
+
+class LLMQueueTimeout(HTTPException):
+    """No model slot became free in time; reported to clients as 503."""
+
+    def __init__(self, lane: str, waited: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"The AI service is busy ({lane} queue wait exceeded {waited:.0f}s). Please retry shortly.",
+        )
+
+
+class TokenBucket:
+    """Request-rate limiter: `rate_per_minute` tokens refill continuously up to `burst`."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 or self.rate <= 0 else (1 - self.tokens) / self.rate
+
+
+@dataclass
+class _Waiter:
+    model_name: str
+    user: Optional[str]  # None: caller didn't say; exempt from the per-user cap
+    lane: str
+    wake: Callable[[], None]
+    enqueued: float = field(default_factory=time.monotonic)
+    granted: bool = False
+    rate_limited: bool = False  # Held back by its model's bucket at least once
+
+
+class LLMScheduler:
+    """
+    Single gate for model calls in this process. Calls wait in an interactive or a batch lane;
+    a free slot goes to the oldest interactive caller first. Admission also needs a token from
+    the model's rate bucket, the batch lane stays under its own cap, and no user may hold more
+    than `per_user` slots, so one teacher's bulk generation can't crowd out everyone else.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT, batch_max_concurrent: int = LLM_BATCH_MAX_CONCURRENT,
+                 per_user: int = LLM_MAX_CONCURRENT_PER_USER, rpm: float = LLM_MODEL_RPM,
+                 rpm_overrides: Optional[Dict[str, float]] = None, burst: int = LLM_MODEL_BURST,
+                 queue_timeouts: Optional[Dict[str, float]] = None):
+        self.max_concurrent = max_concurrent
+        self.batch_max_concurrent = batch_max_concurrent
+        self.per_user = per_user
+        self.rpm = rpm
+        self.rpm_overrides = parse_rpm_overrides(LLM_MODEL_RPM_OVERRIDES) if rpm_overrides is None else rpm_overrides
+        self.burst = burst
+        self.queue_timeouts = queue_timeouts or {
+            INTERACTIVE: LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS, BATCH: LLM_BATCH_QUEUE_TIMEOUT_SECONDS,
+        }
+        self.lock = threading.Lock()
+        self.waiting: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in LANES}
+        self.running: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.running_by_user: Dict[str, int] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._timer: Optional[threading.Timer] = None
+        self.counters = {lane: {"admitted": 0, "queued": 0, "timeouts": 0, "rate_limited": 0} for lane in LANES}
+        self.queue_wait_ms = {lane: Histogram(buckets=QUEUE_WAIT_MS_BUCKETS) for lane in LANES}
+
+    def _bucket(self, model_name: str) -> TokenBucket:
+        bucket = self.buckets.get(model_name)
+        if bucket is None:
+            bucket = TokenBucket(self.rpm_overrides.get(model_name, self.rpm), self.burst)
+            self.buckets[model_name] = bucket
+        return bucket
+
+    # --- Admission (called with self.lock held) ---
+    def _dispatch(self) -> None:
+        """Grants free slots to eligible waiters, interactive lane first."""
+        now = time.monotonic()
+        retry_in: Optional[float] = None
+        for lane in LANES:
+            for waiter in list(self.waiting[lane]):
+                if sum(self.running.values()) >= self.max_concurrent:
+                    break
+                if lane == BATCH and self.running[BATCH] >= self.batch_max_concurrent:
+                    break
+                if waiter.user is not None and self.running_by_user.get(waiter.user, 0) >= self.per_user:
+                    continue  # Fairness cap: later callers from other users go first
+                bucket = self._bucket(waiter.model_name)
+                if not bucket.try_take(now):
+                    if not waiter.rate_limited:
+                        waiter.rate_limited = True
+                        self.counters[lane]["rate_limited"] += 1
+                    wait = bucket.seconds_until_token(now)
+                    retry_in = wait if retry_in is None else min(retry_in, wait)
+                    continue
+                self.waiting[lane].remove(waiter)
+                self._grant(waiter, now)
+        if retry_in is not None:
+            self._schedule_retry(retry_in)
+
+    def _grant(self, waiter: _Waiter, now: float) -> None:
+        waiter.granted = True
+        self.running[waiter.lane] += 1
+        self.running_by_user[waiter.user] = self.running_by_user.get(waiter.user, 0) + 1
+        self.counters[waiter.lane]["admitted"] += 1
+        self.queue_wait_ms[waiter.lane].observe((now - waiter.enqueued) * 1000)
+        waiter.wake()
+
+    def _schedule_retry(self, delay: float) -> None:
+        """Re-runs dispatch when a rate-limited model's bucket has a token again."""
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(max(delay, 0.005), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self.lock:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, model_name: str, user_id: Any, lane: str, wake: Callable[[], None]) -> _Waiter:
+        user = None if user_id is None else str(user_id)
+        waiter = _Waiter(model_name=model_name, user=user, lane=lane, wake=wake)
+        with self.lock:
+            self.waiting[lane].append(waiter)
+            self._dispatch()
+            if not waiter.granted:
+                self.counters[lane]["queued"] += 1
+        return waiter
+
+    def _release(self, waiter: _Waiter) -> None:
+        with self.lock:
+            self.running[waiter.lane] -= 1
+            remaining = self.running_by_user[waiter.user] - 1
+            if remaining:
+                self.running_by_user[waiter.user] = remaining
+            else:
+                del self.running_by_user[waiter.user]
+            self._dispatch()
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        """Takes a waiter that gave up out of its lane; True if it was granted a slot just before."""
+        with self.lock:
+            if waiter.granted:
+                return True
+            self.waiting[waiter.lane].remove(waiter)
+            return False
+
+    # --- Public API ---
+    @contextmanager
+    def slot(self, model_name: str, user_id: Any, action: Optional[str] = None, lane: Optional[str] = None) -> Iterator[None]:
+        """Blocks until this call may hit the model (sync callers)."""
+        lane = lane or lane_for_action(action)
+        event = threading.Event()
+        waiter = self._enqueue(model_name, user_id, lane, event.set)
+        timeout = self.queue_timeouts[lane]
+        if not event.wait(timeout) and not self._withdraw(waiter):
+            self._count_timeout(lane)
+            raise LLMQueueTimeout(lane, timeout)
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    @asynccontextmanager
+    async def slot_async(self, model_name: str, user_id: Any, action: Optional[str] = None,
+                         lane: Optional[str] = None) -> AsyncIterator[None]:
+        """Awaits a slot without blocking the event loop."""
+        lane = lane or lane_for_action(action)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake() -> None:
+            # May be called from another thread (a release in a sync caller, or the rate timer)
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(model_name, user_id, lane, wake)
+        timeout = self.queue_timeouts[lane]
+        try:
+            await asyncio.wait_for(granted, timeout)
+        except asyncio.TimeoutError:
+            if not self._withdraw(waiter):
+                self._count_timeout(lane)
+                raise LLMQueueTimeout(lane, timeout)
+        except asyncio.CancelledError:
+            if self._withdraw(waiter):
+                self._release(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def has_free_slot(self, model_name: str, user_id: Any, action: Optional[str] = None, lane: Optional[str] = None) -> bool:
+        """Whether a call would be admitted right now without queueing (for optional extra calls like hedges)."""
+        lane = lane or lane_for_action(action)
+        user = None if user_id is None else str(user_id)
+        with self.lock:
+            if any(self.waiting[l] for l in LANES[:LANES.index(lane) + 1]):
+                return False  # Others are already queued ahead
+            if sum(self.running.values()) >= self.max_concurrent:
+                return False
+            if lane == BATCH and self.running[BATCH] >= self.batch_max_concurrent:
+                return False
+            if user is not None and self.running_by_user.get(user, 0) >= self.per_user:
+                return False
+            return self._bucket(model_name).seconds_until_token(time.monotonic()) == 0.0
+
+    def _count_timeout(self, lane: str) -> None:
+        with self.lock:
+            self.counters[lane]["timeouts"] += 1
+        logger.warning(f"LLM call timed out waiting in the {lane} lane.")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            lanes = {
+                lane: {
+                    "running": self.running[lane],
+                    "waiting": len(self.waiting[lane]),
+                    **self.counters[lane],
+                    "queue_wait_ms": self.queue_wait_ms[lane].snapshot(),
+                }
+                for lane in LANES
+            }
+            buckets = {
+                name: {"rpm": bucket.rate * 60, "tokens": round(min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate), 2)}
+                for name, bucket in self.buckets.items()
+            }
+            busiest_users = sorted(self.running_by_user.items(), key=lambda item: -item[1])[:10]
+        return {
+            "max_concurrent": self.max_concurrent,
+            "batch_max_concurrent": self.batch_max_concurrent,
+            "per_user": self.per_user,
+            "lanes": lanes,
+            "models": buckets,
+            "busiest_users": dict(busiest_users),
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -2,14 +2,8 @@
 import logging
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
 
-# Assuming models are accessible, adjust import if needed
-# Need to handle potential circular imports if models import this utils
-try:
-    from backend import models
-except ImportError:
-    models = None # Or handle differently if models must be available
+from backend.audit_sink import audit_sink
 
 logger = logging.getLogger(__name__)
 
@@ -22,38 +16,27 @@ def log_activity(
     target_entity_id: Optional[int] = None,
 ):
     """
-    Creates an entry in the audit_logs table.
+    Queues an entry for the audit_logs table.
+
+    The row is written by the background audit sink (backend/audit_sink.py) in a
+    batched INSERT on its own connection, so the caller's session is neither
+    committed nor rolled back here.
 
     Args:
-        db: The database session.
+        db: The caller's database session (unused; kept for call-site compatibility).
         user_id: The ID of the user performing the action (can be None for system actions).
         action: A short code identifying the action (e.g., 'USER_LOGIN').
         details: A human-readable description of the event.
         target_entity: The type of entity affected (e.g., 'Student', 'Lesson').
         target_entity_id: The ID of the specific entity affected.
     """
-    if models is None:
-        logger.error("Models could not be imported in logger_utils. Cannot log activity.")
-        return
-
-    try:
-        log_entry = models.AuditLog(
-            user_id=user_id,
-            action=action,
-            details=details,
-            target_entity=target_entity,
-            target_entity_id=target_entity_id
-            # timestamp is handled by server_default
-        )
-        db.add(log_entry)
-        db.commit()
-        # db.refresh(log_entry) # Usually not needed unless you need the log ID immediately
-        logger.debug(f"Activity logged: User={user_id}, Action={action}, Target={target_entity}:{target_entity_id}")
-    except Exception as e:
-        db.rollback() # Rollback the log commit if it fails
-        # Log the error, but don't let logging failure break the main operation
-        logger.error(
-            f"Failed to log activity to DB: User={user_id}, Action={action}, "
-            f"Target={target_entity}:{target_entity_id}. Error: {e}",
-            exc_info=False # Avoid excessive traceback spam for logging errors
-        )
+    queued = audit_sink.submit({
+        "user_id": user_id,
+        "action": action,
+        "details": details,
+        "target_entity": target_entity,
+        "target_entity_id": target_entity_id,
+        # timestamp is handled by server_default
+    })
+    if queued:
+        logger.debug(f"Activity queued: User={user_id}, Action={action}, Target={target_entity}:{target_entity_id}")
@@ -19,10 +19,20 @@ from backend.routes import admin_dashboard
 from backend.routes import teacher_dashboard
 from backend.routes import parent_dashboard
 from backend.routes import timetable
+from backend.routes import internal
+from backend.routes import virtual_teacher
+from backend.routes import jobs
 # from backend.routes import gcp
 
-from backend.database import engine
+from backend.database import add_missing_columns, engine
 from backend import models
+from backend.password_pool import PasswordPoolBusyError, password_pool, password_pool_busy_handler
+from backend.audit_sink import audit_sink
+from backend.services.llm_usage_recorder import usage_writer
+from backend.llm_backend import get_llm_backend
+from backend.model_registry import MODEL_WARMUP_ON_STARTUP, default_model_keys
+from backend.job_queue import JOB_WORKERS_ENABLED, job_queue
+import threading
 import logging
 
 # Configure basic logging
@@ -34,6 +44,9 @@ try:
     logger.info("Checking database connection and models...")
     models.Base.metadata.create_all(bind=engine)
     logger.info("Database tables checked/created via create_all().")
+    added_columns = add_missing_columns(engine, models.Base.metadata)
+    if added_columns:
+        logger.info(f"Added missing columns: {', '.join(added_columns)}")
 except Exception as e:
     logger.error(f"Error during initial database check/create_all: {e}", exc_info=True)
     raise SystemExit(f"Database connection/table creation failed: {e}")
@@ -53,6 +66,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Exception Handlers ---
+# Any request that needs bcrypt (login, creating or updating users) sheds load the same way: 503 + Retry-After
+app.add_exception_handler(PasswordPoolBusyError, password_pool_busy_handler)
+
+
 # --- Include HTTP Routers ---
 logger.info("Including HTTP API routers...")
 app.include_router(auth.router)
@@ -83,10 +101,55 @@ app.include_router(admin_dashboard.router)
 app.include_router(teacher_dashboard.router)
 app.include_router(parent_dashboard.router)
 app.include_router(timetable.router)
+app.include_router(internal.router)
+app.include_router(virtual_teacher.router)
+app.include_router(jobs.router)
 # app.include_router(gcp.router)
 logger.info("HTTP API routers included.")
 
 
+# --- Lifecycle Hooks ---
+@app.on_event("startup")
+def start_password_pool():
+    password_pool.start()
+
+
+@app.on_event("startup")
+def warm_model_clients():
+    # In the background so a slow credential lookup doesn't delay serving
+    if MODEL_WARMUP_ON_STARTUP:
+        threading.Thread(
+            target=get_llm_backend().warmup, args=(default_model_keys(),), name="model-warmup", daemon=True
+        ).start()
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    # Handlers are registered by the route modules imported above
+    if JOB_WORKERS_ENABLED:
+        job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    password_pool.shutdown()
+
+
+@app.on_event("shutdown")
+def drain_audit_sink():
+    audit_sink.shutdown()
+
+
+@app.on_event("shutdown")
+def drain_llm_usage_writer():
+    usage_writer.shutdown()
+
+
 # --- Root Endpoint ---
 @app.get("/", tags=["Root"])
 async def root():
@@ -0,0 +1,57 @@
+# backend/metrics.py
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Default latency buckets in milliseconds (upper bounds, +Inf is implicit)
+DEFAULT_MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram for in-process latency metrics."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_MS_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Records a single observation."""
+        index = len(self.buckets)
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if self._max is None or value > self._max:
+                self._max = value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._max = None
+
+    def snapshot(self) -> Dict[str, object]:
+        """Returns count, sum, mean, max and cumulative bucket counts."""
+        with self._lock:
+            counts = list(self._counts)
+            total, total_sum, max_value = self._count, self._sum, self._max
+        cumulative = 0
+        buckets: Dict[str, int] = {}
+        for upper, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            buckets[str(upper)] = cumulative
+        return {
+            "count": total,
+            "sum": round(total_sum, 3),
+            "mean": round(total_sum / total, 3) if total else None,
+            "max": round(max_value, 3) if max_value is not None else None,
+            "buckets": buckets,
+        }
@@ -0,0 +1,102 @@
+# backend/model_registry.py
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.metrics import Histogram
+
+try:
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+except ImportError:
+    vertexai = None
+    GenerativeModel = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Registry Configuration ---
+MODEL_WARMUP_ON_STARTUP = os.getenv("MODEL_WARMUP_ON_STARTUP", "true").lower() == "true"
+
+ModelKey = Tuple[str, str, str]  # (project, location, model_name)
+
+
+def default_model_keys() -> List[ModelKey]:
+    """The (project, location, model) combinations the AI entry points use, from the environment."""
+    keys = [
+        # backend/ai.py (chat, teacher notes, question papers)
+        (os.getenv("PROJECT_ID"), os.getenv("LOCATION"), os.getenv("MODEL_NAME", "gemini-1.5-pro-002")),
+        # backend/services (generation, analysis)
+        (
+            os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("PROJECT_ID")),
+            os.getenv("VERTEX_AI_LOCATION", os.getenv("LOCATION", "us-central1")),
+            os.getenv("VERTEX_AI_MODEL", "gemini-1.5-flash-001"),
+        ),
+    ]
+    unique: List[ModelKey] = []
+    for key in keys:
+        if all(key) and key not in unique:
+            unique.append(key)
+    return unique
+
+
+class ModelRegistry:
+    """Process-wide GenerativeModel instances keyed by (project, location, model), built once and reused."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._models: Dict[ModelKey, Any] = {}
+        self._initialized: Optional[Tuple[str, str]] = None  # (project, location) last passed to vertexai.init
+        self.hits = 0
+        self.created = 0
+        self.warmup_errors = 0
+        self.create_ms = Histogram()
+
+    def get(self, project: str, location: str, model_name: str) -> Any:
+        """Returns the shared model for the key, creating it (and initializing Vertex AI) on first use."""
+        key = (project, location, model_name)
+        with self.lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.hits += 1
+                return model
+            if GenerativeModel is None:
+                raise RuntimeError("vertexai library is not installed; model clients are unavailable.")
+
+            started = time.perf_counter()
+            # GenerativeModel binds the project/location from the global config when constructed
+            if self._initialized != (project, location):
+                vertexai.init(project=project, location=location)
+                self._initialized = (project, location)
+            model = GenerativeModel(model_name)
+            self._models[key] = model
+            self.created += 1
+        self.create_ms.observe((time.perf_counter() - started) * 1000)
+        logger.info(f"Created model client for {model_name} ({project}/{location}).")
+        return model
+
+    def warmup(self, keys: Iterable[ModelKey]) -> None:
+        """Builds each model and its prediction client (credentials + channel) ahead of first use."""
+        for project, location, model_name in keys:
+            try:
+                model = self.get(project, location, model_name)
+                # Client creation is lazy in the SDK; touching it moves auth/channel setup off the first request
+                getattr(model, "_prediction_client", None)
+            except Exception as e:
+                with self.lock:
+                    self.warmup_errors += 1
+                logger.warning(f"Model warmup failed for {model_name} ({project}/{location}): {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            keys = [{"project": p, "location": l, "model": m} for p, l, m in self._models]
+            counters = {"hits": self.hits, "created": self.created, "warmup_errors": self.warmup_errors}
+        return {"models": keys, **counters, "create_ms": self.create_ms.snapshot()}
+
+
+model_registry = ModelRegistry()
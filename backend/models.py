@@ -1,6 +1,6 @@
 # backend/models.py
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, Float, DateTime, UniqueConstraint, Text, Time, Table, CheckConstraint, Enum as DBEnum, JSON as DB_JSON # Enum added if using DB enum, JSON added
+from sqlalchemy import Column, Index, Integer, String, Boolean, ForeignKey, Date, Float, DateTime, UniqueConstraint, Text, Time, Table, CheckConstraint, Enum as DBEnum, JSON as DB_JSON # Enum added if using DB enum, JSON added
 from sqlalchemy.orm import relationship, backref # Import backref if needed
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -52,10 +52,75 @@ class LLMTokenUsage(Base):
     input_tokens = Column(Integer, nullable=False)
     output_tokens = Column(Integer, nullable=False)
     total_tokens = Column(Integer, nullable=False)
+    latency_ms = Column(Integer, nullable=True) # Wall time of the model call
+    finish_reason = Column(String(50), nullable=True) # E.g., "STOP", "MAX_TOKENS", "SAFETY"
 
     user = relationship("User")
 
 
+# --- LLM Usage Rollup Tables ---
+# Maintained incrementally by backend/services/llm_usage_rollup.py as usage rows are written.
+# model_name is stored as '' when unknown so it can take part in the unique key.
+class LLMUsageHourly(Base):
+    __tablename__ = "llm_usage_hourly"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_start = Column(DateTime, nullable=False, index=True) # UTC, truncated to the hour
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    action = Column(String(100), nullable=False)
+    model_name = Column(String(100), nullable=False, default="")
+    request_count = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0, server_default="0") # Rows that reported a latency
+
+    __table_args__ = (UniqueConstraint('bucket_start', 'user_id', 'action', 'model_name', name='uq_llm_usage_hourly_key'),)
+
+
+class LLMUsageDaily(Base):
+    __tablename__ = "llm_usage_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_date = Column(Date, nullable=False, index=True) # UTC day
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    action = Column(String(100), nullable=False)
+    model_name = Column(String(100), nullable=False, default="")
+    request_count = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0, server_default="0") # Rows that reported a latency
+
+    __table_args__ = (UniqueConstraint('bucket_date', 'user_id', 'action', 'model_name', name='uq_llm_usage_daily_key'),)
+
+
+# --- GenerationJob Table ---
+# Long-running AI work queued by the generation endpoints and run by backend/job_queue.py workers
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(String(36), primary_key=True) # UUID, returned to the client
+    kind = Column(String(50), nullable=False, index=True) # E.g., "generate_assignment", "analyze_assignment_sample"
+    status = Column(String(20), nullable=False, default="queued") # queued, running, succeeded, failed
+    user_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), nullable=False, index=True)
+    payload = Column(DB_JSON, nullable=False)
+    result = Column(DB_JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    progress = Column(Integer, nullable=False, default=0) # 0-100
+    progress_message = Column(String(255), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True) # UTC
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True) # Refreshed while running; stale jobs are requeued
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index('ix_generation_jobs_status_created', 'status', 'created_at'),)
+
+
 # --- Term Table ---
 class Term(Base):
     __tablename__ = "terms"
@@ -478,6 +543,18 @@ class AssignmentSample(Base):
     subject = relationship("Subject", back_populates="assignment_samples")
     creator = relationship("User") # Assuming User doesn't need a back-populates for created samples
     urls = relationship("URL", secondary=assignment_sample_url_association, cascade="all, delete", lazy="selectin") # No back_populates needed on URL
+    analysis = relationship("AssignmentSampleAnalysis", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+# --- AssignmentSampleAnalysis Table ---
+# Latest question-type analysis of a sample's PDF; reused while the file's content hash (and prompt) match
+class AssignmentSampleAnalysis(Base):
+    __tablename__ = "assignment_sample_analyses"
+    assignment_sample_id = Column(Integer, ForeignKey("assignment_samples.id", ondelete='CASCADE'), primary_key=True)
+    content_hash = Column(String(255), nullable=False, index=True) # "sha256-<hex>" of the uploaded PDF, or the GCS content key
+    prompt_version = Column(String(20), nullable=False)
+    model_name = Column(String(100), nullable=False)
+    result = Column(DB_JSON, nullable=False) # QuestionAnalysisResponse
+    analyzed_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow) # UTC
 
 # --- AssignmentFormat Table ---
 class AssignmentFormat(Base):
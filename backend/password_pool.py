@@ -0,0 +1,176 @@
+# backend/password_pool.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+
+from dotenv import load_dotenv
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+
+from backend.metrics import Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Pool Configuration ---
+# Number of worker processes running bcrypt; 0 runs hashing inline in the calling thread.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Max hash/verify calls queued or running at once; further callers block until a slot frees up.
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(PASSWORD_HASH_WORKERS, 1) * 8)))
+# Seconds a caller may wait for a slot before the request fails.
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10"))
+
+
+class PasswordPoolBusyError(RuntimeError):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_QUEUE_TIMEOUT."""
+
+
+async def password_pool_busy_handler(request: Request, exc: PasswordPoolBusyError) -> JSONResponse:
+    """App-wide handler: a saturated pool is a temporary overload (503), not a server error."""
+    logger.warning(f"Password hashing pool saturated; rejecting {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service is busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+
+class PasswordHashPool:
+    """Bounded process pool for CPU-bound password hashing, with queue-depth metrics."""
+
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: ProcessPoolExecutor = None
+        self.queue_wait_ms = Histogram()
+        self.run_ms = Histogram()
+        self.pending = 0  # submitted and not yet finished (queued + running)
+        self.waiting = 0  # blocked on a free slot
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs server threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Starts the worker processes ahead of the first login."""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+            logger.info(f"Password hashing pool started with {self.workers} worker processes.")
+
+    def shutdown(self) -> None:
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _after_wait(self, started: float, acquired: bool) -> None:
+        with self.lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+        if not acquired:
+            raise PasswordPoolBusyError("Password hashing pool is saturated.")
+        self.queue_wait_ms.observe((time.perf_counter() - started) * 1000)
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        """Submits fn(*args) on an acquired slot; the slot is released when the call finishes, even if the caller left."""
+        with self.lock:
+            self.pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        submitted = time.perf_counter()
+
+        def _finished(future: Future) -> None:
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # A worker died (e.g. OOM-killed); drop the pool so the next call builds a fresh one
+                logger.error("Password hashing pool broke; recreating it on next use.", exc_info=future.exception())
+                with self.lock:
+                    self.failures += 1
+                    self._executor = None
+            self.run_ms.observe((time.perf_counter() - submitted) * 1000)
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(_finished)
+        return future
+
+    def run(self, fn: Callable, *args) -> Any:
+        """Runs fn(*args) in the pool and blocks until it returns. fn must be a picklable top-level function."""
+        if self.workers <= 0:
+            return fn(*args)
+
+        started = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+        self._after_wait(started, self._slots.acquire(timeout=self.queue_timeout))
+        return self._submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable, *args) -> Any:
+        """Awaitable run(): waits for a slot and the result without blocking the event loop."""
+        if self.workers <= 0:
+            return await asyncio.to_thread(fn, *args)
+
+        started = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            # Same slots and timeout as run(); the wait happens on a helper thread, not the loop
+            waiter = asyncio.get_running_loop().run_in_executor(None, self._slots.acquire, True, self.queue_timeout)
+            try:
+                acquired = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # The helper may still win a slot after we've gone; hand it straight back
+                waiter.add_done_callback(lambda f: f.result() and self._slots.release())
+                with self.lock:
+                    self.waiting -= 1
+                raise
+        self._after_wait(started, acquired)
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            state = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_timeout_seconds": self.queue_timeout,
+                "pending": self.pending,
+                "waiting_for_slot": self.waiting,
+                "max_pending_seen": self.max_pending_seen,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "failures": self.failures,
+            }
+        state["queue_wait_ms"] = self.queue_wait_ms.snapshot()
+        state["run_ms"] = self.run_ms.snapshot()
+        return state
+
+
+password_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_QUEUE_TIMEOUT)
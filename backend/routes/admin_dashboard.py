@@ -1,13 +1,14 @@
 # backend/routes/admin_dashboard.py
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload, Query # Import Query for type hinting
-from sqlalchemy import func, cast, Date, select # Import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import func, cast, Date, Select, select # Import select
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from backend import models, schemas
-from backend.database import get_db
+from backend.database import get_async_db
 from backend.dependencies import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -28,21 +29,21 @@ def _verify_admin(current_user: models.User):
 # --- API Endpoints ---
 
 @router.get("/stats", response_model=List[schemas.StatCardData])
-def get_dashboard_stats(
-    db: Session = Depends(get_db),
+async def get_dashboard_stats(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Provides counts for key entities for the admin dashboard stat cards."""
     _verify_admin(current_user)
     try:
-        total_users = db.query(func.count(models.User.id)).scalar()
-        active_students = db.query(func.count(models.User.id)).filter(
+        total_users = (await db.execute(select(func.count(models.User.id)))).scalar()
+        active_students = (await db.execute(select(func.count(models.User.id)).filter(
             models.User.user_type == "Student", models.User.is_active == True
-        ).scalar()
-        active_teachers = db.query(func.count(models.User.id)).filter(
+        ))).scalar()
+        active_teachers = (await db.execute(select(func.count(models.User.id)).filter(
             models.User.user_type == "Teacher", models.User.is_active == True
-        ).scalar()
-        total_subjects = db.query(func.count(models.Subject.id)).scalar() # Assuming Subject ~ Course
+        ))).scalar()
+        total_subjects = (await db.execute(select(func.count(models.Subject.id)))).scalar() # Assuming Subject ~ Course
         stats = [
             schemas.StatCardData(title="Total Users", count=total_users or 0),
             schemas.StatCardData(title="Active Students", count=active_students or 0),
@@ -55,9 +56,9 @@ def get_dashboard_stats(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not fetch dashboard statistics.")
 
 @router.get("/user-activity-trend", response_model=List[schemas.DailyActivityData])
-def get_user_activity_trend(
+async def get_user_activity_trend(
     days: int = 7, # Allow specifying number of days
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
@@ -72,7 +73,7 @@ def get_user_activity_trend(
 
     try:
         # Query user creations grouped by date
-        user_creation_data = db.query(
+        user_creation_data = (await db.execute(select(
             cast(models.User.created_at, Date).label("creation_date"),
             func.count(models.User.id).label("daily_count")
         ).filter(
@@ -82,7 +83,7 @@ def get_user_activity_trend(
             cast(models.User.created_at, Date)
         ).order_by(
             cast(models.User.created_at, Date)
-        ).all()
+        ))).all()
 
         # Create a dictionary for quick lookup
         activity_dict = {result.creation_date: result.daily_count for result in user_creation_data}
@@ -104,9 +105,9 @@ def get_user_activity_trend(
 
 
 @router.get("/recent-activities", response_model=List[schemas.RecentActivityItem])
-def get_recent_activities(
+async def get_recent_activities(
     limit: int = 5, # Default to 5 recent items
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
@@ -120,7 +121,7 @@ def get_recent_activities(
     try:
         # Query AuditLog and outer join with User to get username
         # Outer join handles cases where user_id is NULL or the user was deleted
-        query: Query = db.query(
+        query: Select = select(
             models.AuditLog.id,
             models.AuditLog.timestamp,
             models.AuditLog.action,
@@ -135,7 +136,7 @@ def get_recent_activities(
             models.AuditLog.timestamp.desc() # Order by most recent first
         ).limit(limit) # Apply limit
 
-        results = query.all()
+        results = (await db.execute(query)).all()
 
         # Map results directly using the schema's from_orm if possible
         # Ensure the schema fields match the query columns/labels
@@ -160,9 +161,9 @@ def get_recent_activities(
 
 
 @router.get("/recent-users", response_model=List[schemas.RecentUserItem])
-def get_recent_users(
+async def get_recent_users(
     limit: int = 5, # Default to 5 recent users
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Gets the most recently active (logged-in) users."""
@@ -172,7 +173,7 @@ def get_recent_users(
 
     try:
         # Query users ordered by last_login descending, NULLs last
-        recent_users_query = db.query(
+        recent_users_query = select(
             models.User.id,
             models.User.username,
             models.User.email,
@@ -187,7 +188,7 @@ def get_recent_users(
         ).limit(limit)
         # --- END CORRECTION ---
 
-        recent_users = recent_users_query.all()
+        recent_users = (await db.execute(recent_users_query)).all()
 
         # Map results to the Pydantic schema
         # from_orm should work if the query labels match the schema fields
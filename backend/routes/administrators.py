@@ -97,7 +97,7 @@ async def create_administrator(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
     # Hash the password
-    hashed_password = utils.hash_password(password)
+    hashed_password = await utils.hash_password_async(password)
 
     # Create the user
     db_user = models.User(
@@ -207,7 +207,7 @@ async def update_administrator(
 
     # Hash the password ONLY if provided
     if password:
-        hashed_password = utils.hash_password(password)
+        hashed_password = await utils.hash_password_async(password)
         db_user.password_hash = hashed_password
 
     db_user.username = username
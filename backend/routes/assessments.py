@@ -2,7 +2,7 @@
 import logging
 import json # Import json
 # --- Add Query ---
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
 # --- Add List, Optional ---
 from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Dict, Any, Optional
@@ -28,6 +28,7 @@ except ImportError:
 from backend.database import get_db
 from backend import models, schemas
 from backend.dependencies import get_current_user
+from backend.job_queue import JobContext, job_queue, job_urls
 from backend.logger_utils import log_activity # Import log_activity
 
 router = APIRouter(
@@ -65,14 +66,32 @@ class GenerateQuestionsRequest(BaseModel):
 
 
 # --- Existing Generation Endpoint (Keep if needed, but mark as deprecated) ---
+@job_queue.handler("generate_assessment_questions")
+async def run_question_generation_job(job: JobContext) -> Dict[str, Any]:
+    """Background form of /generate."""
+    if question_generator is None:
+        raise ValueError("Assessment generation service unavailable.")
+    await job.progress(10, "Generating questions")
+    return await question_generator.generate_questions(
+        job.payload["gs_urls"],
+        job.payload["questions"],
+        user_id=job.user_id,
+        action="generate_assessment_questions_legacy",
+        session_id=job.payload["session_id"]
+    )
+
+
 @router.post("/generate")
 async def generate_questions(
     request: GenerateQuestionsRequest,
+    response: Response,
+    wait: bool = Query(False, description="Generate within this request and return the questions instead of a job."),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
     [DEPRECATED - Use format-based generation] Generate questions based on lesson content.
+    By default this queues a job and returns 202 with its ID; follow it at /jobs/{job_id}.
     """
     logger.warning("Deprecated /assessments/generate endpoint called. Use format-based generation instead.")
     if question_generator is None:
@@ -98,6 +117,14 @@ async def generate_questions(
         if not found_video_url: logger.debug(f"No GS URLs found for any Videos in lesson {lesson_id}.")
     final_urls = list(lesson_gs_urls)
     if not final_urls: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No processable content found for the provided lesson IDs.")
+    if not wait:
+        job = job_queue.enqueue(db, "generate_assessment_questions", current_user.id, {
+            "gs_urls": final_urls,
+            "questions": [{"type": q.type.value, "count": q.count} for q in request.questions],
+            "session_id": str(uuid.uuid4()),
+        })
+        response.status_code = status.HTTP_202_ACCEPTED
+        return schemas.JobSubmitted(job_id=job.id, status=job.status, **job_urls(job.id)).model_dump()
     logger.info(f"Generating assessment questions using {len(final_urls)} GS URLs from lessons {request.lesson_ids}.")
     try:
         result = await question_generator.generate_questions(
@@ -1,20 +1,23 @@
 # backend/routes/assignment_formats.py
 from pydantic import BaseModel, Field
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Response
 from sqlalchemy.orm import Session, joinedload, selectinload
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+import asyncio
 from sqlalchemy.exc import IntegrityError
 # --- Added Import ---
 import uuid
 # --- End Added Import ---
 
 from backend import models, schemas
-from backend.database import get_db
+from backend.database import SessionLocal, get_db
 from backend.dependencies import get_current_user
+from backend.job_queue import JobContext, job_queue, job_urls
 from backend.logger_utils import log_activity
 
 from backend.services.generation_service import generate_assignment_questions, modify_assignment_questions
+from backend.single_flight import flight_key, generation_flights
 
 router = APIRouter(prefix="/assignment-formats", tags=["Assignment Formats"])
 logger = logging.getLogger(__name__)
@@ -204,15 +207,77 @@ def delete_assignment_format(
 class GenerateAssignmentRequest(BaseModel):
     lesson_ids: List[int] = Field(..., min_items=1)
 
-@router.post("/{format_id}/generate", response_model=schemas.GenerateAssignmentResponse)
+async def _generate_from_format(
+    assignment_format: models.AssignmentFormat,
+    lesson_gs_urls: List[str],
+    user_id: int,
+    session_id: str,
+    no_cache: bool,
+) -> schemas.GenerateAssignmentResponse:
+    """Runs the generation service; identical concurrent requests share one model call."""
+    unique_gs_urls = sorted(set(lesson_gs_urls))
+    # Identical concurrent requests (double clicks, colleagues using the same format and lessons) share one model call
+    generation_key = flight_key(
+        format_id=assignment_format.id,
+        format_name=assignment_format.name,
+        questions=sorted([str(q.question_type), q.count] for q in assignment_format.questions),
+        lesson_gs_urls=unique_gs_urls,
+        no_cache=no_cache,  # A regenerate request must not join a flight that may be answered from the cache
+    )
+    return await generation_flights.run(generation_key, lambda: generate_assignment_questions(
+        assignment_format=assignment_format,
+        lesson_gs_urls=unique_gs_urls,
+        user_id=user_id,              # Pass user_id
+        action=f"generate_questions_fmt_{assignment_format.id}",  # Pass descriptive action
+        session_id=session_id,        # Pass session_id
+        no_cache=no_cache,
+    ))
+
+
+def _load_format(format_id: int) -> Optional[models.AssignmentFormat]:
+    db = SessionLocal()
+    try:
+        return db.query(models.AssignmentFormat).options(
+            selectinload(models.AssignmentFormat.questions)
+        ).filter(models.AssignmentFormat.id == format_id).first()
+    finally:
+        db.close()
+
+
+@job_queue.handler("generate_assignment")
+async def run_assignment_generation_job(job: JobContext) -> schemas.GenerateAssignmentResponse:
+    """Background form of /{format_id}/generate; the payload holds the already-resolved lesson URLs."""
+    payload = job.payload
+    assignment_format = await asyncio.to_thread(_load_format, payload["format_id"])
+    if not assignment_format:
+        raise ValueError(f"Assignment Format with ID {payload['format_id']} no longer exists.")
+    await job.progress(10, "Generating questions")
+    generation_result = await _generate_from_format(
+        assignment_format, payload["lesson_gs_urls"], job.user_id, payload["session_id"], payload["no_cache"]
+    )
+    log_activity(
+        db=None, user_id=job.user_id, action='ASSIGNMENT_GENERATED',
+        details=f"User '{payload['username']}' generated assignment using format '{assignment_format.name}' (ID: {assignment_format.id}), lessons {payload['lesson_ids']}. Session: {payload['session_id']}. Job: {job.id}.",
+        target_entity='AssignmentFormat', target_entity_id=assignment_format.id
+    )
+    return generation_result
+
+
+@router.post("/{format_id}/generate", response_model=Union[schemas.JobSubmitted, schemas.GenerateAssignmentResponse])
 async def generate_assignment_from_format_and_lessons(
     format_id: int,
     request_body: GenerateAssignmentRequest,
+    response: Response,
+    no_cache: bool = Query(False, description="Bypass the response cache and regenerate."),
+    wait: bool = Query(False, description="Generate within this request and return the questions instead of a job."),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Generates assignment questions using Gemini based on a format and lesson content PDFs.
+    By default this queues a job and returns 202 with its ID; follow it at /jobs/{job_id}
+    (or its /events stream). Repeat requests for the same format and lesson content are
+    served from the response cache.
     """
     if current_user.user_type not in ["Teacher", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only Teachers or Admins can generate assignments.")
@@ -246,17 +311,22 @@ async def generate_assignment_from_format_and_lessons(
     if not lesson_gs_urls:
          raise HTTPException(status_code=404, detail="No processable PDF content (GS URLs) found for the provided lesson IDs.")
 
-    # --- Call the Generation Service with token logging parameters ---
     session_id = str(uuid.uuid4())
-    action_name = f"generate_questions_fmt_{format_id}"
+    if not wait:
+        job = job_queue.enqueue(db, "generate_assignment", current_user.id, {
+            "format_id": format_id,
+            "lesson_gs_urls": sorted(set(lesson_gs_urls)),
+            "lesson_ids": valid_lesson_ids,
+            "session_id": session_id,
+            "no_cache": no_cache,
+            "username": current_user.username,
+        })
+        response.status_code = status.HTTP_202_ACCEPTED
+        return schemas.JobSubmitted(job_id=job.id, status=job.status, **job_urls(job.id))
+
+    # --- Call the Generation Service with token logging parameters ---
     try:
-        generation_result = await generate_assignment_questions(
-            assignment_format=assignment_format,
-            lesson_gs_urls=list(set(lesson_gs_urls)),
-            user_id=current_user.id,      # Pass user_id
-            action=action_name,           # Pass descriptive action
-            session_id=session_id         # Pass session_id
-        )
+        generation_result = await _generate_from_format(assignment_format, lesson_gs_urls, current_user.id, session_id, no_cache)
         log_activity(
             db=db, user_id=current_user.id, action='ASSIGNMENT_GENERATED',
             details=f"User '{current_user.username}' generated assignment using format '{assignment_format.name}' (ID: {format_id}), lessons {valid_lesson_ids}. Session: {session_id}.",
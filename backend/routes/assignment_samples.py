@@ -1,11 +1,12 @@
 # backend/routes/assignment_samples.py
 import os
+import asyncio
 import logging
 # import json # No longer needed here
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
 # --- ADD selectinload ---
 from sqlalchemy.orm import Session, joinedload, selectinload
-from typing import List, Optional
+from typing import List, Optional, Union
 from sqlalchemy.exc import IntegrityError
 import uuid # Added import for uuid
 from pathlib import Path
@@ -16,11 +17,13 @@ from datetime import datetime
 # try: ... except ImportError: ... (Removed)
 
 # --- Import the analysis service ---
-from backend.services.analysis_service import analyze_pdf_for_questions # <-- Corrected import
+from backend.services.analysis_service import analyze_pdf_for_questions, get_stored_analysis, store_analysis # <-- Corrected import
 
 from backend import models, schemas
-from backend.database import get_db
+from backend.database import SessionLocal, get_db
+from backend.gcs_cache import content_keys
 from backend.dependencies import get_current_user
+from backend.job_queue import JobContext, job_queue, job_urls
 from backend.logger_utils import log_activity
 from google.cloud import storage
 from dotenv import load_dotenv
@@ -30,6 +33,10 @@ load_dotenv()
 router = APIRouter(prefix="/assignment-samples", tags=["Assignment Samples"])
 logger = logging.getLogger(__name__)
 
+# Queue an analysis job whenever a sample's PDF is uploaded, so /analyze can answer from the stored result.
+# Applies to gs:// samples only; local (mysql://) uploads can't be analyzed and are skipped.
+ASSIGNMENT_SAMPLE_AUTO_ANALYZE = os.getenv("ASSIGNMENT_SAMPLE_AUTO_ANALYZE", "true").lower() == "true"
+
 # --- GCS Configuration ---
 # GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 # --- Remove Vertex AI Config Vars (they are in the service now) ---
@@ -208,6 +215,7 @@ async def create_assignment_sample(
         db_assignment.urls.append(db_gs_url)
         db.commit(); db.refresh(db_assignment)
         db.refresh(db_assignment, attribute_names=['urls', 'creator'])
+        await _precompute_analysis(db, db_assignment, current_user)
         log_activity(db=db, user_id=current_user.id, action='ASSIGNMENT_SAMPLE_CREATED',
                      details=f"User '{current_user.username}' created assignment sample '{name}' (ID: {db_assignment.id}) for Subject ID {subject_id}.",
                      target_entity='AssignmentSample', target_entity_id=db_assignment.id)
@@ -340,6 +348,7 @@ async def update_assignment_sample(
                 try: db.commit(); logger.info(f"Deleted old URLs: {url_ids_to_delete}")
                 except Exception as del_e: db.rollback(); logger.error(f"Failed delete old URLs {url_ids_to_delete}: {del_e}", exc_info=True)
         db.refresh(db_assignment); db.refresh(db_assignment, attribute_names=['urls', 'creator'])
+        if "file" in updated_fields: await _precompute_analysis(db, db_assignment, current_user)
         log_activity(db=db, user_id=current_user.id, action='ASSIGNMENT_SAMPLE_UPDATED',
                      details=f"User '{current_user.username}' updated sample '{db_assignment.name}' (ID: {assignment_id}). Fields: {', '.join(updated_fields)}.",
                      target_entity='AssignmentSample', target_entity_id=assignment_id)
@@ -381,14 +390,132 @@ def delete_assignment_sample(
 
 
 # --- ANALYSIS ENDPOINT ---
-@router.post("/{assignment_id}/analyze", response_model=schemas.QuestionAnalysisResponse)
+def _sample_gs_url(assignment: models.AssignmentSample) -> Optional[str]:
+    for url_obj in assignment.urls:
+        if url_obj.url_type == schemas.UrlTypeEnum.GS.value:
+            return url_obj.url
+    return None
+
+
+def _sample_content_hash(assignment_id: int, gs_url: Optional[str]) -> Optional[str]:
+    """
+    Identifies the file analysis actually reads: the content key (generation/etag) of the
+    sample's gs:// object. None for other URLs, outside GCP, or if the lookup fails, in which
+    case nothing is stored.
+    """
+    if not gs_url or not gs_url.startswith("gs://"):
+        return None
+    try:
+        keys = content_keys([gs_url])
+        return keys[0] if keys else None
+    except Exception as e:
+        logger.warning(f"Could not look up the PDF of assignment sample {assignment_id}; its analysis won't be stored: {e}")
+    return None
+
+
+def _active_analysis_job(db: Session, assignment_id: int, content_hash: Optional[str]) -> Optional[models.GenerationJob]:
+    """A queued or running analysis of the same file (e.g. the one started by the upload), if any."""
+    if not content_hash:
+        return None
+    jobs = db.query(models.GenerationJob).filter(
+        models.GenerationJob.kind == "analyze_assignment_sample",
+        models.GenerationJob.status.in_(("queued", "running")),
+    ).all()
+    for job in jobs:
+        if job.payload.get("assignment_id") == assignment_id and job.payload.get("content_hash") == content_hash:
+            return job
+    return None
+
+
+def _enqueue_analysis(db: Session, assignment: models.AssignmentSample, gs_url: str, content_hash: Optional[str],
+                      user: models.User, no_cache: bool) -> models.GenerationJob:
+    return job_queue.enqueue(db, "analyze_assignment_sample", user.id, {
+        "assignment_id": assignment.id,
+        "assignment_name": assignment.name,
+        "gs_url": gs_url,
+        "content_hash": content_hash,
+        "session_id": str(uuid.uuid4()),
+        "no_cache": no_cache,
+        "username": user.username,
+    })
+
+
+async def _precompute_analysis(db: Session, assignment: models.AssignmentSample, user: models.User) -> None:
+    """
+    Queues analysis of a newly uploaded PDF; never fails the upload. Only samples whose GS URL
+    is a real gs:// object are precomputed. Uploads stored through _upload_assignment_pdf_to_mysql
+    get a mysql:// placeholder that Vertex AI can't read, so for those this is a no-op.
+    """
+    if not ASSIGNMENT_SAMPLE_AUTO_ANALYZE:
+        return
+    try:
+        gs_url = _sample_gs_url(assignment)
+        if not gs_url or not gs_url.startswith("gs://"):
+            return  # Local uploads (mysql:// placeholders) aren't readable by Vertex AI
+        content_hash = await asyncio.to_thread(_sample_content_hash, assignment.id, gs_url)
+        if get_stored_analysis(db, assignment.id, content_hash) is not None:
+            return  # Same file re-uploaded
+        if _active_analysis_job(db, assignment.id, content_hash) is None:
+            job = _enqueue_analysis(db, assignment, gs_url, content_hash, user, no_cache=False)
+            logger.info(f"Queued analysis of uploaded assignment sample {assignment.id} as job {job.id}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not queue analysis for assignment sample {assignment.id}: {e}", exc_info=True)
+
+
+def _save_analysis(assignment_id: int, gs_url: str, content_hash: Optional[str],
+                   analysis: schemas.QuestionAnalysisResponse) -> None:
+    """Stores the result under `content_hash`, the file as it was when analysis started, unless it has since changed."""
+    if content_hash and _sample_content_hash(assignment_id, gs_url) != content_hash:
+        logger.info(f"Assignment sample {assignment_id} changed during analysis; not storing the result.")
+        return
+    db = SessionLocal()
+    try:
+        store_analysis(db, assignment_id, content_hash, analysis)
+    except Exception as e:
+        db.rollback()  # E.g. the sample was deleted meanwhile
+        logger.error(f"Failed to store analysis for assignment sample {assignment_id}: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+@job_queue.handler("analyze_assignment_sample")
+async def run_analysis_job(job: JobContext) -> schemas.QuestionAnalysisResponse:
+    """Background form of /{assignment_id}/analyze."""
+    payload = job.payload
+    # Hash the file as the job finds it; it may have been replaced since the job was queued
+    content_hash = await asyncio.to_thread(_sample_content_hash, payload["assignment_id"], payload["gs_url"])
+    await job.progress(10, "Analyzing assignment sample")
+    validated_response = await analyze_pdf_for_questions(
+        gs_url=payload["gs_url"],
+        user_id=job.user_id,
+        action="analyze_assignment_sample",
+        session_id=payload["session_id"],
+        no_cache=payload["no_cache"],
+    )
+    await asyncio.to_thread(_save_analysis, payload["assignment_id"], payload["gs_url"], content_hash, validated_response)
+    log_activity(
+        db=None, user_id=job.user_id, action='ASSIGNMENT_SAMPLE_ANALYZED',
+        details=f"User '{payload['username']}' triggered AI analysis for assignment sample '{payload['assignment_name']}' (ID: {payload['assignment_id']}). Job: {job.id}. Result: {validated_response.dict()}",
+        target_entity='AssignmentSample', target_entity_id=payload["assignment_id"]
+    )
+    return validated_response
+
+
+@router.post("/{assignment_id}/analyze", response_model=Union[schemas.JobSubmitted, schemas.QuestionAnalysisResponse])
 async def analyze_assignment_sample(
     assignment_id: int,
+    response: Response,
+    no_cache: bool = Query(False, description="Ignore the stored result and re-analyze the PDF."),
+    wait: bool = Query(False, description="Analyze within this request and return the result instead of a job."),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Analyzes an assignment sample PDF using Gemini to identify question types and counts.
+    The result is stored against the PDF's content hash and returned immediately (200) until
+    the file changes. Otherwise this queues a job (or joins the one started by the upload)
+    and returns 202 with its ID; follow it at /jobs/{job_id}.
     Requires Vertex AI to be initialized and appropriate permissions.
     """
     if current_user.user_type not in ["Teacher", "Admin"]:
@@ -400,14 +527,28 @@ async def analyze_assignment_sample(
     if not assignment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment sample not found.")
 
-    gs_url = None
-    for url_obj in assignment.urls:
-        if url_obj.url_type == schemas.UrlTypeEnum.GS.value:
-            gs_url = url_obj.url
-            break
+    gs_url = _sample_gs_url(assignment)
     if not gs_url:
         logger.error(f"No GS URL found for assignment sample {assignment_id}.")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="GS URL for the assignment sample PDF not found.")
+    if not gs_url.startswith("gs://"):
+        # Checked here too so no job is queued that is bound to fail
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid GS URL provided.")
+
+    content_hash = await asyncio.to_thread(_sample_content_hash, assignment_id, gs_url)
+    if not no_cache:
+        stored = get_stored_analysis(db, assignment_id, content_hash)
+        if stored is not None:
+            logger.info(f"Serving stored analysis for assignment sample {assignment_id} ({content_hash}).")
+            return stored
+
+    if not wait:
+        job = None if no_cache else _active_analysis_job(db, assignment_id, content_hash)
+        if job is None:
+            job = _enqueue_analysis(db, assignment, gs_url, content_hash, current_user, no_cache)
+            logger.info(f"Queued analysis of assignment sample {assignment_id} as job {job.id}")
+        response.status_code = status.HTTP_202_ACCEPTED
+        return schemas.JobSubmitted(job_id=job.id, status=job.status, **job_urls(job.id))
 
     logger.info(f"Analyzing assignment sample {assignment_id} using GS URL: {gs_url}")
 
@@ -417,8 +558,10 @@ async def analyze_assignment_sample(
             gs_url=gs_url,
             user_id=current_user.id,
             action="analyze_assignment_sample",
-            session_id=str(uuid.uuid4())
+            session_id=str(uuid.uuid4()),
+            no_cache=no_cache,
         )
+        await asyncio.to_thread(_save_analysis, assignment_id, gs_url, content_hash, validated_response)
 
         log_activity(
             db=db, user_id=current_user.id, action='ASSIGNMENT_SAMPLE_ANALYZED',
@@ -6,17 +6,33 @@ from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import os
 import logging
+from typing import Optional
 
 from backend import models, schemas, utils
 from backend.database import get_db
 from backend.logger_utils import log_activity
-from backend.dependencies import get_current_user
+from backend.dependencies import Principal, get_current_principal, get_current_user
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+# --- Helper: Current section for the section_id token claim ---
+def _current_section_id(user: models.User, entity_id: Optional[int], db: Session) -> Optional[int]:
+    """Returns the student's section for the current year, or None for other roles."""
+    if user.user_type != "Student" or entity_id is None:
+        return None
+    try:
+        student_year = db.query(models.StudentYear.sectionId).filter(
+            models.StudentYear.studentId == entity_id,
+            models.StudentYear.year == datetime.now().year
+        ).first()
+    except Exception as e:
+        logger.error(f"Error determining section_id for user {user.username}: {e}", exc_info=True)
+        return None
+    return student_year.sectionId if student_year else None
+
 @router.post("/login", response_model=schemas.UserInfo)
 def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
@@ -36,8 +52,9 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-    # Verify password
-    if not utils.verify_password(form_data.password, user.password_hash):
+    # Verify password (bcrypt runs in the password hashing pool; when it's saturated the app returns 503)
+    password_ok = utils.verify_password(form_data.password, user.password_hash)
+    if not password_ok:
         # Log failed login attempt for existing user
         log_activity(
             db=db, 
@@ -76,14 +93,6 @@ def login_for_access_token(
         logger.error(f"Failed to update last_login or log activity for user {user.username}: {e}", exc_info=True)
         # Don't prevent login if only logging fails - the user did authenticate successfully
 
-    # Generate JWT token
-    jwt_expiry_minutes = int(os.getenv("JWT_EXPIRY_MINUTES", "30"))  # Increased default from 15 to 30
-    access_token_expires = timedelta(minutes=jwt_expiry_minutes)
-    access_token = utils.create_access_token(
-        subject=user.username, 
-        expires_delta=access_token_expires
-    )
-
     # Determine entity ID based on user type
     entity_id = None
     try:
@@ -111,6 +120,17 @@ def login_for_access_token(
     if entity_id is None and user.user_type != 'Admin':
         logger.warning(f"Could not determine entity_id for user {user.username} (Type: {user.user_type})")
 
+    # Generate JWT token (role, entity and section claims spare later requests the profile lookups)
+    jwt_expiry_minutes = int(os.getenv("JWT_EXPIRY_MINUTES", "30"))  # Increased default from 15 to 30
+    access_token_expires = timedelta(minutes=jwt_expiry_minutes)
+    access_token = utils.create_access_token(
+        subject=user.username, 
+        expires_delta=access_token_expires,
+        user_type=user.user_type,
+        entity_id=entity_id,
+        section_id=_current_section_id(user, entity_id, db)
+    )
+
     # Return successful login response
     return schemas.UserInfo(
         user_id=user.id,
@@ -173,18 +193,24 @@ def get_current_user_info(
 
 @router.post("/refresh-token", response_model=schemas.TokenData)  # Assuming you have this schema
 def refresh_access_token(
-    current_user: models.User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
 ):
     """
     Refresh the access token for the current user.
     This can be useful for extending sessions without full re-authentication.
     """
+    current_user = principal.user
     try:
         jwt_expiry_minutes = int(os.getenv("JWT_EXPIRY_MINUTES", "30"))
         access_token_expires = timedelta(minutes=jwt_expiry_minutes)
+        # Re-read the section so a refreshed token picks up section changes
         new_access_token = utils.create_access_token(
             subject=current_user.username, 
-            expires_delta=access_token_expires
+            expires_delta=access_token_expires,
+            user_type=principal.user_type,
+            entity_id=principal.entity_id,
+            section_id=_current_section_id(current_user, principal.entity_id, db)
         )
         
         logger.info(f"Refreshed token for user: {current_user.username}")
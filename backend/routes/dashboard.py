@@ -1,14 +1,15 @@
 # backend/routes/dashboard.py
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, case, cast, Date, Integer # Import necessary SQL functions
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import func, case, cast, Date, Integer, select # Import necessary SQL functions
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta, date
 
 from backend import models, schemas
-from backend.database import get_db
-from backend.dependencies import get_current_user
+from backend.database import get_async_db
+from backend.dependencies import Principal, get_current_student, get_current_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
@@ -17,34 +18,18 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)] # Apply auth to all endpoints here
 )
 
-# --- Helper Function to Get Student ID ---
-def _get_student_id_from_user(current_user: models.User, db: Session) -> int:
-    """Gets the student ID associated with the logged-in user."""
-    if current_user.user_type != "Student":
-        # This endpoint is only for students
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access restricted to students."
-        )
-    student = db.query(models.Student.id).filter(models.Student.user_id == current_user.id).first()
-    if not student:
-        logger.error(f"No student profile found for user_id {current_user.id} ('{current_user.username}')")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Student profile not found for the logged-in user."
-        )
-    return student.id
-
 # --- Helper Function to Get Student's Current Grade ID ---
-def _get_student_grade_id(student_id: int, db: Session) -> Optional[int]:
+async def _get_student_grade_id(student_id: int, db: AsyncSession) -> Optional[int]:
     """Gets the current grade ID for a student."""
     current_year = datetime.now().year # Or determine academic year differently
-    student_year_info = db.query(models.StudentYear).options(
-        joinedload(models.StudentYear.section).joinedload(models.Section.grade)
-    ).filter(
-        models.StudentYear.studentId == student_id,
-        models.StudentYear.year == current_year # Filter by current year
-    ).first()
+    student_year_info = (await db.execute(
+        select(models.StudentYear).options(
+            joinedload(models.StudentYear.section).joinedload(models.Section.grade)
+        ).filter(
+            models.StudentYear.studentId == student_id,
+            models.StudentYear.year == current_year # Filter by current year
+        )
+    )).scalars().first()
     print(student_year_info,'...........')
     if student_year_info and student_year_info.section and student_year_info.section.grade:
         return student_year_info.section.grade.id
@@ -55,17 +40,17 @@ def _get_student_grade_id(student_id: int, db: Session) -> Optional[int]:
 # --- API Endpoints ---
 
 @router.get("/weekly-performance", response_model=List[schemas.WeeklyPerformanceData])
-def get_weekly_performance(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_weekly_performance(
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_student)
 ):
     """Calculates the average homework score percentage for the last 7 days."""
-    student_id = _get_student_id_from_user(current_user, db)
+    student_id = principal.entity_id
     today = datetime.utcnow().date()
     seven_days_ago = today - timedelta(days=6)
     
     # Query homework scores from the last 7 days
-    scores_last_7_days = db.query(
+    scores_last_7_days = (await db.execute(select(
         cast(models.StudentHomeworkScore.graded_at, Date).label("graded_date"),
         func.avg(
             (models.StudentHomeworkScore.score_achieved / models.StudentHomeworkScore.max_score) * 100
@@ -79,7 +64,7 @@ def get_weekly_performance(
         cast(models.StudentHomeworkScore.graded_at, Date)
     ).order_by(
         cast(models.StudentHomeworkScore.graded_at, Date)
-    ).all()
+    ))).all()
 
     # Create a dictionary for quick lookup
     scores_dict = {result.graded_date: result.avg_percentage for result in scores_last_7_days}
@@ -100,34 +85,34 @@ def get_weekly_performance(
     return weekly_data
 
 @router.get("/overall-average-score", response_model=schemas.OverallAverageScoreData)
-def get_overall_average_score(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_overall_average_score(
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_student)
 ):
     """Calculates the overall average score percentage across all assessments."""
-    student_id = _get_student_id_from_user(current_user, db)
+    student_id = principal.entity_id
 
     # Calculate average of individual assessment percentages
-    result = db.query(
+    result = (await db.execute(select(
         func.avg(
             (models.StudentAssessmentScore.score_achieved / models.StudentAssessmentScore.max_score) * 100
         ).label("overall_avg")
     ).filter(
         models.StudentAssessmentScore.student_id == student_id,
         models.StudentAssessmentScore.max_score > 0
-    ).first()
+    ))).first()
 
     return schemas.OverallAverageScoreData(average_score=result.overall_avg if result else None)
 
 
 @router.get("/available-terms", response_model=List[schemas.TermInfoBasic])
-def get_available_terms_for_student(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_available_terms_for_student(
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_student)
 ):
     """Gets the list of terms available for the student's current grade and year."""
-    student_id = _get_student_id_from_user(current_user, db)
-    grade_id = _get_student_grade_id(student_id, db)
+    student_id = principal.entity_id
+    grade_id = await _get_student_grade_id(student_id, db)
     current_year = datetime.now().year # Or determine academic year differently
 
     if not grade_id:
@@ -137,7 +122,7 @@ def get_available_terms_for_student(
         # raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student grade for current year not found.")
 
 
-    terms = db.query(
+    terms = (await db.execute(select(
         models.Term.id.label("term_id"),
         models.Term.name.label("term_name"),
         models.Term.year
@@ -147,33 +132,33 @@ def get_available_terms_for_student(
     ).order_by(
         models.Term.start_date, # Order by start date if available
         models.Term.name        # Then by name
-    ).all()
+    ))).all()
 
     # Map the result to the Pydantic schema
     return [schemas.TermInfoBasic.from_orm(term) for term in terms]
 
 
 @router.get("/term-summary/{term_id}", response_model=schemas.TermSummaryData)
-def get_term_summary(
+async def get_term_summary(
     term_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_student)
 ):
     """Gets the summary metrics (lessons, average score) for a specific term."""
-    student_id = _get_student_id_from_user(current_user, db)
-    grade_id = _get_student_grade_id(student_id, db)
+    student_id = principal.entity_id
+    grade_id = await _get_student_grade_id(student_id, db)
 
     if not grade_id:
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student grade for current year not found.")
 
     # 1. Get Total Lessons for the student's grade in this term
-    total_lessons = db.query(func.count(models.Lesson.id)).join(models.Subject).filter(
+    total_lessons = (await db.execute(select(func.count(models.Lesson.id)).join(models.Subject).filter(
         models.Lesson.term_id == term_id,
         models.Subject.grade_id == grade_id
-    ).scalar() or 0
+    ))).scalar() or 0
 
     # 2. Get Average Score for this term
-    term_avg_result = db.query(
+    term_avg_result = (await db.execute(select(
         func.avg(
             (models.StudentAssessmentScore.score_achieved / models.StudentAssessmentScore.max_score) * 100
         ).label("term_avg")
@@ -181,7 +166,7 @@ def get_term_summary(
         models.StudentAssessmentScore.student_id == student_id,
         models.StudentAssessmentScore.term_id == term_id,
         models.StudentAssessmentScore.max_score > 0
-    ).first()
+    ))).first()
     term_average_score = term_avg_result.term_avg if term_avg_result else None
 
     # 3. Study Streak (Placeholder)
@@ -196,25 +181,25 @@ def get_term_summary(
 
 
 @router.get("/subject-performance/{term_id}", response_model=List[schemas.SubjectTermPerformanceData])
-def get_subject_performance_by_term(
+async def get_subject_performance_by_term(
     term_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_student)
 ):
     """Gets the average score for each subject within a specific term."""
-    student_id = _get_student_id_from_user(current_user, db)
-    grade_id = _get_student_grade_id(student_id, db)
+    student_id = principal.entity_id
+    grade_id = await _get_student_grade_id(student_id, db)
 
     if not grade_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student grade for current year not found.")
 
     # Get all subjects for the student's grade
-    subjects_in_grade = db.query(
+    subjects_in_grade = (await db.execute(select(
         models.Subject.id,
         models.Subject.name
     ).filter(
         models.Subject.grade_id == grade_id
-    ).all()
+    ))).all()
 
     if not subjects_in_grade:
         return [] # No subjects defined for this grade
@@ -224,7 +209,7 @@ def get_subject_performance_by_term(
 
     # Query average scores per subject for the given student and term
     # We need Assessment -> Subject link
-    subject_scores = db.query(
+    subject_scores = (await db.execute(select(
         models.Assessment.subject_id,
         func.avg(
             (models.StudentAssessmentScore.score_achieved / models.StudentAssessmentScore.max_score) * 100
@@ -238,7 +223,7 @@ def get_subject_performance_by_term(
         models.StudentAssessmentScore.max_score > 0
     ).group_by(
         models.Assessment.subject_id
-    ).all()
+    ))).all()
 
     scores_map = {result.subject_id: result.avg_subj_score for result in subject_scores}
 
@@ -258,7 +243,7 @@ def get_subject_performance_by_term(
 # Potential combined endpoint (optional, might be too much data at once)
 # @router.get("/all-data", response_model=schemas.StudentDashboardData)
 # async def get_all_dashboard_data(
-#     db: Session = Depends(get_db),
+#     db: AsyncSession = Depends(get_async_db),
 #     current_user: models.User = Depends(get_current_user)
 # ):
 #     """Fetches data for multiple dashboard components in one call."""
@@ -275,13 +260,13 @@ def get_subject_performance_by_term(
 
 
 @router.get("/subject-performance", response_model=List[schemas.SubjectTermPerformanceData])
-def get_subject_performance(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_subject_performance(
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_student)
 ):
     """Gets the average homework score percentage for each subject (all terms)."""
-    student_id = _get_student_id_from_user(current_user, db)
-    # grade_id = _get_student_grade_id(student_id, db)
+    student_id = principal.entity_id
+    # grade_id = await _get_student_grade_id(student_id, db)
 
     # if not grade_id:
     #     raise HTTPException(
@@ -290,10 +275,10 @@ def get_subject_performance(
     #     )
 
     # Get all subjects for the student's grade
-    subjects = db.query(
+    subjects = (await db.execute(select(
         models.Subject.id,
         models.Subject.name
-    ).all()
+    ))).all()
 
     if not subjects:
         return []  # No subjects defined for this grade
@@ -302,7 +287,7 @@ def get_subject_performance(
     subject_name_map = {s.id: s.name for s in subjects}
 
     # Query average homework scores per subject
-    subject_scores = db.query(
+    subject_scores = (await db.execute(select(
         models.Homework.subject_id,
         func.avg(
             (models.StudentHomeworkScore.score_achieved / models.StudentHomeworkScore.max_score) * 100
@@ -316,7 +301,7 @@ def get_subject_performance(
         models.StudentHomeworkScore.max_score > 0
     ).group_by(
         models.Homework.subject_id
-    ).all()
+    ))).all()
 
     scores_map = {result.subject_id: result.avg_subj_score for result in subject_scores}
 
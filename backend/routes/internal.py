@@ -0,0 +1,179 @@
+# backend/routes/internal.py
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from backend import models
+from backend.assessment_prefetch import prefetch_stats
+from backend.audit_sink import audit_sink
+from backend.auth_cache import user_principal_cache
+from backend.chat_history_store import chat_history_store
+from backend.db_metrics import async_pool_metrics, pool_metrics
+from backend.dependencies import get_current_user
+from backend.file_transfer import file_transfer_metrics
+from backend.gcs_cache import gcs_file_cache
+from backend.job_queue import job_queue
+from backend.llm_resilience import llm_resilience
+from backend.llm_scheduler import llm_scheduler
+from backend.model_registry import model_registry
+from backend.password_pool import password_pool
+from backend.session_store import snapshot_all as chat_session_snapshot
+from backend.single_flight import generation_flights
+from backend.services.llm_response_cache import llm_response_cache
+from backend.services.llm_usage_recorder import usage_writer
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal Diagnostics"],
+    dependencies=[Depends(get_current_user)]
+)
+
+# --- Helper: Check if Admin ---
+def _verify_admin(current_user: models.User):
+    if current_user.user_type != "Admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access restricted to administrators."
+        )
+
+
+@router.get("/db-pool")
+def get_db_pool_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns connection pool state, checkout counters and wait/checkout-duration histograms."""
+    _verify_admin(current_user)
+    return {
+        "sync": pool_metrics.snapshot(),
+        "async": async_pool_metrics.snapshot(),
+    }
+
+
+@router.get("/auth-cache")
+def get_auth_cache_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns size and hit/miss/eviction/invalidation counters for the authenticated-user cache."""
+    _verify_admin(current_user)
+    return user_principal_cache.snapshot()
+
+
+@router.get("/password-pool")
+def get_password_pool_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns queue depth, rejections and wait/run histograms for the bcrypt process pool."""
+    _verify_admin(current_user)
+    return password_pool.snapshot()
+
+
+@router.get("/audit-sink")
+def get_audit_sink_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns queue depth, write/drop counters and batch histograms for the audit-log writer."""
+    _verify_admin(current_user)
+    return audit_sink.snapshot()
+
+
+@router.get("/llm-usage-writer")
+def get_llm_usage_writer_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns queue depth, write/drop counters and batch histograms for the LLM token-usage writer."""
+    _verify_admin(current_user)
+    return usage_writer.snapshot()
+
+
+@router.get("/chat-sessions")
+def get_chat_session_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns live chat sessions, approximate history bytes and eviction counters across ChatManagers."""
+    _verify_admin(current_user)
+    snapshot = chat_session_snapshot()
+    snapshot["persistence"] = chat_history_store.snapshot() if chat_history_store is not None else None
+    return snapshot
+
+
+@router.get("/gcs-cache")
+def get_gcs_cache_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns size, hit/miss and transfer counters for the on-disk GCS file cache."""
+    _verify_admin(current_user)
+    return gcs_file_cache.snapshot()
+
+
+@router.get("/file-transfer")
+def get_file_transfer_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns per-call inline vs by-reference file bytes sent to the model."""
+    _verify_admin(current_user)
+    return file_transfer_metrics.snapshot()
+
+
+@router.get("/model-clients")
+def get_model_client_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns the shared Vertex AI model clients and registry hit/creation counters."""
+    _verify_admin(current_user)
+    return model_registry.snapshot()
+
+
+@router.get("/llm-response-cache")
+def get_llm_response_cache_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns size and per-action hit/miss/bypass counters for the LLM response cache."""
+    _verify_admin(current_user)
+    return llm_response_cache.snapshot()
+
+
+@router.get("/single-flight")
+def get_single_flight_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns in-flight and coalesced request counts for deduplicated generation calls."""
+    _verify_admin(current_user)
+    return generation_flights.snapshot()
+
+
+@router.get("/assessment-prefetch")
+def get_assessment_prefetch_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns hit rate, discarded branches and budget use for speculative assessment questions."""
+    _verify_admin(current_user)
+    return prefetch_stats.snapshot()
+
+
+@router.get("/generation-jobs")
+def get_generation_job_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns this process's job worker slots, running jobs, outcomes and queue-wait/run-time histograms."""
+    _verify_admin(current_user)
+    return job_queue.snapshot()
+
+
+@router.get("/llm-scheduler")
+def get_llm_scheduler_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns per-lane running/waiting counts and queue-wait histograms, model rate buckets and the busiest users."""
+    _verify_admin(current_user)
+    return llm_scheduler.snapshot()
+
+
+@router.get("/llm-resilience")
+def get_llm_resilience_stats(
+    current_user: models.User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Returns per-action retry, hedge and deadline counters with recent latency percentiles."""
+    _verify_admin(current_user)
+    return llm_resilience.snapshot()
@@ -0,0 +1,85 @@
+# backend/routes/jobs.py
+import asyncio
+import logging
+from typing import AsyncIterator, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from backend import models, schemas
+from backend.database import get_db
+from backend.dependencies import get_current_user
+from backend.job_queue import JOB_SSE_POLL_SECONDS, TERMINAL_STATUSES, job_queue
+from backend.sse import sse_event, sse_response
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Generation Jobs"]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _get_owned_job(db: Session, job_id: str, current_user: models.User) -> models.GenerationJob:
+    job = db.get(models.GenerationJob, job_id)
+    # Other users' jobs are reported as missing rather than forbidden
+    if job is None or (job.user_id != current_user.id and current_user.user_type != "Admin"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    return job
+
+
+@router.get("/", response_model=List[schemas.JobInfo])
+def read_my_jobs(
+    job_status: schemas.JobStatusEnum = Query(None, alias="status"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Lists the current user's most recent generation jobs."""
+    query = db.query(models.GenerationJob).filter(models.GenerationJob.user_id == current_user.id)
+    if job_status is not None:
+        query = query.filter(models.GenerationJob.status == job_status.value)
+    return query.order_by(models.GenerationJob.created_at.desc()).limit(limit).all()
+
+
+@router.get("/{job_id}", response_model=schemas.JobInfo)
+def read_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Returns a job's status and progress, with its result once it has succeeded."""
+    return _get_owned_job(db, job_id, current_user)
+
+
+async def _job_events(job_id: str) -> AsyncIterator[str]:
+    """Emits `progress` whenever the job changes and a final `done` or `failed` event with the job."""
+    last_seen = None
+    while True:
+        job = await asyncio.to_thread(job_queue.fetch, job_id)
+        if job is None:
+            yield sse_event("error", {"detail": "Job not found."})
+            return
+        info = schemas.JobInfo.model_validate(job).model_dump(mode="json")
+        if job.status in TERMINAL_STATUSES:
+            yield sse_event("done" if job.status == "succeeded" else "failed", info)
+            return
+        state = (job.status, job.progress, job.progress_message)
+        if state != last_seen:
+            last_seen = state
+            yield sse_event("progress", {k: info[k] for k in ("id", "status", "progress", "progress_message")})
+        await asyncio.sleep(JOB_SSE_POLL_SECONDS)
+
+
+@router.get("/{job_id}/events")
+def stream_job_events(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Streams a job's progress as server-sent events. Disconnecting doesn't affect the job;
+    reconnect here or poll /jobs/{job_id} for the result.
+    """
+    _get_owned_job(db, job_id, current_user)
+    return sse_response(_job_events(job_id))
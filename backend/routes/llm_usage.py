@@ -1,13 +1,15 @@
 # backend/routes/llm_usage.py
 from fastapi import APIRouter, Depends, HTTPException, Query, status # Added status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 
 from backend.database import get_db
-from backend.models import LLMTokenUsage, User
-from backend.schemas import LLMTokenUsageInfo, LLMTokenUsageCreate
+from backend.models import LLMTokenUsage, LLMUsageDaily, LLMUsageHourly, User
+from backend.schemas import LLMTokenUsageInfo, LLMTokenUsageCreate, LLMUsageGroupByEnum, LLMUsageSummaryItem
 from backend.dependencies import get_current_user
+from backend.services.llm_usage_rollup import apply_usage_rollups, rebuild_usage_rollups
 
 router = APIRouter(
     tags=["LLM Token Usage"]
@@ -96,16 +98,126 @@ def create_llm_token_usage(
     """
     db_usage = LLMTokenUsage(
         user_id=current_user.id,
+        timestamp=datetime.utcnow(), # Explicit so the rollup bucket matches the stored row
         session_id=usage_data.session_id,
         action=usage_data.action,
         model_name=usage_data.model_name,
         input_tokens=usage_data.input_tokens,
         output_tokens=usage_data.output_tokens,
-        total_tokens=usage_data.total_tokens
+        total_tokens=usage_data.total_tokens,
+        latency_ms=usage_data.latency_ms,
+        finish_reason=usage_data.finish_reason
     )
     
     db.add(db_usage)
+    db.flush()
+    # Fold into the hourly/daily rollups in the same transaction
+    apply_usage_rollups(db.connection(), [{
+        "timestamp": db_usage.timestamp,
+        "user_id": db_usage.user_id,
+        "action": db_usage.action,
+        "model_name": db_usage.model_name,
+        "input_tokens": db_usage.input_tokens,
+        "output_tokens": db_usage.output_tokens,
+        "total_tokens": db_usage.total_tokens,
+        "latency_ms": db_usage.latency_ms,
+    }])
     db.commit()
     db.refresh(db_usage)
     
     return db_usage
+
+
+# --- Summary Endpoints (served from the hourly/daily rollup tables) ---
+
+@router.get("/summary/{group_by}", response_model=List[LLMUsageSummaryItem])
+def read_llm_usage_summary(
+    group_by: LLMUsageGroupByEnum,
+    admin_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    start_date: Optional[date] = Query(None, description="Filter by start date (YYYY-MM-DD, UTC)"),
+    end_date: Optional[date] = Query(None, description="Filter by end date (YYYY-MM-DD, UTC)"),
+    user_id: Optional[int] = Query(None, description="Only include this user"),
+    action: Optional[str] = Query(None, description="Only include this action"),
+    model_name: Optional[str] = Query(None, description="Only include this model")
+):
+    """
+    Aggregated LLM token usage grouped by hour, day, user, action or model. Admin access required.
+    Reads only the rollup tables, so cost depends on the number of buckets, not raw usage rows.
+    """
+    if admin_user.user_type != "Admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized. Admin access required.")
+
+    # Hourly grouping needs the hourly table; everything else is served from the daily table
+    if group_by == LLMUsageGroupByEnum.hour:
+        rollup, bucket = LLMUsageHourly, LLMUsageHourly.bucket_start
+        start_bound = datetime.combine(start_date, datetime.min.time()) if start_date else None
+        end_bound = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+    else:
+        rollup, bucket = LLMUsageDaily, LLMUsageDaily.bucket_date
+        start_bound = start_date
+        end_bound = end_date + timedelta(days=1) if end_date else None
+
+    group_column = {
+        LLMUsageGroupByEnum.hour: bucket,
+        LLMUsageGroupByEnum.day: bucket,
+        LLMUsageGroupByEnum.user: rollup.user_id,
+        LLMUsageGroupByEnum.action: rollup.action,
+        LLMUsageGroupByEnum.model: rollup.model_name,
+    }[group_by]
+
+    query = select(
+        group_column.label("key"),
+        func.sum(rollup.request_count).label("request_count"),
+        func.sum(rollup.input_tokens).label("input_tokens"),
+        func.sum(rollup.output_tokens).label("output_tokens"),
+        func.sum(rollup.total_tokens).label("total_tokens"),
+        func.sum(rollup.latency_ms_total).label("latency_ms_total"),
+        func.sum(rollup.latency_count).label("latency_count"),
+    ).group_by(group_column).order_by(group_column)
+
+    if start_bound is not None:
+        query = query.where(bucket >= start_bound)
+    if end_bound is not None:
+        query = query.where(bucket < end_bound)
+    if user_id is not None:
+        query = query.where(rollup.user_id == user_id)
+    if action:
+        query = query.where(rollup.action == action)
+    if model_name is not None:
+        query = query.where(rollup.model_name == model_name)
+
+    rows = db.execute(query).all()
+
+    usernames = {}
+    if group_by == LLMUsageGroupByEnum.user and rows:
+        usernames = dict(db.execute(
+            select(User.id, User.username).where(User.id.in_([row.key for row in rows]))
+        ).all())
+
+    return [
+        LLMUsageSummaryItem(
+            key=row.key.isoformat() if hasattr(row.key, "isoformat") else str(row.key),
+            username=usernames.get(row.key),
+            request_count=row.request_count or 0,
+            input_tokens=row.input_tokens or 0,
+            output_tokens=row.output_tokens or 0,
+            total_tokens=row.total_tokens or 0,
+            avg_latency_ms=(row.latency_ms_total / row.latency_count) if row.latency_count else None,
+        )
+        for row in rows
+    ]
+
+
+@router.post("/summary/rebuild")
+def rebuild_llm_usage_summary(
+    admin_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Recomputes the rollup tables from the raw usage rows (e.g. after first deploying them). Admin access required.
+    """
+    if admin_user.user_type != "Admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized. Admin access required.")
+    processed = rebuild_usage_rollups(db)
+    return {"message": "LLM usage rollups rebuilt.", "raw_rows_processed": processed}
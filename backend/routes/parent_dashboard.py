@@ -2,15 +2,16 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 # --- CORRECTED IMPORT ---
-from sqlalchemy.orm import Session, joinedload, selectinload, contains_eager, aliased # Added selectinload here
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload, contains_eager, aliased # Added selectinload here
 # --- END CORRECTION ---
-from sqlalchemy import func, case, cast, Date, Integer, distinct, desc, and_, or_
+from sqlalchemy import func, case, cast, Date, Integer, distinct, desc, and_, or_, select
 from typing import List, Optional, Dict, Set
 from datetime import datetime, timedelta, date
 
 from backend import models, schemas
-from backend.database import get_db
-from backend.dependencies import get_current_user
+from backend.database import get_async_db
+from backend.dependencies import Principal, get_current_parent, get_current_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
@@ -19,47 +20,30 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)] # Apply auth to all endpoints here
 )
 
-# --- Helper: Get Parent ID ---
-def _get_parent_id_from_user(current_user: models.User, db: Session) -> int:
-    """Gets the parent ID associated with the logged-in user."""
-    if current_user.user_type != "Parent":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access restricted to parents."
-        )
-    parent = db.query(models.Parent.id).filter(models.Parent.user_id == current_user.id).first()
-    if not parent:
-        logger.error(f"No parent profile found for user_id {current_user.id} ('{current_user.username}')")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Parent profile not found for the logged-in user."
-        )
-    return parent.id
-
 # --- Helper: Get Child IDs for Parent ---
-def _get_child_ids_for_parent(parent_id: int, db: Session) -> List[int]:
+async def _get_child_ids_for_parent(parent_id: int, db: AsyncSession) -> List[int]:
     """Gets a list of student IDs associated with the parent."""
     # Use selectinload for efficient loading of the many-to-many 'children' relationship
-    parent = db.query(models.Parent).options(
+    parent = (await db.execute(select(models.Parent).options(
         selectinload(models.Parent.children)
-    ).filter(models.Parent.id == parent_id).first()
+    ).filter(models.Parent.id == parent_id))).scalars().first()
 
     if not parent:
-        # This case should ideally not happen if parent_id came from _get_parent_id_from_user
+        # This case should ideally not happen if parent_id came from get_current_parent
         logger.error(f"Parent with ID {parent_id} not found when fetching children.")
         return []
     return [child.id for child in parent.children]
 
 # --- Helper: Verify Parent Access to Child ---
-def _verify_parent_access_to_child(parent_id: int, student_id: int, db: Session):
+async def _verify_parent_access_to_child(parent_id: int, student_id: int, db: AsyncSession):
     """Checks if the parent is linked to the specified student."""
     # Query the association table directly or check the relationship
     # Checking the relationship might be slightly less efficient if not loaded,
     # but querying the association table is explicit and clear.
-    is_linked = db.query(models.parent_student_association).filter(
+    is_linked = (await db.execute(select(models.parent_student_association).filter(
         models.parent_student_association.c.parent_id == parent_id,
         models.parent_student_association.c.student_id == student_id
-    ).first()
+    ))).first()
 
     if not is_linked:
         logger.warning(f"Parent ID {parent_id} attempted to access data for unauthorized student ID {student_id}")
@@ -69,16 +53,16 @@ def _verify_parent_access_to_child(parent_id: int, student_id: int, db: Session)
         )
 
 # --- Helper: Get Child's Current Grade/Section ---
-def _get_child_grade_section(student_id: int, db: Session) -> Optional[tuple[int, str, int, str]]:
+async def _get_child_grade_section(student_id: int, db: AsyncSession) -> Optional[tuple[int, str, int, str]]:
     """Gets the current grade ID/Name and section ID/Name for a student."""
     current_year = datetime.now().year
-    student_year_info = db.query(models.StudentYear).options(
+    student_year_info = (await db.execute(select(models.StudentYear).options(
         # Eager load necessary relationships for accessing names
         joinedload(models.StudentYear.section).joinedload(models.Section.grade)
     ).filter(
         models.StudentYear.studentId == student_id,
         models.StudentYear.year == current_year
-    ).first() # Assuming only one entry per year
+    ))).scalars().first() # Assuming only one entry per year
 
     if student_year_info and student_year_info.section and student_year_info.section.grade:
         return (
@@ -94,17 +78,17 @@ def _get_child_grade_section(student_id: int, db: Session) -> Optional[tuple[int
 # --- API Endpoints ---
 
 @router.get("/children", response_model=List[schemas.ParentChildInfo])
-def get_parent_children(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_parent_children(
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_parent)
 ):
     """Lists the children associated with the logged-in parent."""
-    parent_id = _get_parent_id_from_user(current_user, db)
+    parent_id = principal.entity_id
 
     # Fetch children with necessary details using the relationship
-    parent = db.query(models.Parent).options(
+    parent = (await db.execute(select(models.Parent).options(
         selectinload(models.Parent.children).joinedload(models.Student.user) # Load children and their user details efficiently
-    ).filter(models.Parent.id == parent_id).first()
+    ).filter(models.Parent.id == parent_id))).scalars().first()
 
     if not parent:
         # This case should ideally not happen if parent_id is valid
@@ -118,7 +102,7 @@ def get_parent_children(
         if not child.user: # Skip if user data is missing
             logger.warning(f"Child student {child.id} linked to parent {parent_id} is missing user data.")
             continue
-        grade_info = _get_child_grade_section(child.id, db)
+        grade_info = await _get_child_grade_section(child.id, db)
         children_info.append(schemas.ParentChildInfo(
             student_id=child.id,
             student_name=child.name,
@@ -130,27 +114,27 @@ def get_parent_children(
 
 
 @router.get("/subject-performance/{student_id}", response_model=List[schemas.ParentSubjectPerformance])
-def get_child_subject_performance(
+async def get_child_subject_performance(
     student_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_parent)
 ):
     """Gets the average homework score per subject for the specified child."""
-    parent_id = _get_parent_id_from_user(current_user, db)
-    _verify_parent_access_to_child(parent_id, student_id, db)  # Authorize access
+    parent_id = principal.entity_id
+    await _verify_parent_access_to_child(parent_id, student_id, db)  # Authorize access
 
     # Get child's grade ID
-    # grade_section_info = _get_child_grade_section(student_id, db)
+    # grade_section_info = await _get_child_grade_section(student_id, db)
     # if not grade_section_info:
     #     logger.warning(f"Cannot fetch subject performance for student {student_id} as grade is unknown.")
     #     return []
     # grade_id = grade_section_info[0]
 
     # Get subjects for that grade
-    subjects_query = db.query(models.Subject.id, models.Subject.name).filter(
+    subjects_query = select(models.Subject.id, models.Subject.name).filter(
         models.Subject.student_id == student_id
     ).order_by(models.Subject.name)
-    subjects = subjects_query.all()
+    subjects = (await db.execute(subjects_query)).all()
 
 
     # if not subjects:
@@ -161,7 +145,7 @@ def get_child_subject_performance(
     subject_ids = list(subject_map.keys())
 
     # Fetch average homework scores for this student per subject
-    avg_scores_query = db.query(
+    avg_scores_query = select(
         models.Homework.subject_id,
         func.avg(
             case(
@@ -179,7 +163,7 @@ def get_child_subject_performance(
     ).group_by(
         models.Homework.subject_id
     )
-    avg_scores = avg_scores_query.all()
+    avg_scores = (await db.execute(avg_scores_query)).all()
     
     score_map = {
         score.subject_id: round(score.avg_score_percent, 2) 
@@ -201,19 +185,19 @@ def get_child_subject_performance(
 
 
 @router.get("/assessments/{student_id}", response_model=List[schemas.ParentAssessmentStatus])
-def get_child_assessment_status(
+async def get_child_assessment_status(
     student_id: int,
     status_filter: Optional[str] = Query(None, description="Filter by status: Upcoming, Completed, Pending"),
     limit: int = Query(10, ge=1, le=50), # Limit results
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_parent)
 ):
     """Gets the status of assessments (Upcoming, Completed, Pending) for the specified child."""
-    parent_id = _get_parent_id_from_user(current_user, db)
-    _verify_parent_access_to_child(parent_id, student_id, db) # Authorize access
+    parent_id = principal.entity_id
+    await _verify_parent_access_to_child(parent_id, student_id, db) # Authorize access
 
     # Get child's grade ID to filter relevant assessments
-    grade_section_info = _get_child_grade_section(student_id, db)
+    grade_section_info = await _get_child_grade_section(student_id, db)
     if not grade_section_info:
         logger.warning(f"Cannot fetch assessments for student {student_id} as grade is unknown.")
         return []
@@ -225,7 +209,7 @@ def get_child_assessment_status(
     ScoreAlias = aliased(models.StudentAssessmentScore)
 
     # Base query for assessments linked to the student's grade via subject
-    assessments_query = db.query(
+    assessments_query = select(
         models.Assessment.id.label("assessment_id"),
         models.Assessment.name.label("assessment_name"),
         models.Assessment.due_date,
@@ -282,7 +266,7 @@ def get_child_assessment_status(
     ).limit(limit)
     # --- END CORRECTION ---
 
-    results = assessments_query.all()
+    results = (await db.execute(assessments_query)).all()
 
     # Map to schema
     return [
@@ -298,27 +282,27 @@ def get_child_assessment_status(
     ]
 
 @router.get("/timetable/{student_id}", response_model=List[schemas.ParentTimetableEntry])
-def get_child_timetable(
+async def get_child_timetable(
     student_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_parent)
 ):
     """
     Gets the weekly timetable for the specified child's section.
     NOTE: Requires the 'timetables' table to be populated with data.
     """
-    parent_id = _get_parent_id_from_user(current_user, db)
-    _verify_parent_access_to_child(parent_id, student_id, db) # Authorize access
+    parent_id = principal.entity_id
+    await _verify_parent_access_to_child(parent_id, student_id, db) # Authorize access
 
     # Get child's section ID
-    grade_section_info = _get_child_grade_section(student_id, db)
+    grade_section_info = await _get_child_grade_section(student_id, db)
     if not grade_section_info:
         logger.warning(f"Cannot fetch timetable for student {student_id} as section is unknown.")
         return []
     section_id = grade_section_info[2]
 
     # Query the timetable table for the specific section
-    timetable_entries = db.query(
+    timetable_entries = (await db.execute(select(
         models.Timetable.day_of_week,
         models.Timetable.start_time,
         models.Timetable.end_time,
@@ -333,7 +317,7 @@ def get_child_timetable(
     ).order_by(
         models.Timetable.day_of_week,
         models.Timetable.start_time
-    ).all()
+    ))).all()
 
     if not timetable_entries:
          logger.info(f"No timetable entries found for section ID {section_id}.")
@@ -116,7 +116,7 @@ async def create_parent(
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Hash the password
-    hashed_password = utils.hash_password(password)
+    hashed_password = await utils.hash_password_async(password)
 
     # Create the user
     db_user = models.User(
@@ -280,7 +280,7 @@ async def update_parent(
 
     # Hash the password ONLY if provided
     if password:
-        hashed_password = utils.hash_password(password)
+        hashed_password = await utils.hash_password_async(password)
         db_user.password_hash = hashed_password
 
     # Update other user fields
@@ -3,12 +3,12 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from backend import models, schemas
 from backend.database import get_db
-from backend.dependencies import get_current_user
+from backend.dependencies import Principal, get_current_student, get_current_user
 from backend.logger_utils import log_activity # Import log_activity
 
 logger = logging.getLogger(__name__)
@@ -18,32 +18,22 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
-# --- Helper Function to Get Student ID ---
-# (Copied from student_assignments.py/dashboard.py for simplicity)
-def _get_student_id_from_user(current_user: models.User, db: Session) -> int:
-    """Gets the student ID associated with the logged-in user."""
-    if current_user.user_type != "Student":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access restricted to students.")
-    student = db.query(models.Student.id).filter(models.Student.user_id == current_user.id).first()
-    if not student:
-        logger.error(f"No student profile found for user_id {current_user.id} ('{current_user.username}')")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student profile not found for the logged-in user.")
-    return student.id
-
 # --- Helper to check if assessment was assigned to student ---
-def _verify_assessment_assigned_to_student(student_id: int, assessment_id: int, db: Session):
+def _verify_assessment_assigned_to_student(student_id: int, assessment_id: int, db: Session, section_id: Optional[int] = None):
     """Checks if the assessment was distributed to the student."""
-    # Find the student's current section ID
-    current_year = datetime.now().year
-    student_year_info = db.query(models.StudentYear.sectionId).filter(
-        models.StudentYear.studentId == student_id,
-        models.StudentYear.year == current_year
-    ).first()
+    # Find the student's current section ID (skipped when the token already carries it)
+    current_section_id = section_id
+    if current_section_id is None:
+        current_year = datetime.now().year
+        student_year_info = db.query(models.StudentYear.sectionId).filter(
+            models.StudentYear.studentId == student_id,
+            models.StudentYear.year == current_year
+        ).first()
 
-    if not student_year_info:
-        raise HTTPException(status_code=400, detail="Cannot submit score: Student not currently assigned to a section.")
+        if not student_year_info:
+            raise HTTPException(status_code=400, detail="Cannot submit score: Student not currently assigned to a section.")
 
-    current_section_id = student_year_info.sectionId
+        current_section_id = student_year_info.sectionId
 
     # Check if a distribution exists for this assessment targeting this student
     distribution_exists = db.query(models.AssignmentDistribution.id).filter(
@@ -67,12 +57,12 @@ def _verify_assessment_assigned_to_student(student_id: int, assessment_id: int,
 def submit_assessment_score(
     score_data: schemas.StudentAssessmentScoreCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_student)
 ):
     """
     Allows a logged-in student to submit their score for an assigned assessment.
     """
-    student_id = _get_student_id_from_user(current_user, db)
+    student_id = principal.entity_id
 
     # --- Validation ---
     # 1. Check if assessment exists
@@ -86,7 +76,7 @@ def submit_assessment_score(
         raise HTTPException(status_code=404, detail=f"Term with ID {score_data.term_id} not found.")
 
     # 3. Verify the assessment was assigned to this student
-    _verify_assessment_assigned_to_student(student_id, score_data.assessment_id, db)
+    _verify_assessment_assigned_to_student(student_id, score_data.assessment_id, db, principal.section_id)
 
     # --- Create Score Record ---
     db_score = models.StudentAssessmentScore(
@@ -107,9 +97,9 @@ def submit_assessment_score(
         # Log activity
         log_activity(
             db=db,
-            user_id=current_user.id,
+            user_id=principal.user.id,
             action='ASSESSMENT_SCORE_SUBMITTED',
-            details=f"Student '{current_user.username}' (ID: {student_id}) submitted score {db_score.score_achieved}/{db_score.max_score} for assessment '{assessment.name}' (ID: {db_score.assessment_id}).",
+            details=f"Student '{principal.user.username}' (ID: {student_id}) submitted score {db_score.score_achieved}/{db_score.max_score} for assessment '{assessment.name}' (ID: {db_score.assessment_id}).",
             target_entity='StudentAssessmentScore',
             target_entity_id=db_score.id
         )
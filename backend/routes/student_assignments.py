@@ -8,7 +8,7 @@ from datetime import datetime
 
 from backend import models, schemas
 from backend.database import get_db
-from backend.dependencies import get_current_user
+from backend.dependencies import Principal, get_current_student, get_current_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
@@ -17,52 +17,35 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)] # Apply auth to all endpoints here
 )
 
-# --- Helper Function to Get Student ID ---
-# (Copied from dashboard.py for simplicity, could be moved to a common utils/helpers)
-def _get_student_id_from_user(current_user: models.User, db: Session) -> int:
-    """Gets the student ID associated with the logged-in user."""
-    if current_user.user_type != "Student":
-        # This endpoint is only for students
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access restricted to students."
-        )
-    student = db.query(models.Student.id).filter(models.Student.user_id == current_user.id).first()
-    if not student:
-        logger.error(f"No student profile found for user_id {current_user.id} ('{current_user.username}')")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Student profile not found for the logged-in user."
-        )
-    return student.id
-
 @router.get("/", response_model=List[schemas.StudentAssignmentItem])
 def get_student_assignments(
     status_filter: Optional[schemas.AssessmentStatusEnum] = Query(None, description="Filter by status: Upcoming, Completed, Pending"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=50),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_student)
 ):
     """
     Retrieves a list of assessments assigned to the logged-in student,
     optionally filtered by status.
     """
-    student_id = _get_student_id_from_user(current_user, db)
+    student_id = principal.entity_id
     now = datetime.utcnow()
 
-    # Find the student's current section ID
-    current_year = datetime.now().year
-    student_year_info = db.query(models.StudentYear.sectionId).filter(
-        models.StudentYear.studentId == student_id,
-        models.StudentYear.year == current_year
-    ).first()
+    # Find the student's current section ID (from the token claim when present)
+    current_section_id = principal.section_id
+    if current_section_id is None:
+        current_year = datetime.now().year
+        student_year_info = db.query(models.StudentYear.sectionId).filter(
+            models.StudentYear.studentId == student_id,
+            models.StudentYear.year == current_year
+        ).first()
 
-    if not student_year_info:
-        logger.info(f"Student {student_id} is not assigned to a section for the current year {current_year}.")
-        return [] # Return empty list if not assigned to a section
+        if not student_year_info:
+            logger.info(f"Student {student_id} is not assigned to a section for the current year {current_year}.")
+            return [] # Return empty list if not assigned to a section
 
-    current_section_id = student_year_info.sectionId
+        current_section_id = student_year_info.sectionId
 
     # Alias for StudentAssessmentScore to filter specifically for the current student's score
     ScoreAlias = aliased(models.StudentAssessmentScore)
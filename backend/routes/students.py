@@ -11,6 +11,7 @@ from backend import models, schemas, utils
 from backend.database import get_db
 from backend.dependencies import get_current_user # Keep authentication
 from backend.logger_utils import log_activity # <--- IMPORT log_activity
+from backend.password_pool import PasswordPoolBusyError
 from google.cloud import storage
 from dotenv import load_dotenv
 import logging # Import logging
@@ -215,7 +216,7 @@ async def create_student(
         raise HTTPException(status_code=400, detail="Email already registered.")
 
     # --- Database Operations ---
-    hashed_password = utils.hash_password(password)
+    hashed_password = await utils.hash_password_async(password)
     db_user = None
     db_student = None
     photo_path = None
@@ -494,7 +495,7 @@ async def update_student(
             db_user.email = email
             updated_fields.append("email")
         if password: # Only update password if provided
-            db_user.password_hash = utils.hash_password(password)
+            db_user.password_hash = await utils.hash_password_async(password)
             updated_fields.append("password")
         if is_active is not None and db_user.is_active != is_active:
             db_user.is_active = is_active
@@ -558,9 +559,9 @@ async def update_student(
             id=db_student.id, name=db_student.name, user=user_details, section=section_info, year=year
         )
 
-    except HTTPException as http_exc:
+    except (HTTPException, PasswordPoolBusyError):
         db.rollback()
-        raise http_exc
+        raise  # Busy pool: 503 from the app-wide handler
     except Exception as e:
         db.rollback()
         logger.error(f"Error updating student {student_id}: {e}", exc_info=True)
@@ -1,14 +1,15 @@
 # backend/routes/teacher_dashboard.py
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload, selectinload, aliased
-from sqlalchemy import func, case, cast, Date, Integer, distinct, desc, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload, aliased
+from sqlalchemy import func, case, cast, Date, Integer, distinct, desc, and_, select
 from typing import List, Optional, Dict, Set
 from datetime import datetime, timedelta
 
 from backend import models, schemas
-from backend.database import get_db
-from backend.dependencies import get_current_user
+from backend.database import get_async_db
+from backend.dependencies import Principal, get_current_teacher, get_current_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
@@ -17,37 +18,20 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)] # Apply auth to all endpoints here
 )
 
-# --- Helper: Check if Teacher ---
-def _get_teacher_id_from_user(current_user: models.User, db: Session) -> int:
-    """Gets the teacher ID associated with the logged-in user."""
-    if current_user.user_type != "Teacher":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access restricted to teachers."
-        )
-    teacher = db.query(models.Teacher.id).filter(models.Teacher.user_id == current_user.id).first()
-    if not teacher:
-        logger.error(f"No teacher profile found for user_id {current_user.id} ('{current_user.username}')")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Teacher profile not found for the logged-in user."
-        )
-    return teacher.id
-
 # --- Helper: Get Student IDs in a specific Section for the current year ---
-def _get_students_in_section(grade_id: int, section_id: int, db: Session) -> List[int]:
+async def _get_students_in_section(grade_id: int, section_id: int, db: AsyncSession) -> List[int]:
     """Returns a list of student IDs currently assigned to the given section/grade for the current year."""
     current_year = datetime.now().year # Or determine academic year differently
 
     # First check if grade and section are valid and related
-    section = db.query(models.Section.id).filter(
+    section = (await db.execute(select(models.Section.id).filter(
         models.Section.id == section_id,
         models.Section.grade_id == grade_id # Check relationship
-    ).first()
+    ))).first()
     if not section:
         # Provide more specific error messages
-        grade_exists = db.query(models.Grade.id).filter(models.Grade.id == grade_id).first()
-        section_exists = db.query(models.Section.id).filter(models.Section.id == section_id).first()
+        grade_exists = (await db.execute(select(models.Grade.id).filter(models.Grade.id == grade_id))).first()
+        section_exists = (await db.execute(select(models.Section.id).filter(models.Section.id == section_id))).first()
         if not grade_exists:
              raise HTTPException(status_code=404, detail=f"Grade with ID {grade_id} not found.")
         if not section_exists:
@@ -56,12 +40,12 @@ def _get_students_in_section(grade_id: int, section_id: int, db: Session) -> Lis
         raise HTTPException(status_code=404, detail=f"Section ID {section_id} does not belong to Grade ID {grade_id}.")
 
 
-    student_ids_query = db.query(models.StudentYear.studentId).filter(
+    student_ids_query = select(models.StudentYear.studentId).filter(
         models.StudentYear.sectionId == section_id,
         models.StudentYear.year == current_year
     ).distinct() # Ensure distinct student IDs
 
-    student_ids = [s_id[0] for s_id in student_ids_query.all()]
+    student_ids = [s_id[0] for s_id in (await db.execute(student_ids_query)).all()]
     logger.info(f"Found {len(student_ids)} students for Grade {grade_id}, Section {section_id}, Year {current_year}.")
     return student_ids
 
@@ -69,21 +53,20 @@ def _get_students_in_section(grade_id: int, section_id: int, db: Session) -> Lis
 # --- API Endpoints ---
 
 @router.get("/teaching-assignments", response_model=List[schemas.TeacherClassInfo])
-def get_teacher_assignments(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_teacher_assignments(
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_teacher)
 ):
     """
     Lists potential Grade/Section assignments for the teacher.
     WORKAROUND: Determines assignments based on Assessments created by the teacher's user ID.
     A dedicated linking table (teacher_sections) is highly recommended for accuracy.
     """
-    teacher_user_id = current_user.id # Use the user ID directly
-    _get_teacher_id_from_user(current_user, db) # Verify it's a teacher
+    teacher_user_id = principal.user.id # Use the user ID directly
 
     # Query based on Assessments created by the user
     # We find the distinct Grades/Sections associated with the Subjects of the Assessments they created
-    assignments_query = db.query(
+    assignments_query = select(
         distinct(models.Grade.id).label("grade_id"),
         models.Grade.name.label("grade_name"),
         models.Section.id.label("section_id"),
@@ -100,7 +83,7 @@ def get_teacher_assignments(
         models.Grade.name, models.Section.name
     ).distinct() # Apply distinct across all selected columns
 
-    results = assignments_query.all()
+    results = (await db.execute(assignments_query)).all()
 
     if not results:
          logger.warning(f"Could not determine teaching assignments for teacher user ID {teacher_user_id} based on created assessments.")
@@ -111,21 +94,20 @@ def get_teacher_assignments(
 
 
 @router.get("/student-profiles/{grade_id}/{section_id}", response_model=List[schemas.TeacherStudentProfileItem])
-def get_student_profiles_for_class(
+async def get_student_profiles_for_class(
     grade_id: int,
     section_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_teacher)
 ):
     """Gets the list of students in the specified class with their overall average score."""
-    _get_teacher_id_from_user(current_user, db) # Verify teacher access
-    student_ids = _get_students_in_section(grade_id, section_id, db)
+    student_ids = await _get_students_in_section(grade_id, section_id, db)
 
     if not student_ids:
         return [] # No students in this section for the current year
 
     # Fetch student details (name, username, photo)
-    students_info_query = db.query(
+    students_info_query = select(
         models.Student.id,
         models.Student.name,
         models.User.username,
@@ -134,7 +116,7 @@ def get_student_profiles_for_class(
         models.Student.id.in_(student_ids)
     ).order_by(models.Student.name) # Order students by name
 
-    students_info = students_info_query.all()
+    students_info = (await db.execute(students_info_query)).all()
 
     if not students_info:
         # This case should ideally not happen if student_ids were found
@@ -142,7 +124,7 @@ def get_student_profiles_for_class(
         return []
 
     # Fetch average scores for these students (across all their assessments)
-    avg_scores_query = db.query(
+    avg_scores_query = select(
         models.StudentAssessmentScore.student_id,
         func.avg(
             # Ensure division by zero is handled if max_score could be 0 (though schema prevents it)
@@ -158,7 +140,7 @@ def get_student_profiles_for_class(
         models.StudentAssessmentScore.student_id
     )
 
-    avg_scores = avg_scores_query.all()
+    avg_scores = (await db.execute(avg_scores_query)).all()
 
     # Create a dictionary for quick score lookup
     score_map = {score.student_id: round(score.avg_score_percent, 2) if score.avg_score_percent is not None else None for score in avg_scores} # Round scores
@@ -178,22 +160,21 @@ def get_student_profiles_for_class(
 
 
 @router.get("/class-performance-overview/{grade_id}/{section_id}", response_model=schemas.ClassPerformanceOverview)
-def get_class_performance_overview(
+async def get_class_performance_overview(
     grade_id: int,
     section_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_teacher)
 ):
     """Calculates the overall class average score."""
-    _get_teacher_id_from_user(current_user, db)
-    student_ids = _get_students_in_section(grade_id, section_id, db)
+    student_ids = await _get_students_in_section(grade_id, section_id, db)
 
     if not student_ids:
         logger.info(f"No students found for Grade {grade_id}, Section {section_id}. Returning empty performance overview.")
         return schemas.ClassPerformanceOverview(class_average_score=None)
 
     # Calculate the average score across all assessments taken by students in this section
-    class_avg_result = db.query(
+    class_avg_result = (await db.execute(select(
         func.avg(
             # --- CORRECTED case() SYNTAX ---
              case((models.StudentAssessmentScore.max_score > 0, (models.StudentAssessmentScore.score_achieved / models.StudentAssessmentScore.max_score) * 100), else_=0)
@@ -203,7 +184,7 @@ def get_class_performance_overview(
     ).filter(
         models.StudentAssessmentScore.student_id.in_(student_ids)
         # models.StudentAssessmentScore.max_score > 0 # Schema enforces gt=0
-    ).first()
+    ))).first()
 
     class_average = round(class_avg_result.class_avg, 2) if class_avg_result and class_avg_result.class_avg is not None else None
 
@@ -212,25 +193,24 @@ def get_class_performance_overview(
     )
 
 @router.get("/class-subject-performance/{grade_id}/{section_id}", response_model=List[schemas.ClassSubjectPerformanceItem])
-def get_class_subject_performance(
+async def get_class_subject_performance(
     grade_id: int,
     section_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_teacher)
 ):
     """Calculates the average score for each subject for the students in the specified class."""
-    _get_teacher_id_from_user(current_user, db)
-    student_ids = _get_students_in_section(grade_id, section_id, db)
+    student_ids = await _get_students_in_section(grade_id, section_id, db)
 
     if not student_ids:
         return []
 
     # Get subjects relevant to this grade
-    subjects_query = db.query(models.Subject.id, models.Subject.name).filter(
+    subjects_query = select(models.Subject.id, models.Subject.name).filter(
         models.Subject.grade_id == grade_id
     ).order_by(models.Subject.name) # Order subjects by name
 
-    subjects = subjects_query.all()
+    subjects = (await db.execute(subjects_query)).all()
 
     if not subjects:
         logger.warning(f"No subjects found for Grade ID {grade_id}.")
@@ -240,7 +220,7 @@ def get_class_subject_performance(
     subject_ids = list(subject_map.keys())
 
     # Calculate average score per subject for students in this section
-    subject_avg_scores_query = db.query(
+    subject_avg_scores_query = select(
         models.Assessment.subject_id,
         func.avg(
             # --- CORRECTED case() SYNTAX ---
@@ -258,7 +238,7 @@ def get_class_subject_performance(
         models.Assessment.subject_id
     )
 
-    subject_avg_scores = subject_avg_scores_query.all()
+    subject_avg_scores = (await db.execute(subject_avg_scores_query)).all()
 
     # Create a dictionary for quick score lookup
     subj_score_map = {score.subject_id: round(score.avg_subj_score_percent, 2) if score.avg_subj_score_percent is not None else None for score in subject_avg_scores} # Round scores
@@ -275,20 +255,19 @@ def get_class_subject_performance(
     return subject_performance
 
 @router.get("/lessons/{grade_id}", response_model=List[schemas.TeacherLessonItem])
-def get_lessons_for_grade(
+async def get_lessons_for_grade(
     grade_id: int,
     # section_id: Optional[int] = None, # Add if lessons become section-specific
     subject_id: Optional[int] = None, # Add filter by subject if needed
     term_id: Optional[int] = None, # Add filter by term if needed
     limit: int = Query(20, ge=1, le=100), # Limit results with validation
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_teacher)
 ):
     """Gets lessons associated with the subjects of a given grade, optionally filtered."""
-    _get_teacher_id_from_user(current_user, db)
 
     # Base query
-    lessons_query = db.query(
+    lessons_query = select(
         models.Lesson.id.label("lesson_id"),
         models.Lesson.name.label("lesson_name"),
         models.Subject.name.label("subject_name"),
@@ -309,13 +288,13 @@ def get_lessons_for_grade(
         lessons_query = lessons_query.filter(models.Lesson.term_id == term_id)
 
     # Apply ordering and limit
-    lessons = lessons_query.order_by(
+    lessons = (await db.execute(lessons_query.order_by(
         # models.Lesson.created_at.desc() # Order by creation date if available
         models.Term.year.desc(), # Order by term year/name first maybe?
         models.Term.name,
         models.Subject.name,
         models.Lesson.name
-    ).limit(limit).all()
+    ).limit(limit))).all()
 
     # Map results to schema
     return [schemas.TeacherLessonItem.from_orm(lesson) for lesson in lessons]
@@ -100,7 +100,7 @@ async def create_teacher(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
     # Hash the password
-    hashed_password = utils.hash_password(password)
+    hashed_password = await utils.hash_password_async(password)
 
      # Fetch grades to assign
     grade_ids_list = [int(id.strip()) for id in grade_ids.split(',') if id.strip()]
@@ -263,7 +263,7 @@ async def update_teacher(
 
     # Hash the password ONLY if provided
     if password:
-        hashed_password = utils.hash_password(password)
+        hashed_password = await utils.hash_password_async(password)
         db_user.password_hash = hashed_password
 
     # Update other user fields
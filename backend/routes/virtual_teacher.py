@@ -0,0 +1,72 @@
+# backend/routes/virtual_teacher.py
+import logging
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from backend import models, schemas
+from backend.dependencies import get_current_user
+from backend.sse import sse_event, sse_response
+
+# ai.py needs PROJECT_ID/LOCATION and Vertex AI; the endpoints report 503 without it
+try:
+    from backend import ai
+except Exception as e:
+    ai = None
+    logging.getLogger(__name__).warning(f"Virtual teacher unavailable: {e}")
+
+router = APIRouter(
+    prefix="/virtual-teacher",
+    tags=["Virtual Teacher"]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _require_ai():
+    if ai is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service is not available or configured correctly."
+        )
+
+
+async def _stream_events(chunks: AsyncIterator[str], action: str) -> AsyncIterator[str]:
+    """Relays answer chunks as `token` events, ending with `done` (or `error` if the model fails)."""
+    try:
+        async for text in chunks:
+            yield sse_event("token", {"text": text})
+        yield sse_event("done", {})
+    except Exception as e:
+        logger.error(f"Streaming failed for action '{action}': {e}", exc_info=True)
+        yield sse_event("error", {"detail": "The AI service failed while generating the answer."})
+    finally:
+        await chunks.aclose()  # Client disconnects close the model stream too
+
+
+@router.post("/ask/stream")
+async def stream_ask_question(
+    request_body: schemas.VirtualTeacherQuestionRequest,
+    current_user: models.User = Depends(get_current_user),
+):
+    """Answers a question about the given lesson files, streamed as server-sent events."""
+    _require_ai()
+    chunks = ai.ask_question_stream(
+        str(current_user.id), request_body.session_id, request_body.question, request_body.files
+    )
+    return sse_response(_stream_events(chunks, "ask_question"))
+
+
+@router.post("/teacher-notes/stream")
+async def stream_teacher_notes(
+    request_body: schemas.TeacherNotesRequest,
+    current_user: models.User = Depends(get_current_user),
+):
+    """Generates teacher notes for the given lesson files, streamed as server-sent events."""
+    if current_user.user_type not in ["Teacher", "Admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only Teachers or Admins can generate teacher notes.")
+    _require_ai()
+    chunks = ai.generate_teacher_notes_stream(
+        str(current_user.id), request_body.session_id, request_body.user_prompt, request_body.files
+    )
+    return sse_response(_stream_events(chunks, "generate_teacher_notes"))
@@ -40,6 +40,9 @@ class UserLogin(BaseModel):
 
 class TokenData(BaseModel):
     username: Union[str, None] = None
+    user_type: Optional[str] = None
+    entity_id: Optional[int] = None
+    section_id: Optional[int] = None
 
 class UserInfo(BaseModel):
     user_id: int
@@ -326,6 +329,8 @@ class GeneratedQuestion(BaseModel):
 class GenerateAssignmentResponse(BaseModel):
     generated_questions: List[GeneratedQuestion]
     raw_llm_output: Optional[str] = None
+    # Question type -> how many fewer questions than the format asks for (e.g. repeats that couldn't be replaced)
+    missing_question_counts: Dict[str, int] = Field(default_factory=dict)
 
 class ModifyAssignmentResponse(GenerateAssignmentResponse):
     pass
@@ -812,6 +817,8 @@ class LLMTokenUsageBase(BaseModel):
     input_tokens: int
     output_tokens: int
     total_tokens: int
+    latency_ms: Optional[int] = None
+    finish_reason: Optional[str] = None
 
 class LLMTokenUsageCreate(BaseModel):
     session_id: Optional[str] = None
@@ -820,12 +827,70 @@ class LLMTokenUsageCreate(BaseModel):
     input_tokens: int
     output_tokens: int
     total_tokens: int
+    latency_ms: Optional[int] = None
+    finish_reason: Optional[str] = None
 
 class LLMTokenUsageInfo(LLMTokenUsageBase):
     id: int
     timestamp: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class LLMUsageGroupByEnum(str, Enum):
+    hour = "hour"
+    day = "day"
+    user = "user"
+    action = "action"
+    model = "model"
+
+class LLMUsageSummaryItem(BaseModel):
+    key: str # Hour/day (ISO format), user ID, action or model name depending on group_by
+    username: Optional[str] = None # Only set when grouping by user
+    request_count: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    avg_latency_ms: Optional[float] = None
+
+
+# --- Virtual Teacher Schemas ---
+class VirtualTeacherQuestionRequest(BaseModel):
+    session_id: str = Field(..., min_length=1)
+    question: str = Field(..., min_length=1)
+    files: List[Dict[str, str]] = [] # [{gs_uri: mime_type}, ...]
+
+class TeacherNotesRequest(BaseModel):
+    session_id: str = Field(..., min_length=1)
+    user_prompt: str = Field(..., min_length=1)
+    files: List[Dict[str, str]] = [] # [{gs_uri: mime_type}, ...]
+
+
+# --- Generation Job Schemas ---
+class JobStatusEnum(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: JobStatusEnum
+    status_url: str
+    events_url: str
+
+class JobInfo(BaseModel):
+    id: str
+    kind: str
+    status: JobStatusEnum
+    progress: int
+    progress_message: Optional[str] = None
+    result: Optional[Any] = None # Set once succeeded; same shape as the endpoint's inline response
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
 
 # --- Forward Reference Resolution / Model Rebuild (Pydantic v2) ---
 StudentDetails.model_rebuild()
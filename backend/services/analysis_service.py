@@ -2,30 +2,19 @@
 import os
 import logging
 import json
+import time
+import asyncio
 from fastapi import HTTPException, status
 from pydantic import ValidationError
+from datetime import datetime
 from typing import Optional # Added for Optional type hint
-import uuid # Added for session_id generation
-
-from backend import schemas # Import schemas for validation and enums
-from backend.database import SessionLocal # Added for DB session
-from backend.models import LLMTokenUsage # Added for DB model
-
-# --- Vertex AI Imports ---
-try:
-    import google.cloud.aiplatform as aiplatform
-    from google.cloud.aiplatform.gapic.schema import predict
-    from google.protobuf import json_format
-    from google.protobuf.struct_pb2 import Value
-    from vertexai.generative_models import GenerativeModel, Part, FinishReason
-    import vertexai
-except ImportError:
-    aiplatform = None
-    GenerativeModel = None
-    Part = None
-    vertexai = None
-    FinishReason = None
-    logging.getLogger(__name__).warning("google-cloud-aiplatform or vertexai library not installed. AI service features will be disabled.")
+
+from backend import models, schemas # Import schemas for validation and enums
+from backend.gcs_cache import content_keys
+from backend.llm_backend import get_llm_backend
+from backend.llm_resilience import llm_resilience
+from backend.services.llm_response_cache import llm_response_cache, response_cache_key
+from backend.services.llm_usage_recorder import finish_reason_name, record_llm_usage
 
 logger = logging.getLogger(__name__)
 
@@ -33,26 +22,61 @@ logger = logging.getLogger(__name__)
 GCP_PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("PROJECT_ID"))
 GCP_LOCATION = os.getenv("VERTEX_AI_LOCATION", os.getenv("LOCATION", "us-central1"))
 GEMINI_MODEL_NAME = os.getenv("VERTEX_AI_MODEL", "gemini-1.5-flash-001")
+# Bump when the analysis prompt changes so cached responses for the old prompt stop matching
+ANALYSIS_PROMPT_VERSION = "1"
+ANALYSIS_CACHE_ACTION = "analyze_pdf_for_questions"
+
+# --- Model Backend ---
+# Vertex AI unless LLM_BACKEND=fake; the backend initializes Vertex AI when a model is first built
+
 
-# --- Vertex AI Initialization ---
-vertexai_initialized = False
-if aiplatform and vertexai and GCP_PROJECT_ID and GCP_LOCATION:
+async def _analysis_cache_key(gs_url: str) -> Optional[str]:
+    """Response-cache key for analyzing a PDF, or None if its content can't be hashed."""
     try:
-        # Ensure credentials are set before initializing
-        vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
-        vertexai_initialized = True
-        logger.info(f"Vertex AI initialized for project '{GCP_PROJECT_ID}' in location '{GCP_LOCATION}'. (Analysis Service)")
+        file_hashes = await asyncio.to_thread(content_keys, [gs_url])
     except Exception as e:
-        logger.error(f"Failed to initialize Vertex AI: {e}", exc_info=True)
-else:
-    logger.warning("Vertex AI not initialized due to missing configuration or libraries. (Analysis Service)")
+        logger.warning(f"Could not hash {gs_url} for the response cache; skipping cache: {e}")
+        return None
+    if file_hashes is None:
+        return None
+    return response_cache_key(GEMINI_MODEL_NAME, ANALYSIS_PROMPT_VERSION, {}, file_hashes)
+
+
+# --- Stored Sample Analyses ---
+def get_stored_analysis(db, assignment_sample_id: int, content_hash: Optional[str]) -> Optional[schemas.QuestionAnalysisResponse]:
+    """The sample's saved analysis if it was made from this exact file with the current prompt and model."""
+    if not content_hash:
+        return None
+    stored = db.get(models.AssignmentSampleAnalysis, assignment_sample_id)
+    if (stored is None or stored.content_hash != content_hash
+            or stored.prompt_version != ANALYSIS_PROMPT_VERSION or stored.model_name != GEMINI_MODEL_NAME):
+        return None
+    return schemas.QuestionAnalysisResponse.model_validate(stored.result)
+
+
+def store_analysis(db, assignment_sample_id: int, content_hash: Optional[str],
+                   analysis: schemas.QuestionAnalysisResponse) -> None:
+    """Saves (or replaces) a sample's analysis against the content hash of the file it was made from."""
+    if not content_hash:
+        return
+    stored = db.get(models.AssignmentSampleAnalysis, assignment_sample_id)
+    if stored is None:
+        stored = models.AssignmentSampleAnalysis(assignment_sample_id=assignment_sample_id)
+        db.add(stored)
+    stored.content_hash = content_hash
+    stored.prompt_version = ANALYSIS_PROMPT_VERSION
+    stored.model_name = GEMINI_MODEL_NAME
+    stored.result = analysis.model_dump(mode="json")
+    stored.analyzed_at = datetime.utcnow()
+    db.commit()
 
 
 async def analyze_pdf_for_questions(
     gs_url: str, 
     user_id: int, 
     action: str, 
-    session_id: Optional[str] = None
+    session_id: Optional[str] = None,
+    no_cache: bool = False,
 ) -> schemas.QuestionAnalysisResponse:
     """
     Analyzes a PDF from a GS URL using Gemini to identify question types and counts,
@@ -60,6 +84,7 @@ async def analyze_pdf_for_questions(
 
     Args:
         gs_url: The gs:// URI of the PDF file.
+        no_cache: Skip the response cache lookup (the fresh result is still cached).
 
     Returns:
         A validated QuestionAnalysisResponse object.
@@ -68,7 +93,8 @@ async def analyze_pdf_for_questions(
         HTTPException: If AI service is unavailable, analysis fails, or response is invalid.
     """
     # --- Check if Vertex AI is available within the function call ---
-    if not vertexai_initialized or not GenerativeModel or not Part:
+    llm = get_llm_backend()
+    if not llm.is_configured(GCP_PROJECT_ID, GCP_LOCATION):
         logger.error("analyze_pdf_for_questions called but Vertex AI is not initialized.")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -80,6 +106,16 @@ async def analyze_pdf_for_questions(
 
     logger.info(f"Starting AI analysis for GS URL: {gs_url}")
 
+    # --- Response Cache ---
+    cache_key = await _analysis_cache_key(gs_url)
+    if cache_key and no_cache:
+        llm_response_cache.record_bypass(ANALYSIS_CACHE_ACTION)
+    elif cache_key:
+        cached_json = await asyncio.to_thread(llm_response_cache.get, cache_key, ANALYSIS_CACHE_ACTION)
+        if cached_json is not None:
+            logger.info(f"Serving analysis for {gs_url} from the response cache.")
+            return schemas.QuestionAnalysisResponse.model_validate_json(cached_json)
+
     # --- Prepare and Execute Gemini Request ---
     try:
         # Define the prompt (same as before)
@@ -99,61 +135,41 @@ If no questions of a specific allowed type are found, omit it from the list or s
 Ensure the output is valid JSON.
 """
         # Create the Part object for the PDF
-        pdf_part = Part.from_uri(
-            mime_type="application/pdf",
-            uri=gs_url
-        )
+        pdf_part = llm.uri_part(gs_url, "application/pdf")
 
         # Initialize the Gemini model
-        model = GenerativeModel(GEMINI_MODEL_NAME)
+        model = llm.get_model(GCP_PROJECT_ID, GCP_LOCATION, GEMINI_MODEL_NAME)
 
         # Generate content
         logger.debug(f"Sending request to Gemini model: {GEMINI_MODEL_NAME}")
-        response = await model.generate_content_async([prompt, pdf_part])
+        started = time.perf_counter()
+
+        async def attempt():
+            nonlocal started
+            started = time.perf_counter()
+            return await model.generate_content_async([prompt, pdf_part])
+
+        # Each attempt holds a scheduler slot; retried on transient errors and, being stateless, may be hedged
+        response = await llm_resilience.call_async(action, attempt, hedge=True, model_name=GEMINI_MODEL_NAME, user_id=user_id)
         logger.debug(f"Received response from Gemini. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'NO_CANDIDATES'}")
 
         # --- Log Token Usage ---
-        logger.debug(f"Attempting to log LLM token usage for action: {action}, user_id: {user_id}, session_id: {session_id if session_id else 'N/A'}")
-        db_log_session = None
+        logger.debug(f"Queueing LLM token usage for action: {action}, user_id: {user_id}, session_id: {session_id if session_id else 'N/A'}")
         try:
-            if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                prompt_tokens = response.usage_metadata.prompt_token_count
-                candidate_tokens = response.usage_metadata.candidates_token_count
-                total_tokens = prompt_tokens + candidate_tokens
-                
-                final_session_id = session_id if session_id else str(uuid.uuid4())
-                model_name_to_log = GEMINI_MODEL_NAME
-
-                token_entry = LLMTokenUsage(
-                    user_id=user_id,
-                    session_id=final_session_id,
-                    action=action,
-                    model_name=model_name_to_log,
-                    input_tokens=prompt_tokens,
-                    output_tokens=candidate_tokens,
-                    total_tokens=total_tokens
-                    # timestamp will be handled by server_default
-                )
-                db_log_session = SessionLocal()
-                db_log_session.add(token_entry)
-                db_log_session.commit()
-                logger.debug(f"Successfully committed LLM token usage for action: {action}, user_id: {user_id}, session_id: {final_session_id}")
-                logger.info(f"LLM token usage logged for action: {action}, user_id: {user_id}, session_id: {final_session_id}")
-            else:
-                logger.warning(f"LLM usage_metadata not available for action: {action}, user_id: {user_id}. Skipping token logging.")
+            record_llm_usage(
+                response,
+                user_id=user_id,
+                action=action,
+                model_name=GEMINI_MODEL_NAME,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                session_id=session_id,
+            )
         except Exception as log_exc:
             logger.error(f"Failed to log LLM token usage for action: {action}, user_id: {user_id}: {log_exc}")
-            if db_log_session:
-                db_log_session.rollback()
-        finally:
-            if db_log_session:
-                db_log_session.close()
         # --- End Log Token Usage ---
 
-        if not response.candidates or response.candidates[0].finish_reason != FinishReason.STOP:
-             finish_reason_val = response.candidates[0].finish_reason if response.candidates else "UNKNOWN"
-             # Convert FinishReason enum to string if it's not already
-             finish_reason_str = finish_reason_val.name if hasattr(finish_reason_val, 'name') else str(finish_reason_val)
+        if finish_reason_name(response) != "STOP":
+             finish_reason_str = finish_reason_name(response) or "UNKNOWN"
              logger.error(f"Gemini generation stopped unexpectedly. Reason: {finish_reason_str}")
              raise HTTPException(status_code=500, detail=f"AI analysis failed. Reason: {finish_reason_str}")
 
@@ -179,6 +195,10 @@ Ensure the output is valid JSON.
         try:
             validated_response = schemas.QuestionAnalysisResponse(**analysis_data)
             logger.info(f"Successfully analyzed and validated response for {gs_url}")
+            if cache_key:
+                await asyncio.to_thread(
+                    llm_response_cache.put, cache_key, ANALYSIS_CACHE_ACTION, validated_response.model_dump_json()
+                )
             return validated_response
         except ValidationError as val_err:
             logger.error(f"Gemini response failed Pydantic validation: {val_err}\nParsed data: {analysis_data}")
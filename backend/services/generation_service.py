@@ -2,13 +2,19 @@
 import os
 import logging
 import json
+import time
+import asyncio
+import re
 from fastapi import HTTPException, status
 from pydantic import ValidationError
 # --- Added Imports ---
-from typing import List, Dict, Any, Optional
-import uuid
-from backend.database import SessionLocal
-from backend.models import LLMTokenUsage
+from typing import List, Dict, Any, Optional, Tuple
+from backend.gcs_cache import content_keys
+from backend.llm_backend import get_llm_backend
+from backend.llm_resilience import llm_resilience
+from backend.llm_scheduler import llm_scheduler
+from backend.services.llm_response_cache import llm_response_cache, response_cache_key
+from backend.services.llm_usage_recorder import finish_reason_name, record_llm_usage
 # --- End Added Imports ---
 
 # Import models and schemas using relative path if they are in the parent directory
@@ -19,38 +25,23 @@ except ImportError:
     from backend import models, schemas
 
 
-# --- Vertex AI Imports ---
-try:
-    import google.cloud.aiplatform as aiplatform
-    from vertexai.generative_models import GenerativeModel, Part, FinishReason, GenerationConfig
-    import vertexai
-except ImportError:
-    aiplatform = None
-    GenerativeModel = None
-    Part = None
-    vertexai = None
-    FinishReason = None
-    GenerationConfig = None
-    logging.getLogger(__name__).warning("google-cloud-aiplatform or vertexai library not installed. AI service features will be disabled.")
-
 logger = logging.getLogger(__name__)
 
 # --- Vertex AI Configuration ---
 GCP_PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("PROJECT_ID"))
 GCP_LOCATION = os.getenv("VERTEX_AI_LOCATION", os.getenv("LOCATION", "us-central1"))
 GEMINI_MODEL_NAME = os.getenv("VERTEX_AI_MODEL", "gemini-1.5-flash-001")
+# Bump when the generation prompt changes so cached responses for the old prompt stop matching
+GENERATION_PROMPT_VERSION = "1"
+GENERATION_CACHE_ACTION = "generate_assignment_questions"
+# Fan-out: large formats are split by question type (and into chunks of at most
+# GENERATION_FANOUT_CHUNK_SIZE questions) and the chunks are generated concurrently
+GENERATION_FANOUT_ENABLED = os.getenv("GENERATION_FANOUT_ENABLED", "true").lower() == "true"
+GENERATION_FANOUT_MIN_QUESTIONS = int(os.getenv("GENERATION_FANOUT_MIN_QUESTIONS", "15"))  # Smaller formats use one request
+GENERATION_FANOUT_CHUNK_SIZE = int(os.getenv("GENERATION_FANOUT_CHUNK_SIZE", "10"))
 
-# --- Vertex AI Initialization ---
-vertexai_initialized = False
-if aiplatform and vertexai and GCP_PROJECT_ID and GCP_LOCATION:
-    try:
-        vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
-        vertexai_initialized = True
-        logger.info(f"Vertex AI initialized for project '{GCP_PROJECT_ID}' in location '{GCP_LOCATION}'. (Generation Service)")
-    except Exception as e:
-        logger.error(f"Failed to initialize Vertex AI: {e}", exc_info=True)
-else:
-    logger.warning("Vertex AI not initialized due to missing configuration or libraries. (Generation Service)")
+# --- Model Backend ---
+# Vertex AI unless LLM_BACKEND=fake; the backend initializes Vertex AI when a model is first built
 
 
 # --- Helper to clean Gemini JSON output ---
@@ -66,41 +57,78 @@ def _clean_gemini_json_output(raw_text: str) -> str:
     return text.strip()
 
 
-async def generate_assignment_questions(
-    assignment_format: models.AssignmentFormat,
-    lesson_gs_urls: List[str],
-    user_id: int, # Added user_id
-    action: str,  # Added action
-    session_id: Optional[str] = None # Added optional session_id
-) -> schemas.GenerateAssignmentResponse:
-    """
-    Generates assignment questions based on a format and lesson content using Gemini.
-    Also logs LLM token usage.
-    """
-    if not vertexai_initialized or not GenerativeModel or not Part or not GenerationConfig:
-        logger.error("generate_assignment_questions called but Vertex AI is not initialized/available.")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="AI generation service is not available or configured correctly."
+async def _lesson_file_hashes(lesson_gs_urls: List[str]) -> Optional[List[str]]:
+    """Content keys of the lesson PDFs, or None if they can't be hashed (no response caching then)."""
+    try:
+        return await asyncio.to_thread(content_keys, lesson_gs_urls)
+    except Exception as e:
+        logger.warning(f"Could not hash lesson content for the response cache; skipping cache: {e}")
+        return None
+
+
+def _generation_cache_key(format_name: str, questions: List[Tuple[str, int]], file_hashes: Optional[List[str]],
+                          part: Optional[Tuple[int, int]] = None) -> Optional[str]:
+    """Response-cache key for one generation request (the whole format, or one fan-out chunk)."""
+    if file_hashes is None:
+        return None
+    params = {
+        "format_name": format_name,
+        "questions": sorted([question_type, count] for question_type, count in questions),
+        "response_mime_type": "application/json",
+    }
+    if part is not None:
+        params["part"] = list(part)
+    return response_cache_key(GEMINI_MODEL_NAME, GENERATION_PROMPT_VERSION, params, file_hashes)
+
+
+def _parse_generated_questions(raw_response_text: str, format_id: int) -> schemas.GenerateAssignmentResponse:
+    """Parses and validates Gemini's JSON output into a GenerateAssignmentResponse."""
+    cleaned_response_text = _clean_gemini_json_output(raw_response_text)
+
+    try:
+        generated_data = json.loads(cleaned_response_text)
+        if "generated_questions" not in generated_data or not isinstance(generated_data["generated_questions"], list):
+             raise ValueError("LLM Response missing 'generated_questions' list.")
+
+        validated_questions: List[schemas.GeneratedQuestion] = []
+        for i, q_data in enumerate(generated_data["generated_questions"]):
+            try:
+                if "question_number" not in q_data or q_data["question_number"] is None:
+                     q_data["question_number"] = i + 1
+                # Ensure optional fields that are empty strings become None
+                if "explanation" in q_data and q_data["explanation"] == "": q_data["explanation"] = None
+                if "reference_section" in q_data and q_data["reference_section"] == "": q_data["reference_section"] = None
+                if "image_svg" in q_data and q_data["image_svg"] == "": q_data["image_svg"] = None
+                validated_questions.append(schemas.GeneratedQuestion(**q_data))
+            except ValidationError as item_val_err:
+                 logger.warning(f"Validation failed for generated question item {i}: {item_val_err}. Data: {q_data}")
+                 continue
+        if not validated_questions and generated_data["generated_questions"]:
+            raise ValueError("No valid questions remained after validation of the AI model's output.")
+
+        validated_response = schemas.GenerateAssignmentResponse(
+            generated_questions=validated_questions,
+            raw_llm_output=raw_response_text
         )
+        logger.info(f"Successfully generated and validated questions for format {format_id}.")
+        return validated_response
 
-    if not lesson_gs_urls:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No lesson content URLs provided for generation.")
+    except (json.JSONDecodeError, ValueError, ValidationError) as val_err:
+        logger.error(f"Failed to parse or validate Gemini JSON response: {val_err}\nCleaned response: {cleaned_response_text}\nRaw response: {raw_response_text}")
+        raise HTTPException(status_code=500, detail="AI generation service returned invalid or unexpected data format.")
 
-    # --- Construct Prompt ---
-    if not assignment_format.questions:
-         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                             detail=f"Assignment Format '{assignment_format.name}' (ID: {assignment_format.id}) has no question definitions.")
 
-    question_details = "\n".join([f"- {q.count} questions of type '{q.question_type}'" for q in assignment_format.questions])
+def _generation_prompt(format_name: str, questions: List[Tuple[str, int]], lesson_gs_urls: List[str],
+                       part_note: str = "") -> str:
+    question_details = "\n".join([f"- {count} questions of type '{question_type}'" for question_type, count in questions])
     allowed_types_str = ', '.join([qt.value for qt in schemas.QuestionTypeEnum])
-    prompt = f"""
+    return f"""
 Generate a set of assignment questions based on the content of the provided PDF documents and the specified format.
 
-Assignment Format Name: {assignment_format.name}
+Assignment Format Name: {format_name}
 Required Question Structure:
 {question_details}
-
+{part_note}
 Instructions:
 1. Analyze the content of the following PDF document(s).
 2. Generate exactly the specified number of questions for each question type listed in the format.
@@ -122,109 +150,252 @@ PDF Content Files:
 {', '.join(lesson_gs_urls)}
 """
 
-    # --- Prepare Content Parts ---
-    content_parts = [prompt]
-    for gs_url in lesson_gs_urls:
-        try:
-            content_parts.append(Part.from_uri(mime_type="application/pdf", uri=gs_url))
-        except Exception as e:
-             logger.error(f"Failed to create Part from URI {gs_url}: {e}", exc_info=True)
-             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not process lesson content URL: {gs_url}")
+
+def fanout_chunks(questions: List[Tuple[str, int]], chunk_size: int) -> List[Tuple[str, int, int, int]]:
+    """
+    Splits a format into (question_type, count, part, parts) requests: one per type, with
+    types over chunk_size divided into near-equal parts so no single request dominates.
+    """
+    chunks = []
+    for question_type, count in questions:
+        if count <= 0:
+            continue
+        parts = -(-count // max(chunk_size, 1))
+        base, extra = divmod(count, parts)
+        for index in range(parts):
+            chunks.append((question_type, base + (1 if index < extra else 0), index + 1, parts))
+    return chunks
+
+
+def _question_fingerprint(question: schemas.GeneratedQuestion) -> Tuple[str, str]:
+    text = re.sub(r"[^a-z0-9 ]", "", " ".join(question.question_text.lower().split()))
+    return str(question.question_type), text
+
+
+def merge_generated_chunks(
+    chunk_results: List[Tuple[Tuple[str, int, int, int], schemas.GenerateAssignmentResponse]],
+    top_ups: Optional[List[Tuple[str, schemas.GenerateAssignmentResponse]]] = None,
+) -> schemas.GenerateAssignmentResponse:
+    """
+    Concatenates chunk results in format order, capping each at its requested count, dropping
+    repeats and renumbering. `top_ups` are (question_type, result) re-requests for types that
+    came up short; they fill the gap at the end of that type. Whatever is still missing is
+    reported in missing_question_counts.
+    """
+    by_type: Dict[str, List[schemas.GeneratedQuestion]] = {}
+    missing: Dict[str, int] = {}
+    seen = set()
+
+    def take(question_type: str, questions: List[schemas.GeneratedQuestion], count: int) -> int:
+        kept = 0
+        for question in questions:
+            if kept == count:
+                break
+            fingerprint = _question_fingerprint(question)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            by_type[question_type].append(question)
+            kept += 1
+        return kept
+
+    top_ups = top_ups or []
+    for (question_type, count, part, parts), result in chunk_results:
+        by_type.setdefault(question_type, [])
+        kept = take(question_type, result.generated_questions, count)
+        if kept < count:
+            missing[question_type] = missing.get(question_type, 0) + count - kept
+    for question_type, result in top_ups:
+        if missing.get(question_type):
+            missing[question_type] -= take(question_type, result.generated_questions, missing[question_type])
+    missing = {question_type: count for question_type, count in missing.items() if count}
+
+    merged = [question for questions in by_type.values() for question in questions]
+    for number, question in enumerate(merged, start=1):
+        question.question_number = number
+    results = [result for _, result in chunk_results] + [result for _, result in top_ups]
+    raw_outputs = [result.raw_llm_output for result in results if result.raw_llm_output]
+    return schemas.GenerateAssignmentResponse(
+        generated_questions=merged, raw_llm_output="\n".join(raw_outputs) or None, missing_question_counts=missing,
+    )
+
+
+async def _run_generation(
+    llm: Any,
+    content_parts: List[Any],
+    cache_key: Optional[str],
+    no_cache: bool,
+    format_id: int,
+    user_id: int,
+    action: str,
+    session_id: Optional[str],
+) -> schemas.GenerateAssignmentResponse:
+    """One generation request: response-cache lookup, Gemini call, usage logging, validation and cache fill."""
+    # --- Response Cache ---
+    if cache_key and no_cache:
+        llm_response_cache.record_bypass(GENERATION_CACHE_ACTION)
+    elif cache_key:
+        cached_text = await asyncio.to_thread(llm_response_cache.get, cache_key, GENERATION_CACHE_ACTION)
+        if cached_text is not None:
+            logger.info(f"Serving generated questions for format {format_id} from the response cache.")
+            return _parse_generated_questions(cached_text, format_id)
 
     # --- Call Gemini ---
     try:
-        model = GenerativeModel(GEMINI_MODEL_NAME)
-        generation_config = GenerationConfig(response_mime_type="application/json")
+        model = llm.get_model(GCP_PROJECT_ID, GCP_LOCATION, GEMINI_MODEL_NAME)
+        generation_config = llm.json_generation_config()
 
         logger.debug(f"Sending generation request to Gemini model: {GEMINI_MODEL_NAME}")
-        response = await model.generate_content_async(
-            content_parts,
-            generation_config=generation_config
-        )
+        started = time.perf_counter()
+
+        async def attempt():
+            nonlocal started
+            started = time.perf_counter()
+            return await model.generate_content_async(
+                content_parts,
+                generation_config=generation_config
+            )
+
+        # Each attempt holds a scheduler slot; retried on transient errors and, being stateless, may be hedged
+        response = await llm_resilience.call_async(action, attempt, hedge=True, model_name=GEMINI_MODEL_NAME, user_id=user_id)
         logger.debug(f"Received response from Gemini. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'NO_CANDIDATES'}")
 
         # --- Log Token Usage ---
-        db_log_session = None
         try:
-            if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                prompt_tokens = response.usage_metadata.prompt_token_count
-                candidate_tokens = response.usage_metadata.candidates_token_count
-                total_tokens = prompt_tokens + candidate_tokens
-
-                final_session_id = session_id if session_id else str(uuid.uuid4())
-                model_name_to_log = GEMINI_MODEL_NAME
-
-                token_entry = LLMTokenUsage(
-                    user_id=user_id,
-                    session_id=final_session_id,
-                    action=action,
-                    model_name=model_name_to_log,
-                    input_tokens=prompt_tokens,
-                    output_tokens=candidate_tokens,
-                    total_tokens=total_tokens
-                )
-                db_log_session = SessionLocal()
-                db_log_session.add(token_entry)
-                db_log_session.commit()
-                logger.info(f"LLM token usage logged for action: {action}, user_id: {user_id}, session_id: {final_session_id}, format_id: {assignment_format.id}")
-            else:
-                logger.warning(f"LLM usage_metadata not available for action: {action}, user_id: {user_id}, format_id: {assignment_format.id}. Skipping token logging.")
+            record_llm_usage(
+                response,
+                user_id=user_id,
+                action=action,
+                model_name=GEMINI_MODEL_NAME,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                session_id=session_id,
+            )
         except Exception as log_exc:
-            logger.error(f"Failed to log LLM token usage for action: {action}, user_id: {user_id}, format_id: {assignment_format.id}: {log_exc}")
-            if db_log_session:
-                db_log_session.rollback()
-        finally:
-            if db_log_session:
-                db_log_session.close()
+            logger.error(f"Failed to log LLM token usage for action: {action}, user_id: {user_id}, format_id: {format_id}: {log_exc}")
         # --- End Log Token Usage ---
 
-        if not response.candidates or response.candidates[0].finish_reason != FinishReason.STOP:
-            finish_reason_val = response.candidates[0].finish_reason if response.candidates else "UNKNOWN"
-            finish_reason_str = finish_reason_val.name if hasattr(finish_reason_val, 'name') else str(finish_reason_val)
+        if finish_reason_name(response) != "STOP":
+            finish_reason_str = finish_reason_name(response) or "UNKNOWN"
             logger.error(f"Gemini generation stopped unexpectedly. Reason: {finish_reason_str}")
             raise HTTPException(status_code=500, detail=f"AI generation failed. Reason: {finish_reason_str}")
 
         # --- Process and Validate Response ---
         raw_response_text = response.text
         logger.debug(f"Gemini raw response text: {raw_response_text}")
+        validated_response = _parse_generated_questions(raw_response_text, format_id)
+        if cache_key:
+            await asyncio.to_thread(llm_response_cache.put, cache_key, GENERATION_CACHE_ACTION, raw_response_text)
+        return validated_response
 
-        cleaned_response_text = _clean_gemini_json_output(raw_response_text)
+    except HTTPException:
+        raise  # Already a client-facing error (finish reason, parse failure, busy/deadline)
+    except Exception as e:
+        logger.error(f"Error during Gemini generation for format {format_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred during AI generation: {str(e)}")
 
-        try:
-            generated_data = json.loads(cleaned_response_text)
-            if "generated_questions" not in generated_data or not isinstance(generated_data["generated_questions"], list):
-                 raise ValueError("LLM Response missing 'generated_questions' list.")
 
-            validated_questions: List[schemas.GeneratedQuestion] = []
-            for i, q_data in enumerate(generated_data["generated_questions"]):
-                try:
-                    if "question_number" not in q_data or q_data["question_number"] is None:
-                         q_data["question_number"] = i + 1
-                    # Ensure optional fields that are empty strings become None
-                    if "explanation" in q_data and q_data["explanation"] == "": q_data["explanation"] = None
-                    if "reference_section" in q_data and q_data["reference_section"] == "": q_data["reference_section"] = None
-                    if "image_svg" in q_data and q_data["image_svg"] == "": q_data["image_svg"] = None
-                    validated_questions.append(schemas.GeneratedQuestion(**q_data))
-                except ValidationError as item_val_err:
-                     logger.warning(f"Validation failed for generated question item {i}: {item_val_err}. Data: {q_data}")
-                     continue
-            if not validated_questions and generated_data["generated_questions"]:
-                raise ValueError("No valid questions remained after validation of the AI model's output.")
+async def generate_assignment_questions(
+    assignment_format: models.AssignmentFormat,
+    lesson_gs_urls: List[str],
+    user_id: int, # Added user_id
+    action: str,  # Added action
+    session_id: Optional[str] = None, # Added optional session_id
+    no_cache: bool = False,
+    fan_out: Optional[bool] = None,
+) -> schemas.GenerateAssignmentResponse:
+    """
+    Generates assignment questions based on a format and lesson content using Gemini.
+    Also logs LLM token usage. Identical requests (same format and lesson content) are
+    served from the response cache unless no_cache is set; a bypass still refreshes it.
+    With fan_out (default: GENERATION_FANOUT_ENABLED for formats of at least
+    GENERATION_FANOUT_MIN_QUESTIONS questions) each question type is generated by its own
+    concurrent request and the results are merged, deduplicated and renumbered. Questions
+    dropped as repeats are re-requested once; any that are still missing are listed in the
+    response's missing_question_counts.
+    """
+    llm = get_llm_backend()
+    if not llm.is_configured(GCP_PROJECT_ID, GCP_LOCATION):
+        logger.error("generate_assignment_questions called but Vertex AI is not initialized/available.")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI generation service is not available or configured correctly."
+        )
 
-            validated_response = schemas.GenerateAssignmentResponse(
-                generated_questions=validated_questions,
-                raw_llm_output=raw_response_text
-            )
-            logger.info(f"Successfully generated and validated questions for format {assignment_format.id}.")
-            return validated_response
+    if not lesson_gs_urls:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No lesson content URLs provided for generation.")
 
-        except (json.JSONDecodeError, ValueError, ValidationError) as val_err:
-            logger.error(f"Failed to parse or validate Gemini JSON response: {val_err}\nCleaned response: {cleaned_response_text}\nRaw response: {raw_response_text}")
-            raise HTTPException(status_code=500, detail="AI generation service returned invalid or unexpected data format.")
+    if not assignment_format.questions:
+         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                             detail=f"Assignment Format '{assignment_format.name}' (ID: {assignment_format.id}) has no question definitions.")
 
-    except Exception as e:
-        logger.error(f"Error during Gemini generation for format {assignment_format.id}: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"An error occurred during AI generation: {str(e)}")
+    # --- Prepare Lesson Parts (shared by every request) ---
+    lesson_parts = []
+    for gs_url in lesson_gs_urls:
+        try:
+            lesson_parts.append(llm.uri_part(gs_url, "application/pdf"))
+        except Exception as e:
+             logger.error(f"Failed to create Part from URI {gs_url}: {e}", exc_info=True)
+             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not process lesson content URL: {gs_url}")
+
+    questions = [(str(q.question_type), q.count) for q in assignment_format.questions]
+    file_hashes = await _lesson_file_hashes(lesson_gs_urls)
+    if fan_out is None:
+        fan_out = GENERATION_FANOUT_ENABLED and sum(count for _, count in questions) >= GENERATION_FANOUT_MIN_QUESTIONS
+    chunks = fanout_chunks(questions, GENERATION_FANOUT_CHUNK_SIZE) if fan_out else []
+
+    if len(chunks) < 2:
+        prompt = _generation_prompt(assignment_format.name, questions, lesson_gs_urls)
+        cache_key = _generation_cache_key(assignment_format.name, questions, file_hashes)
+        return await _run_generation(llm, [prompt] + lesson_parts, cache_key, no_cache,
+                                     assignment_format.id, user_id, action, session_id)
+
+    # --- Fan-out: one concurrent request per chunk ---
+    logger.info(f"Generating format {assignment_format.id} as {len(chunks)} concurrent requests.")
+
+    async def generate_chunk(chunk: Tuple[str, int, int, int]) -> schemas.GenerateAssignmentResponse:
+        question_type, count, part, parts = chunk
+        part_note = (f"\nThis is part {part} of {parts} of the '{question_type}' questions; other parts are generated separately, "
+                     f"so favour different topics and sections of the material for this part.\n") if parts > 1 else ""
+        prompt = _generation_prompt(assignment_format.name, [(question_type, count)], lesson_gs_urls, part_note)
+        cache_key = _generation_cache_key(assignment_format.name, [(question_type, count)], file_hashes, (part, parts))
+        return await _run_generation(llm, [prompt] + lesson_parts, cache_key, no_cache,
+                                     assignment_format.id, user_id, action, session_id)
+
+    tasks = [asyncio.create_task(generate_chunk(chunk)) for chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()  # One chunk failed: the paper can't be completed, stop the rest
+        raise
+    chunk_results = list(zip(chunks, results))
+    merged = merge_generated_chunks(chunk_results)
+    if not merged.missing_question_counts:
+        return merged
+
+    # --- Top-up: chunks repeated each other; re-request what dedup dropped, once ---
+    async def generate_top_up(question_type: str, count: int) -> Optional[schemas.GenerateAssignmentResponse]:
+        existing = "\n".join(f"- {question.question_text}" for question in merged.generated_questions)
+        part_note = (f"\nThese questions replace repeats of questions already in the paper, so each must differ "
+                     f"from all of these:\n{existing}\n")
+        prompt = _generation_prompt(assignment_format.name, [(question_type, count)], lesson_gs_urls, part_note)
+        try:
+            # Not cached: the request depends on what the other chunks produced
+            return await _run_generation(llm, [prompt] + lesson_parts, None, no_cache,
+                                         assignment_format.id, user_id, action, session_id)
+        except HTTPException as e:
+            logger.warning(f"Top-up of {count} '{question_type}' questions for format {assignment_format.id} failed: {e.detail}")
+            return None
+
+    shortfall = list(merged.missing_question_counts.items())
+    logger.info(f"Format {assignment_format.id} came up short after dedup ({dict(shortfall)}); re-requesting the missing questions.")
+    top_ups = await asyncio.gather(*(generate_top_up(question_type, count) for question_type, count in shortfall))
+    merged = merge_generated_chunks(chunk_results, [
+        (question_type, result) for (question_type, _), result in zip(shortfall, top_ups) if result is not None
+    ])
+    if merged.missing_question_counts:
+        logger.warning(f"Format {assignment_format.id} is still missing questions after top-up: {merged.missing_question_counts}")
+    return merged
 
 
 async def modify_assignment_questions(
@@ -236,7 +407,8 @@ async def modify_assignment_questions(
     Modifies existing assignment questions based on instructions using Gemini.
     (Token logging not yet implemented for this specific function, can be added similarly if needed)
     """
-    if not vertexai_initialized or not GenerativeModel or not GenerationConfig:
+    llm = get_llm_backend()
+    if not llm.is_configured(GCP_PROJECT_ID, GCP_LOCATION):
         logger.error("modify_assignment_questions called but Vertex AI is not initialized/available.")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -278,20 +450,20 @@ Instructions:
 
 
     try:
-        model = GenerativeModel(GEMINI_MODEL_NAME)
-        generation_config = GenerationConfig(response_mime_type="application/json")
+        model = llm.get_model(GCP_PROJECT_ID, GCP_LOCATION, GEMINI_MODEL_NAME)
+        generation_config = llm.json_generation_config()
         logger.debug(f"Sending modification request to Gemini model: {GEMINI_MODEL_NAME}")
-        response = await model.generate_content_async(
-            [prompt],
-            generation_config=generation_config
-        )
+        async with llm_scheduler.slot_async(GEMINI_MODEL_NAME, None, "modify_generated_questions"):
+            response = await model.generate_content_async(
+                [prompt],
+                generation_config=generation_config
+            )
         logger.debug(f"Received modification response from Gemini. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'NO_CANDIDATES'}")
 
         # (No token logging implemented here yet, but could be added following the pattern above)
 
-        if not response.candidates or response.candidates[0].finish_reason != FinishReason.STOP:
-            finish_reason_val = response.candidates[0].finish_reason if response.candidates else "UNKNOWN"
-            finish_reason_str = finish_reason_val.name if hasattr(finish_reason_val, 'name') else str(finish_reason_val)
+        if finish_reason_name(response) != "STOP":
+            finish_reason_str = finish_reason_name(response) or "UNKNOWN"
             logger.error(f"Gemini modification stopped unexpectedly. Reason: {finish_reason_str}")
             raise HTTPException(status_code=500, detail=f"AI modification failed. Reason: {finish_reason_str}")
 
@@ -0,0 +1,152 @@
+# backend/services/llm_response_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Cache Configuration ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "lms-llm-cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    action TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+
+def response_cache_key(model_name: str, prompt_version: str, params: Dict[str, Any], file_hashes: Iterable[str]) -> str:
+    """Deterministic key: model, prompt template version, normalized params and input file content hashes."""
+    material = {
+        "model": model_name,
+        "prompt_version": prompt_version,
+        "params": params,
+        "files": sorted(file_hashes),  # Same files in any order produce the same key
+    }
+    canonical = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed cache of raw model responses with a TTL, a byte cap (LRU) and per-action metrics."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0})
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def get(self, key: str, action: str) -> Optional[str]:
+        """Returns the cached response text, or None on a miss or an expired entry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self.lock:
+            try:
+                conn = self._connection()
+                row = conn.execute("SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                logger.warning(f"LLM response cache read failed; treating as a miss: {e}")
+                row = None
+            if row is None:
+                self.stats[action]["misses"] += 1
+                return None
+            self.stats[action]["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, action: str, value: str) -> None:
+        """Stores a response, then drops expired entries and the least recently used ones over the byte cap."""
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, action, value, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, action, value, size, now, now),
+                )
+                self.stats[action]["stores"] += 1
+                self._prune(conn, now, keep=key)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM response cache write failed; response not cached: {e}")
+
+    def record_bypass(self, action: str) -> None:
+        with self.lock:
+            self.stats[action]["bypassed"] += 1
+
+    def _prune(self, conn: sqlite3.Connection, now: float, keep: str) -> None:
+        expired = conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        self.evictions += max(expired, 0)
+        if self.max_bytes <= 0:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM llm_responses WHERE key != ? ORDER BY last_access", (keep,)
+        ).fetchall():
+            conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            entries = size = 0
+            if self.enabled:
+                entries, size = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+                ).fetchone()
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "actions": {action: dict(counts) for action, counts in self.stats.items()},
+            }
+
+
+llm_response_cache = LLMResponseCache()
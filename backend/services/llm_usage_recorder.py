@@ -0,0 +1,111 @@
+# backend/services/llm_usage_recorder.py
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Optional, Union
+
+from dotenv import load_dotenv
+
+from backend.batch_writer import BatchedInsertWriter, create_writer_engine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Recorder Configuration ---
+LLM_USAGE_FLUSH_INTERVAL_MS = int(os.getenv("LLM_USAGE_FLUSH_INTERVAL_MS", "1000"))
+LLM_USAGE_BATCH_SIZE = int(os.getenv("LLM_USAGE_BATCH_SIZE", "100"))
+LLM_USAGE_QUEUE_MAX = int(os.getenv("LLM_USAGE_QUEUE_MAX", "5000"))
+LLM_USAGE_ENQUEUE_TIMEOUT_MS = int(os.getenv("LLM_USAGE_ENQUEUE_TIMEOUT_MS", "50"))
+LLM_USAGE_DRAIN_TIMEOUT_SECONDS = float(os.getenv("LLM_USAGE_DRAIN_TIMEOUT_SECONDS", "10"))
+
+
+def _usage_table():
+    from backend import models
+    return models.LLMTokenUsage.__table__
+
+
+_rollup_failure_logged = False
+
+
+def _update_rollups(conn, rows):
+    """Runs in the raw insert's transaction; a savepoint keeps a rollup failure from losing the raw rows."""
+    from backend.services.llm_usage_rollup import apply_usage_rollups
+    try:
+        with conn.begin_nested():
+            apply_usage_rollups(conn, rows)
+    except Exception as e:
+        # Rollups can be recomputed from the raw table (rebuild_usage_rollups); raw usage can't
+        global _rollup_failure_logged
+        if not _rollup_failure_logged:
+            _rollup_failure_logged = True
+            logger.error(f"Skipping LLM usage rollups (raw rows are still written); rebuild them from llm_token_usage: {e}", exc_info=True)
+        else:
+            logger.debug(f"Skipped LLM usage rollups for {len(rows)} rows: {e}")
+
+
+usage_writer = BatchedInsertWriter(
+    name="llm-usage",
+    table_factory=_usage_table,
+    engine_factory=create_writer_engine,
+    flush_interval_ms=LLM_USAGE_FLUSH_INTERVAL_MS,
+    batch_size=LLM_USAGE_BATCH_SIZE,
+    queue_max=LLM_USAGE_QUEUE_MAX,
+    enqueue_timeout_ms=LLM_USAGE_ENQUEUE_TIMEOUT_MS,
+    drain_timeout_seconds=LLM_USAGE_DRAIN_TIMEOUT_SECONDS,
+    after_insert=_update_rollups,
+)
+
+
+def finish_reason_name(response: Any) -> Optional[str]:
+    """Returns the first candidate's finish reason as a string (e.g. "STOP"), if present."""
+    candidates = getattr(response, "candidates", None)
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], "finish_reason", None)
+    if reason is None:
+        return None
+    return reason.name if hasattr(reason, "name") else str(reason)
+
+
+def record_llm_usage(
+    response: Any,
+    user_id: Union[int, str, None],
+    action: str,
+    model_name: Optional[str],
+    latency_ms: Optional[float] = None,
+    session_id: Optional[str] = None,
+) -> bool:
+    """
+    Queues one LLMTokenUsage row for a Vertex AI response.
+
+    The row is written in a batch by a background writer, so this never touches the
+    request's DB session. Returns False if the call couldn't be recorded.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        logger.warning(f"LLM usage_metadata not available for action: {action}, user_id: {user_id}. Skipping token logging.")
+        return False
+
+    if isinstance(user_id, str):
+        user_id = int(user_id) if user_id.isdigit() else None
+    if user_id is None:
+        logger.warning(f"No numeric user_id for LLM usage of action: {action}. Skipping token logging.")
+        return False
+
+    prompt_tokens = usage.prompt_token_count or 0
+    candidate_tokens = usage.candidates_token_count or 0
+    return usage_writer.submit({
+        "user_id": user_id,
+        "session_id": session_id or str(uuid.uuid4()),
+        "action": action,
+        "model_name": model_name,
+        "input_tokens": prompt_tokens,
+        "output_tokens": candidate_tokens,
+        "total_tokens": prompt_tokens + candidate_tokens,
+        "latency_ms": int(latency_ms) if latency_ms is not None else None,
+        "finish_reason": finish_reason_name(response),
+        # Set at call time (UTC) rather than flush time; also decides the rollup buckets
+        "timestamp": datetime.utcnow(),
+    })
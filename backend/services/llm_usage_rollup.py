@@ -0,0 +1,109 @@
+# backend/services/llm_usage_rollup.py
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from backend import models
+
+logger = logging.getLogger(__name__)
+
+_COUNTERS = ("request_count", "input_tokens", "output_tokens", "total_tokens", "latency_ms_total", "latency_count")
+
+
+def _aggregate(rows: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Sums raw usage rows into hourly and daily rollup rows keyed by (bucket, user, action, model)."""
+    hourly: Dict[tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+    daily: Dict[tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+    for row in rows:
+        timestamp: datetime = row.get("timestamp") or datetime.utcnow()
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        key = (row["user_id"], row["action"], row.get("model_name") or "")
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        for totals in (hourly[(hour,) + key], daily[(hour.date(),) + key]):
+            totals["request_count"] += 1
+            totals["input_tokens"] += row.get("input_tokens") or 0
+            totals["output_tokens"] += row.get("output_tokens") or 0
+            totals["total_tokens"] += row.get("total_tokens") or 0
+            if row.get("latency_ms") is not None:
+                totals["latency_ms_total"] += row["latency_ms"]
+                totals["latency_count"] += 1
+
+    def _flatten(buckets, bucket_column):
+        return [
+            {bucket_column: bucket, "user_id": user_id, "action": action, "model_name": model_name, **totals}
+            for (bucket, user_id, action, model_name), totals in buckets.items()
+        ]
+
+    return _flatten(hourly, "bucket_start"), _flatten(daily, "bucket_date")
+
+
+def _upsert(conn: Connection, table, bucket_column: str, rows: List[Dict[str, Any]]) -> None:
+    """Adds rows onto existing rollup counters, inserting the ones that don't exist yet."""
+    if not rows:
+        return
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in _COUNTERS})
+        conn.execute(stmt)
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[bucket_column, "user_id", "action", "model_name"],
+            set_={c: table.c[c] + stmt.excluded[c] for c in _COUNTERS},
+        )
+        conn.execute(stmt)
+    else:
+        _upsert_portable(conn, table, bucket_column, rows)
+
+
+def _upsert_portable(conn: Connection, table, bucket_column: str, rows: List[Dict[str, Any]]) -> None:
+    """Select-then-update/insert for dialects without a native upsert (one round trip or two per row)."""
+    for row in rows:
+        key = and_(*(table.c[column] == row[column] for column in (bucket_column, "user_id", "action", "model_name")))
+        if conn.execute(select(table.c[bucket_column]).where(key)).first() is not None:
+            conn.execute(update(table).where(key).values({c: table.c[c] + row[c] for c in _COUNTERS}))
+        else:
+            conn.execute(table.insert().values(row))
+
+
+def apply_usage_rollups(conn: Connection, rows: List[Dict[str, Any]]) -> None:
+    """Folds freshly inserted llm_token_usage rows into the hourly and daily rollups (same transaction)."""
+    hourly, daily = _aggregate(rows)
+    _upsert(conn, models.LLMUsageHourly.__table__, "bucket_start", hourly)
+    _upsert(conn, models.LLMUsageDaily.__table__, "bucket_date", daily)
+
+
+def rebuild_usage_rollups(db: Session, chunk_size: int = 5000) -> int:
+    """Recomputes both rollup tables from the raw llm_token_usage rows. Returns the raw row count."""
+    usage = models.LLMTokenUsage.__table__
+    conn = db.connection()
+    conn.execute(delete(models.LLMUsageHourly.__table__))
+    conn.execute(delete(models.LLMUsageDaily.__table__))
+
+    # Keyset pagination keeps each read short; upserts run on the same connection between pages
+    processed, last_id = 0, 0
+    while True:
+        chunk = conn.execute(
+            select(usage.c.id, usage.c.timestamp, usage.c.user_id, usage.c.action, usage.c.model_name,
+                   usage.c.input_tokens, usage.c.output_tokens, usage.c.total_tokens, usage.c.latency_ms)
+            .where(usage.c.id > last_id)
+            .order_by(usage.c.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not chunk:
+            break
+        apply_usage_rollups(conn, [dict(row) for row in chunk])
+        processed += len(chunk)
+        last_id = chunk[-1]["id"]
+    db.commit()
+    logger.info(f"Rebuilt LLM usage rollups from {processed} raw rows.")
+    return processed
@@ -1,15 +1,15 @@
 import os
 import json
+import time
 from typing import List, Dict, Any, Optional # Added Optional
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
 from datetime import datetime
 from dotenv import load_dotenv
 import uuid # Added for session_id generation
 
-# Database imports for token logging
-from backend.database import SessionLocal
-from backend.models import LLMTokenUsage
+# Token usage is recorded in batches off the request path
+from backend.llm_backend import get_llm_backend
+from backend.llm_scheduler import llm_scheduler
+from backend.services.llm_usage_recorder import record_llm_usage
 
 # Load environment variables
 load_dotenv()
@@ -27,12 +27,10 @@ class QuestionGenerator:
         print(f"Location: {location}")
         print(f"Model: {model}\n")
 
-        # Initialize Vertex AI with project and location from env vars
-        vertexai.init(
-            project=project_id,
-            location=location
-        )
-        self.model = GenerativeModel(model)
+        # Shared model client from the configured backend (Vertex AI unless LLM_BACKEND=fake)
+        self.llm = get_llm_backend()
+        self.model_name = model
+        self.model = self.llm.get_model(project_id, location, model)
 
     def _create_system_prompt(self) -> str:
         """Create the system prompt for the AI model"""
@@ -132,7 +130,7 @@ For short answer:
         """Generate questions based on lesson content and specified question types, and log token usage."""
 
         # Convert GCS URLs to Vertex AI Parts
-        lesson_parts = [Part.from_uri(url, mime_type="application/pdf") for url in lesson_urls]
+        lesson_parts = [self.llm.uri_part(url, "application/pdf") for url in lesson_urls]
 
         # Create a combined prompt for all question types
         combined_prompt = self._create_system_prompt() + "\n\n"
@@ -152,51 +150,31 @@ For short answer:
             # Generate content using Vertex AI with all questions at once
             contents = [combined_prompt] + lesson_parts
 
-            response_obj = await self.model.generate_content_async(
-                contents,
-                generation_config={
-                    "max_output_tokens": 8192,
-                    "temperature": 0.7,
-                    "top_p": 0.8,
-                    "top_k": 40
-                }
-            )
+            async with llm_scheduler.slot_async(self.model_name, user_id, action):
+                started = time.perf_counter()
+                response_obj = await self.model.generate_content_async(
+                    contents,
+                    generation_config={
+                        "max_output_tokens": 8192,
+                        "temperature": 0.7,
+                        "top_p": 0.8,
+                        "top_k": 40
+                    }
+                )
 
             # Log token usage
-            db_log = None
             try:
-                if hasattr(response_obj, 'usage_metadata') and response_obj.usage_metadata:
-                    prompt_tokens = response_obj.usage_metadata.prompt_token_count
-                    candidate_tokens = response_obj.usage_metadata.candidates_token_count
-                    total_tokens = prompt_tokens + candidate_tokens
-
-                    final_session_id = session_id if session_id else str(uuid.uuid4())
-                    model_name_to_log = os.getenv("VERTEX_AI_MODEL", self.model.model_name if hasattr(self.model, 'model_name') else "unknown_gemini_model")
-
-
-                    token_entry = LLMTokenUsage(
-                        user_id=user_id,
-                        session_id=final_session_id,
-                        action=action,
-                        model_name=model_name_to_log,
-                        input_tokens=prompt_tokens,
-                        output_tokens=candidate_tokens,
-                        total_tokens=total_tokens
-                        # timestamp is server_default
-                    )
-                    db_log = SessionLocal()
-                    db_log.add(token_entry)
-                    db_log.commit()
-                else:
-                    print(f"Warning: usage_metadata not found for action '{action}', user_id '{user_id}'. Skipping token logging.")
+                record_llm_usage(
+                    response_obj,
+                    user_id=user_id,
+                    action=action,
+                    model_name=os.getenv("VERTEX_AI_MODEL", self.model.model_name if hasattr(self.model, 'model_name') else "unknown_gemini_model"),
+                    latency_ms=(time.perf_counter() - started) * 1000,
+                    session_id=session_id,
+                )
             except Exception as log_exc:
                 print(f"Error logging token usage for action '{action}', user_id '{user_id}': {log_exc}")
-                if db_log:
-                    db_log.rollback()
-            finally:
-                if db_log:
-                    db_log.close()
-            
+
             response_text_for_error_logging = response_obj.text
             # Clean up response text by removing markdown code block markers
             text = response_obj.text
@@ -0,0 +1,204 @@
+# backend/session_store.py
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Store Configuration ---
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "1000"))
+CHAT_SESSION_MAX_PER_USER = int(os.getenv("CHAT_SESSION_MAX_PER_USER", "10"))
+CHAT_SESSION_IDLE_TTL_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_TTL_SECONDS", "1800"))
+CHAT_SESSION_MAX_BYTES = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(512 * 1024 * 1024)))  # Approx. history held across all sessions
+
+SessionKey = Tuple[str, str]  # (user_id, session_id)
+
+# Every store registers here so diagnostics can report totals across ChatManager instances;
+# cumulative counters live at module level so they survive short-lived managers.
+_stores: "weakref.WeakSet[ChatSessionStore]" = weakref.WeakSet()
+_totals_lock = threading.Lock()
+_totals: Dict[str, int] = {"created": 0, "lru": 0, "idle": 0, "per_user_cap": 0, "memory": 0}
+
+
+def _count(name: str) -> None:
+    with _totals_lock:
+        _totals[name] += 1
+
+
+@dataclass
+class SessionEntry:
+    """A chat session plus the bookkeeping the store needs to bound it."""
+    chat: Any
+    processed_files: Set[str] = field(default_factory=set)
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    approx_bytes: int = 0  # Inline file bytes + text sent/received over the session's lifetime
+    async_lock: asyncio.Lock = field(default_factory=asyncio.Lock)  # Orders async calls within the session
+    # Persistence bookkeeping (see chat_history_store): stored version, already-serialized
+    # history turns, and md5-of-inline-bytes -> file reference so history can be stored compactly
+    history_version: int = 0
+    serialized_history: List[Dict[str, Any]] = field(default_factory=list)
+    file_refs: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+
+class ChatSessionStore:
+    """In-memory chat sessions with LRU eviction, idle TTL, a per-user cap and a byte budget."""
+
+    def __init__(
+        self,
+        max_sessions: int = CHAT_SESSION_MAX_SESSIONS,
+        max_per_user: int = CHAT_SESSION_MAX_PER_USER,
+        idle_ttl_seconds: float = CHAT_SESSION_IDLE_TTL_SECONDS,
+        max_bytes: int = CHAT_SESSION_MAX_BYTES,
+    ):
+        self.max_sessions = max_sessions
+        self.max_per_user = max_per_user
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self._entries: "OrderedDict[SessionKey, SessionEntry]" = OrderedDict()  # Least recently used first
+        self._per_user: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.created = 0
+        self.evictions: Dict[str, int] = {"lru": 0, "idle": 0, "per_user_cap": 0, "memory": 0}
+        _stores.add(self)
+
+    def get_or_create(self, key: SessionKey, factory: Callable[[], Any]) -> SessionEntry:
+        """Returns the live entry for key (marking it most recently used), creating it if needed."""
+        with self.lock:
+            self._expire_idle()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry
+
+            user_id = key[0]
+            while self._per_user.get(user_id, 0) >= self.max_per_user > 0:
+                oldest = next(k for k in self._entries if k[0] == user_id)
+                self._evict(oldest, "per_user_cap")
+            while self.max_sessions > 0 and len(self._entries) >= self.max_sessions:
+                self._evict(next(iter(self._entries)), "lru")
+
+            entry = SessionEntry(chat=factory())
+            self._entries[key] = entry
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            self.created += 1
+            _count("created")
+            return entry
+
+    def add_bytes(self, key: SessionKey, nbytes: int) -> None:
+        """Accounts history growth for a session and evicts other sessions if over the byte budget."""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.approx_bytes += nbytes
+            self.total_bytes += nbytes
+            # Never evict the session that was just used; it sits at the MRU end
+            while self.max_bytes > 0 and self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                if oldest == key:
+                    break
+                self._evict(oldest, "memory")
+
+    def peek(self, key: SessionKey) -> Optional[SessionEntry]:
+        """Returns the live entry without touching its LRU position."""
+        with self.lock:
+            return self._entries.get(key)
+
+    def pop(self, key: SessionKey) -> Optional[SessionEntry]:
+        with self.lock:
+            return self._remove(key)
+
+    def pop_user(self, user_id: str) -> int:
+        with self.lock:
+            keys = [k for k in self._entries if k[0] == user_id]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def __contains__(self, key: SessionKey) -> bool:
+        with self.lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._entries)
+
+    def _expire_idle(self) -> None:
+        if self.idle_ttl_seconds <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        # LRU order means expired sessions are all at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.last_used > cutoff:
+                break
+            self._evict(key, "idle")
+
+    def _evict(self, key: SessionKey, reason: str) -> None:
+        entry = self._remove(key)
+        if entry is not None:
+            self.evictions[reason] += 1
+            _count(reason)
+            logger.debug(f"Evicted chat session {key} ({reason}, ~{entry.approx_bytes} bytes)")
+
+    def _remove(self, key: SessionKey) -> Optional[SessionEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry.approx_bytes
+        remaining = self._per_user.get(key[0], 1) - 1
+        if remaining > 0:
+            self._per_user[key[0]] = remaining
+        else:
+            self._per_user.pop(key[0], None)
+        return entry
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            self._expire_idle()
+            return {
+                "live_sessions": len(self._entries),
+                "live_users": len(self._per_user),
+                "approx_bytes": self.total_bytes,
+                "created": self.created,
+                "evictions": dict(self.evictions),
+                "limits": {
+                    "max_sessions": self.max_sessions,
+                    "max_per_user": self.max_per_user,
+                    "idle_ttl_seconds": self.idle_ttl_seconds,
+                    "max_bytes": self.max_bytes,
+                },
+            }
+
+
+def snapshot_all() -> Dict[str, Any]:
+    """Live sessions/bytes across every ChatSessionStore in the process, plus cumulative counters."""
+    stores = list(_stores)
+    live_sessions = approx_bytes = 0
+    for store in stores:
+        with store.lock:
+            store._expire_idle()
+            live_sessions += len(store._entries)
+            approx_bytes += store.total_bytes
+    with _totals_lock:
+        totals = dict(_totals)
+    return {
+        "stores": len(stores),
+        "live_sessions": live_sessions,
+        "approx_bytes": approx_bytes,
+        "created": totals.pop("created"),
+        "evictions": totals,
+    }
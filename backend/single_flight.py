@@ -0,0 +1,63 @@
+# backend/single_flight.py
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(**inputs: Any) -> str:
+    """Stable key for normalized request inputs (order-insensitive for dict keys)."""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent async calls: the first caller for a key starts the work,
+    later callers await the same task and receive its result (or exception). A caller that
+    is cancelled (e.g. the client disconnected) doesn't cancel the shared call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.lock = threading.Lock()  # Guards the counters (snapshot runs in a threadpool)
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done, k=key: self._forget(k, done))
+            with self.lock:
+                self.leaders += 1
+        else:
+            with self.lock:
+                self.followers += 1
+            logger.info(f"Coalesced duplicate '{self.name}' request onto an in-flight call.")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Marks the exception retrieved if every waiter went away
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "name": self.name,
+                "in_flight": len(self._tasks),
+                "leaders": self.leaders,
+                "coalesced": self.followers,
+            }
+
+
+# Shared by the assignment generation endpoint
+generation_flights = SingleFlight("assignment-generation")
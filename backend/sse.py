@@ -0,0 +1,19 @@
+# backend/sse.py
+import json
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Keep nginx/ingress from buffering the stream
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formats one server-sent event; data is JSON-encoded so multi-line text stays on one line."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
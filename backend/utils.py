@@ -1,37 +1,66 @@
 # backend/utils.py
 import bcrypt
 from datetime import datetime, timedelta
-from typing import Union
+from typing import Optional, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
+from backend.password_pool import password_pool
+
 SECRET_KEY = "YOUR_SECRET_KEY"  # Replace with a strong, random secret key
 ALGORITHM = "HS256"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def hash_password(password: str) -> str:
-    """Hashes the password using bcrypt."""
+# Worker-process entry points; module-level so the process pool can pickle them
+def _bcrypt_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verifies the password against the hashed password."""
+def _bcrypt_verify(password: str, hashed_password: str) -> bool:
     return pwd_context.verify(password, hashed_password)
 
 
-def create_access_token(subject: Union[str, any], expires_delta: timedelta = None) -> str:
-    """Creates a JWT access token."""
+def hash_password(password: str) -> str:
+    """Hashes the password using bcrypt (in the password hashing process pool)."""
+    return password_pool.run(_bcrypt_hash, password)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password() for async routes: awaits the pool instead of blocking the event loop."""
+    return await password_pool.run_async(_bcrypt_hash, password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Verifies the password against the hashed password (in the password hashing process pool)."""
+    return password_pool.run(_bcrypt_verify, password, hashed_password)
+
+
+def create_access_token(
+    subject: Union[str, any],
+    expires_delta: timedelta = None,
+    user_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    section_id: Optional[int] = None,
+) -> str:
+    """Creates a JWT access token, optionally carrying the user's role, role entity ID and current section."""
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)  # Default: 15 minutes
     to_encode = {"exp": expire, "sub": str(subject)}  # Subject must be a string
+    # Principal claims let routes skip the teachers/students/parents lookups (see dependencies.get_current_principal)
+    if user_type is not None:
+        to_encode["user_type"] = user_type
+    if entity_id is not None:
+        to_encode["entity_id"] = entity_id
+    if section_id is not None:
+        to_encode["section_id"] = section_id
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hash_password(password)
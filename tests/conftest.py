@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """
+    Builds a file-backed SQLite database holding only the given models' tables:
+    `engine, Session = sqlite_db(models.User, models.Teacher)`. Calling it again returns
+    another engine on the same file (tables already there are kept).
+    """
+    def build(*table_models):
+        # check_same_thread off: background writers and job workers use the engine from their own threads
+        engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+        for model in table_models:
+            model.__table__.create(engine, checkfirst=True)
+        return engine, sessionmaker(bind=engine)
+
+    return build
+
+
+# --- In-memory GCS ---
+class FakeBlob:
+    def __init__(self, client, name, generation=None):
+        self.client, self.name = client, name
+        data = client.objects.get(name)
+        self.size = len(data) if data is not None else None
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode() if data is not None else None
+        self.generation = generation or 1
+        self.content_type = "application/pdf"
+
+    def download_to_filename(self, path):
+        with self.client.request():
+            with self.client.lock:
+                self.client.downloads += 1
+            with open(path, "wb") as f:
+                f.write(self.client.objects[self.name])
+
+
+class FakeBucket:
+    def __init__(self, client):
+        self.client = client
+
+    def get_blob(self, name):
+        with self.client.lock:
+            self.client.lookups.append(name)
+        if name not in self.client.objects:
+            return None
+        with self.client.request():
+            return FakeBlob(self.client, name)
+
+    def blob(self, name, generation=None):
+        return FakeBlob(self.client, name, generation)
+
+
+class FakeStorageClient:
+    """Stand-in for storage.Client over a dict of object name -> bytes (any bucket name)."""
+
+    def __init__(self, objects, latency=0.0):
+        self.objects = objects
+        self.latency = latency  # Seconds each metadata lookup or download takes
+        self.lock = threading.Lock()
+        self.lookups = []
+        self.downloads = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0  # Most lookups/downloads seen running at once
+
+    def bucket(self, name):
+        return FakeBucket(self)
+
+    @contextmanager
+    def request(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_gcs():
+    """Builds an in-memory storage client: `client = fake_gcs({"a.pdf": b"..."}, latency=0.05)`."""
+    return FakeStorageClient
@@ -0,0 +1,177 @@
+import asyncio
+import json
+
+import pytest
+
+from backend import ai, llm_fake
+from backend.llm_resilience import llm_resilience
+from backend.llm_scheduler import LLMScheduler
+from backend.ai import AssessmentPrefetcher, ChatManager
+from backend.assessment_prefetch import PrefetchBudget, PrefetchStats, answer_is_correct
+from backend.llm_fake import FakeBackend
+
+
+def test_answer_matching():
+    assert answer_is_correct(" paris ", "Paris") is True
+    assert answer_is_correct("London", "Paris") is False
+    assert answer_is_correct("B, A", ["A", "B"]) is True
+    assert answer_is_correct("A", ["A", "B"]) is False
+    assert answer_is_correct("", "Paris") is None  # Undecidable: no prefetched branch is served
+
+
+def test_budget_caps_outstanding_branches_and_tokens():
+    budget = PrefetchBudget(max_outstanding=3, tokens_per_hour=100)
+    assert budget.try_acquire(2)
+    assert not budget.try_acquire(2)
+    budget.release(2)
+    budget.spend(150)
+    assert not budget.try_acquire(2)  # Hourly token budget used up
+
+
+def test_hit_rate():
+    stats = PrefetchStats(PrefetchBudget())
+    assert stats.snapshot()["hit_rate"] is None
+    stats.count("hits", 3)
+    stats.count("misses")
+    assert stats.snapshot()["hit_rate"] == 0.75
+
+
+# --- AssessmentPrefetcher on the fake backend ---
+# Branch prompts state the difficulty direction, so canned answers tell the two branches apart.
+# Branch questions carry no correct_answer, so serving one doesn't start another prefetch.
+def _fenced(question):
+    return f"```json\n{json.dumps({**question, 'choices': ['A', 'B', 'C', 'D']})}\n```"
+
+
+_BRANCH_ANSWERS = [
+    {"match": "answered correctly", "text": _fenced({"question": "Harder?"})},
+    {"match": "answered incorrectly", "text": _fenced({"question": "Easier?"})},
+]
+KEY = ("u", "s")  # Non-numeric user: usage recording is skipped
+
+
+@pytest.fixture
+def prefetcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    # A private scheduler, so the process-wide per-model rate limit doesn't pace the tests
+    scheduler = LLMScheduler(rpm=6000, rpm_overrides={}, burst=100)
+    monkeypatch.setattr(ai, "llm_scheduler", scheduler)
+    monkeypatch.setattr(llm_resilience, "scheduler", scheduler)
+    responses_path = tmp_path / "responses.json"
+    responses_path.write_text(json.dumps(_BRANCH_ANSWERS))
+    manager = ChatManager("test-project", "us-central1", "test-model",
+                          history_store=None, backend=FakeBackend(str(responses_path)))
+    budget = PrefetchBudget(max_outstanding=4, tokens_per_hour=0)
+    return AssessmentPrefetcher(manager, budget=budget, stats=PrefetchStats(budget), ttl_seconds=60)
+
+
+def _history_length(prefetcher):
+    return len(prefetcher.chat_manager.sessions.peek(KEY).chat.history)
+
+
+@pytest.mark.parametrize("answer, served, losing", [("a", "Harder?", False), ("B", "Easier?", True)])
+def test_answer_serves_matching_branch_and_cancels_the_other(prefetcher, answer, served, losing):
+    async def scenario():
+        first = await prefetcher.next_question(*KEY, "", [])
+        losing_task = prefetcher._pending[KEY].tasks[losing]
+        second = await prefetcher.next_question(*KEY, answer, [])
+        await asyncio.sleep(0)
+        return first, second, losing_task
+
+    first, second, losing_task = asyncio.run(scenario())
+
+    assert first["correct_answer"] == "A"
+    assert second["question"] == served
+    assert second["your_previous_answer"] == answer
+    assert losing_task.cancelled()
+    assert _history_length(prefetcher) == 4  # First exchange plus the adopted branch's
+    snapshot = prefetcher.stats.snapshot()
+    assert (snapshot["started"], snapshot["hits"], snapshot["misses"], snapshot["discarded"]) == (1, 1, 0, 1)
+    assert snapshot["budget"]["outstanding"] == 0
+    assert KEY not in prefetcher._pending
+
+
+def test_undecidable_answer_falls_back_to_a_normal_call(prefetcher, monkeypatch):
+    monkeypatch.setattr(ai, "ASSESSMENT_PREFETCH_ENABLED", False)
+
+    async def scenario():
+        prefetcher._speculate(KEY, {"correct_answer": "A"}, [])  # Session doesn't exist yet
+        assert KEY not in prefetcher._pending
+        await prefetcher.chat_manager.generate_answer_async(*KEY, [], "Hello?")
+        prefetcher._speculate(KEY, {"correct_answer": "A"}, [])
+        tasks = list(prefetcher._pending[KEY].tasks.values())
+        question = await prefetcher.next_question(*KEY, "  ", [])
+        await asyncio.sleep(0)
+        return question, tasks
+
+    question, tasks = asyncio.run(scenario())
+
+    assert question["question"] == "Fake assessment question?"
+    assert all(task.cancelled() for task in tasks)
+    snapshot = prefetcher.stats.snapshot()
+    assert (snapshot["hits"], snapshot["misses"], snapshot["discarded"]) == (0, 1, 2)
+    assert snapshot["budget"]["outstanding"] == 0
+
+
+def test_changed_files_are_a_miss(prefetcher):
+    async def scenario():
+        await prefetcher.next_question(*KEY, "", [])
+        pending = prefetcher._pending.pop(KEY)
+        served = await prefetcher._serve(KEY, pending, "A", [{"gs://bucket/new.pdf": "application/pdf"}])
+        await asyncio.sleep(0)
+        return served, pending
+
+    served, pending = asyncio.run(scenario())
+
+    assert served is None
+    assert pending.tasks == {}
+    assert prefetcher.stats.snapshot()["budget"]["outstanding"] == 0
+
+
+def test_branch_is_not_adopted_once_the_history_moved_on(prefetcher, monkeypatch):
+    async def scenario():
+        await prefetcher.next_question(*KEY, "", [])
+        await asyncio.gather(*prefetcher._pending[KEY].tasks.values())
+        # Another exchange lands in the session after the branches forked
+        await prefetcher.chat_manager.generate_answer_async(*KEY, [], "Unrelated?")
+        monkeypatch.setattr(ai, "ASSESSMENT_PREFETCH_ENABLED", False)
+        return await prefetcher.next_question(*KEY, "A", [])
+
+    question = asyncio.run(scenario())
+
+    assert question["question"] == "Fake assessment question?"  # Regenerated, not the stale "Harder?"
+    assert _history_length(prefetcher) == 6
+    snapshot = prefetcher.stats.snapshot()
+    assert (snapshot["hits"], snapshot["misses"]) == (0, 1)
+    assert snapshot["budget"]["outstanding"] == 0
+
+
+def test_expired_prefetches_are_pruned_and_cancelled(prefetcher):
+    async def scenario():
+        await prefetcher.next_question(*KEY, "", [])
+        pending = prefetcher._pending[KEY]
+        pending.created -= prefetcher.ttl_seconds + 1  # Abandoned assessment
+        prefetcher._prune()
+        await asyncio.sleep(0)
+        return pending
+
+    pending = asyncio.run(scenario())
+
+    assert KEY not in prefetcher._pending
+    assert pending.tasks == {}
+    snapshot = prefetcher.stats.snapshot()
+    assert snapshot["discarded"] == 2
+    assert snapshot["budget"]["outstanding"] == 0
+
+
+def test_no_prefetch_when_the_budget_is_spent(prefetcher):
+    prefetcher.budget.max_outstanding = 1  # Room for one branch, and a prefetch needs two
+
+    async def scenario():
+        return await prefetcher.next_question(*KEY, "", [])
+
+    assert asyncio.run(scenario())["correct_answer"] == "A"
+    assert KEY not in prefetcher._pending
+    snapshot = prefetcher.stats.snapshot()
+    assert (snapshot["started"], snapshot["skipped_budget"]) == (0, 1)
+    assert snapshot["budget"]["outstanding"] == 0
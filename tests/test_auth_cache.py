@@ -0,0 +1,55 @@
+import time
+
+from backend import models
+from backend.auth_cache import UserPrincipalCache, user_principal_cache
+
+
+def _user(user_id, username):
+    return models.User(id=user_id, username=username, user_type="Student")
+
+
+def test_cache_evicts_least_recently_used():
+    cache = UserPrincipalCache(ttl_seconds=60, max_entries=2)
+    cache.put("a", _user(1, "a"))
+    cache.put("b", _user(2, "b"))
+    assert cache.get("a") is not None  # "b" becomes least recently used
+    cache.put("c", _user(3, "c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_cache_entries_expire():
+    cache = UserPrincipalCache(ttl_seconds=0.01, max_entries=10)
+    cache.put("a", _user(1, "a"))
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.snapshot()["expirations"] == 1
+
+
+def test_commit_invalidates_changed_user(sqlite_db):
+    _, Session = sqlite_db(models.User, models.Teacher)
+
+    with Session() as db:
+        db.add(models.User(id=1, username="alice", user_type="Teacher", is_active=True))
+        db.commit()
+
+    user_principal_cache.clear()
+    user_principal_cache.put("alice", _user(1, "alice"))
+
+    with Session() as db:
+        user = db.get(models.User, 1)
+        user.is_active = False
+        db.flush()
+        assert user_principal_cache.get("alice") is not None  # not applied until commit
+        db.commit()
+
+    assert user_principal_cache.get("alice") is None
+
+    # Role-profile rows invalidate their owning user too
+    user_principal_cache.put("alice", _user(1, "alice"))
+    with Session() as db:
+        db.add(models.Teacher(name="Alice", user_id=1))
+        db.commit()
+    assert user_principal_cache.get("alice") is None
@@ -0,0 +1,59 @@
+from sqlalchemy import func, select
+
+from backend import models
+from backend.batch_writer import BatchedInsertWriter
+
+
+def _event(i):
+    return {"user_id": None, "action": f"TEST_{i}", "details": None, "target_entity": None, "target_entity_id": i}
+
+
+def _audit_writer(engine_factory, flush_interval_ms=250, batch_size=200, queue_max=100, enqueue_timeout_ms=50):
+    return BatchedInsertWriter(
+        name="test-audit",
+        table_factory=lambda: models.AuditLog.__table__,
+        engine_factory=engine_factory,
+        flush_interval_ms=flush_interval_ms,
+        batch_size=batch_size,
+        queue_max=queue_max,
+        enqueue_timeout_ms=enqueue_timeout_ms,
+    )
+
+
+def test_events_are_batched_and_drained_on_shutdown(sqlite_db):
+    engine, _ = sqlite_db(models.User, models.AuditLog)
+    sink = _audit_writer(lambda: engine, flush_interval_ms=5000, batch_size=10, queue_max=100)
+    for i in range(25):
+        assert sink.submit(_event(i))
+    sink.shutdown(timeout=10)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.AuditLog.__table__)).scalar() == 25
+    snapshot = sink.snapshot()
+    assert snapshot["written"] == 25
+    assert 3 <= snapshot["batches"] < 25  # multi-row batches, not one INSERT per event
+    assert snapshot["dropped_queue_full"] == 0
+
+
+def test_full_queue_drops_and_counts(sqlite_db):
+    sink = _audit_writer(lambda: sqlite_db(models.User, models.AuditLog)[0], queue_max=1, enqueue_timeout_ms=1)
+    sink.start = lambda: None  # keep the writer stopped so the queue stays full
+    assert sink.submit(_event(1))
+    assert not sink.submit(_event(2))
+    assert sink.snapshot()["dropped_queue_full"] == 1
+
+
+def test_poison_row_is_dropped_alone(sqlite_db):
+    engine, _ = sqlite_db(models.User, models.AuditLog)
+    sink = _audit_writer(lambda: engine, flush_interval_ms=5000, batch_size=10)
+    for i in range(5):
+        event = _event(i)
+        if i == 2:
+            event["action"] = None  # NOT NULL violation fails the whole multi-row INSERT
+        assert sink.submit(event)
+    sink.shutdown(timeout=10)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.AuditLog.__table__)).scalar() == 4
+    snapshot = sink.snapshot()
+    assert (snapshot["written"], snapshot["dropped_write_error"]) == (4, 1)
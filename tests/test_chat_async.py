@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from backend import ai, llm_fake
+from backend.ai import ChatManager
+from backend.llm_fake import FakeBackend, FakeChat
+from backend.llm_resilience import llm_resilience
+from backend.llm_scheduler import LLMScheduler
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 50)
+    # A private scheduler with room for every call, so only the session locks limit overlap
+    scheduler = LLMScheduler(max_concurrent=16, per_user=16, rpm=6000, rpm_overrides={}, burst=100)
+    monkeypatch.setattr(ai, "llm_scheduler", scheduler)
+    monkeypatch.setattr(llm_resilience, "scheduler", scheduler)
+    return ChatManager("test-project", "us-central1", "test-model", history_store=None, backend=FakeBackend())
+
+
+@pytest.fixture
+def in_flight(monkeypatch):
+    """Counts model calls running at once, overall and per chat session object."""
+    counts = {"now": 0, "peak": 0, "per_chat": {}, "peak_per_chat": 0}
+    send = FakeChat.send_message_async
+
+    async def counted(self, content, stream=False):
+        counts["now"] += 1
+        counts["per_chat"][id(self)] = counts["per_chat"].get(id(self), 0) + 1
+        counts["peak"] = max(counts["peak"], counts["now"])
+        counts["peak_per_chat"] = max(counts["peak_per_chat"], counts["per_chat"][id(self)])
+        try:
+            return await send(self, content, stream)
+        finally:
+            counts["now"] -= 1
+            counts["per_chat"][id(self)] -= 1
+
+    monkeypatch.setattr(FakeChat, "send_message_async", counted)
+    return counts
+
+
+def _exchanges(manager, session_id):
+    """(question, answer) pairs in history order; the fake model echoes the prompt in its answer."""
+    history = manager.sessions.peek(("u", session_id)).chat.history
+    assert [content.role for content in history] == ["user", "model"] * (len(history) // 2)
+    return [(history[i].parts[-1].text, history[i + 1].parts[0].text) for i in range(0, len(history), 2)]
+
+
+def test_calls_in_one_session_run_one_at_a_time_and_keep_history_in_order(manager, in_flight):
+    questions = [f"Question {i}?" for i in range(4)]
+
+    async def scenario():
+        return await asyncio.gather(*(manager.generate_answer_async("u", "s1", [], q) for q in questions))
+
+    answers = asyncio.run(scenario())
+
+    assert in_flight["peak_per_chat"] == 1
+    exchanges = _exchanges(manager, "s1")
+    assert sorted(question for question, _ in exchanges) == questions
+    for question, answer in exchanges:
+        assert answer.endswith(question)  # Each answer sits right after its own question
+    assert answers == [dict(exchanges)[q] for q in questions]  # Each caller got its own answer
+
+
+def test_calls_in_different_sessions_overlap(manager, in_flight):
+    async def scenario():
+        await asyncio.gather(*(manager.generate_answer_async("u", f"s{i}", [], "Hello?") for i in range(4)))
+
+    asyncio.run(scenario())
+
+    assert in_flight["peak"] > 1
+    assert in_flight["peak_per_chat"] == 1
+    for i in range(4):
+        assert len(_exchanges(manager, f"s{i}")) == 1
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+from backend import llm_fake
+from backend.ai import ChatManager
+from backend.chat_history_store import KeyValueChatHistoryStore, SQLiteChatHistoryStore, StoredSession
+from backend.llm_fake import FakeBackend
+
+
+class _DictStore(KeyValueChatHistoryStore):
+    """Networked-store stand-in backed by a dict."""
+
+    def __init__(self):
+        super().__init__(ttl_seconds=60)
+        self.values = {}
+
+    def get_value(self, name):
+        return self.values.get(name)
+
+    def set_value(self, name, value, ttl_seconds):
+        self.values[name] = value
+
+    def delete_values(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+
+def _session(version):
+    history = [{"role": "user", "parts": [{"file_ref": {"gs_uri": "gs://b/l.pdf", "mime_type": "application/pdf"}}, {"text": "Hi"}]}]
+    return StoredSession(history=history, processed_files=["md5-abc"], version=version)
+
+
+def _exercise(store):
+    key = ("7", "s1")
+    assert store.load_if_newer(key, 0) is None
+    store.save(key, _session(1))
+
+    loaded = store.load_if_newer(key, 0)  # e.g. another worker with no copy of the session
+    assert loaded.history[0]["parts"][0]["file_ref"]["gs_uri"] == "gs://b/l.pdf"
+    assert loaded.processed_files == ["md5-abc"]
+    assert store.load_if_newer(key, 1) is None  # already up to date
+
+    store.save(("7", "s2"), _session(1))
+    store.delete(key)
+    assert store.load_if_newer(key, 0) is None
+    store.delete_user("7")
+    assert store.load_if_newer(("7", "s2"), 0) is None
+    assert store.snapshot()["saves"] == 2
+
+
+def test_sqlite_store(tmp_path):
+    _exercise(SQLiteChatHistoryStore(path=str(tmp_path / "chat.sqlite3"), ttl_seconds=60))
+
+
+def test_key_value_store():
+    _exercise(_DictStore())
+
+
+class _ThreadRecordingStore(SQLiteChatHistoryStore):
+    """Notes which thread each save ran on."""
+
+    def __init__(self, path):
+        super().__init__(path=path, ttl_seconds=60)
+        self.save_threads = []
+
+    def save(self, key, stored):
+        self.save_threads.append(threading.current_thread())
+        super().save(key, stored)
+
+
+def test_async_answers_persist_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    store = _ThreadRecordingStore(str(tmp_path / "chat.sqlite3"))
+    manager = ChatManager("test-project", "us-central1", "test-model", history_store=store, backend=FakeBackend())
+
+    async def scenario():
+        await manager.generate_answer_async("7", "s1", [], "First?")
+        async for _ in manager.generate_answer_stream_async("7", "s1", [], "Second?"):
+            pass
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(scenario())
+
+    assert len(store.save_threads) == 2
+    assert loop_thread not in store.save_threads
+    assert len(store.load_if_newer(("7", "s1"), 0).history) == 4  # Both exchanges were stored
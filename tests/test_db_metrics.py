@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine, text
+
+from backend.db_metrics import InstrumentedQueuePool, PoolMetrics
+from backend.metrics import Histogram
+
+
+def test_histogram_snapshot_is_cumulative():
+    histogram = Histogram(buckets=(10, 100))
+    for value in (1, 5, 50, 500):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["max"] == 500
+    assert snapshot["buckets"] == {"10": 2, "100": 3, "+Inf": 4}
+
+
+def test_pool_metrics_track_checkouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=2,
+        max_overflow=1,
+    )
+    metrics = PoolMetrics()
+    metrics.attach(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert metrics.snapshot()["pool"]["checked_out"] == 1
+
+    snapshot = metrics.snapshot()
+    assert snapshot["pool"]["checked_out"] == 0
+    assert snapshot["pool"]["size"] == 2
+    assert snapshot["counters"]["checkouts"] == 1
+    assert snapshot["counters"]["checkins"] == 1
+    assert snapshot["checkout_duration_ms"]["count"] == 1
+
+
+def test_to_async_url_maps_sync_drivers():
+    from backend.database import to_async_url
+
+    assert to_async_url("mysql+pymysql://u:p@host/db") == "mysql+aiomysql://u:p@host/db"
+    assert to_async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
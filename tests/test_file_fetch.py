@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import ai, llm_fake
+from backend.ai import ChatManager
+from backend.gcs_cache import GCSFileCache
+from backend.llm_fake import FakeBackend
+
+LATENCY = 0.05  # Per simulated GCS request; long enough for concurrent fetches to overlap
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    monkeypatch.setattr(ai, "gcs_file_cache", GCSFileCache(cache_dir=str(tmp_path), max_bytes=10 ** 6))
+    return ChatManager("p", "l", "fake-model", history_store=None, backend=FakeBackend())
+
+
+def _files(*names):
+    return [{f"gs://bucket/{name}": "application/pdf"} for name in names]
+
+
+def test_files_are_fetched_concurrently_in_request_order(manager, fake_gcs):
+    client = fake_gcs({"a.pdf": b"a" * 10, "b.pdf": b"b" * 10, "c.pdf": b"c" * 10, "copy-of-a.pdf": b"a" * 10}, LATENCY)
+    entry = manager._get_or_create_entry("1", "s")
+
+    parts, sent_bytes = manager._build_parts(entry, client, _files("c.pdf", "a.pdf", "copy-of-a.pdf", "b.pdf"), "Q?", None)
+
+    assert client.peak_in_flight > 1  # Files overlapped instead of being fetched one by one
+    assert [part.inline_data.data[:1] for part in parts[:-1]] == [b"c", b"a", b"b"]  # Duplicate content sent once
+    assert parts[-1].text == "Q?"
+    assert sent_bytes == 30
+    assert len(entry.processed_files) == 3
+
+
+def test_async_build_matches_sync(manager, fake_gcs):
+    client = fake_gcs({"a.pdf": b"a" * 10, "b.pdf": b"b" * 10}, LATENCY)
+    entry = manager._get_or_create_entry("1", "s")
+
+    parts, _ = asyncio.run(manager._build_parts_async(entry, client, _files("b.pdf", "a.pdf"), "Q?", None))
+    assert client.peak_in_flight > 1
+    assert [part.inline_data.data[:1] for part in parts[:-1]] == [b"b", b"a"]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_fetch_cancels_the_rest_and_marks_nothing(manager, monkeypatch, fake_gcs, use_async):
+    # One worker: the failing first file runs while the others are still queued, so they can be cancelled
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(ai, "_file_fetch_pool", pool)
+    client = fake_gcs({"a.pdf": b"a" * 10, "b.pdf": b"b" * 10, "c.pdf": b"c" * 10}, LATENCY)
+    entry = manager._get_or_create_entry("1", "s")
+    files = _files("missing.pdf", "a.pdf", "b.pdf", "c.pdf")
+
+    with pytest.raises(ValueError, match="missing.pdf"):
+        if use_async:
+            asyncio.run(manager._build_parts_async(entry, client, files, "Q?", None))
+        else:
+            manager._build_parts(entry, client, files, "Q?", None)
+    pool.shutdown(wait=True)
+
+    assert len(client.lookups) < len(files)  # Queued fetches never ran
+    assert entry.processed_files == set()
@@ -0,0 +1,20 @@
+from backend.file_transfer import FileTransferMetrics, GCS_INLINE_MAX_BYTES, should_inline
+
+
+def test_media_goes_by_reference_and_large_files_are_not_inlined():
+    assert should_inline("application/pdf", 1024)
+    assert not should_inline("application/pdf", GCS_INLINE_MAX_BYTES + 1)
+    assert not should_inline("video/mp4", 1024)
+
+
+def test_record_call_accumulates_per_call_volumes():
+    metrics = FileTransferMetrics()
+    metrics.record_call(inline_files=2, inline_bytes=3000, reference_files=1, reference_bytes=50_000_000)
+    metrics.record_call(inline_files=0, inline_bytes=0, reference_files=0, reference_bytes=0)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["calls"] == 2
+    assert snapshot["inline_bytes_total"] == 3000
+    assert snapshot["reference_files"] == 1
+    assert snapshot["inline_bytes_per_call"]["max"] == 3000
+    assert snapshot["reference_bytes_per_call"]["count"] == 2
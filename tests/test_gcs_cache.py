@@ -0,0 +1,36 @@
+from backend.gcs_cache import GCSFileCache
+
+
+def test_identical_content_shares_one_key_and_download(tmp_path, fake_gcs):
+    client = fake_gcs({"a.pdf": b"x" * 10, "copy/a.pdf": b"x" * 10})
+    cache = GCSFileCache(cache_dir=str(tmp_path), max_bytes=1000, metadata_ttl_seconds=60)
+
+    first = cache.stat(client, "gs://bucket/a.pdf")
+    second = cache.stat(client, "gs://bucket/copy/a.pdf")
+    assert first.key == second.key
+    assert client.downloads == 0  # metadata only
+
+    assert cache.read(client, first) == b"x" * 10
+    assert cache.read(client, second) == b"x" * 10
+    assert client.downloads == 1
+    snapshot = cache.snapshot()
+    assert snapshot["hits"] == 1 and snapshot["misses"] == 1
+
+
+def test_lru_eviction_under_byte_cap(tmp_path, fake_gcs):
+    client = fake_gcs({"a": b"a" * 40, "b": b"b" * 40, "c": b"c" * 40})
+    cache = GCSFileCache(cache_dir=str(tmp_path), max_bytes=100, metadata_ttl_seconds=60)
+    a, b, c = (cache.stat(client, f"gs://bucket/{n}") for n in "abc")
+
+    cache.read(client, a)
+    cache.read(client, b)
+    cache.read(client, a)  # b is now least recently used
+    cache.read(client, c)  # 120 bytes > 100: evicts b
+    assert not (tmp_path / b.key).exists()
+    assert (tmp_path / a.key).exists()
+    assert cache.snapshot()["evictions"] == 1
+
+    # A fresh cache over the same directory picks up the surviving files
+    restarted = GCSFileCache(cache_dir=str(tmp_path), max_bytes=100, metadata_ttl_seconds=60)
+    assert restarted.read(client, a) == b"a" * 40
+    assert client.downloads == 3
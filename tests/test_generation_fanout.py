@@ -0,0 +1,155 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from backend import llm_backend, llm_fake, schemas
+from backend.llm_fake import FakeBackend
+from backend.services import generation_service
+from backend.services.generation_service import fanout_chunks, merge_generated_chunks
+
+
+def _question(question_type, text):
+    return schemas.GeneratedQuestion(question_type=question_type, question_text=text)
+
+
+def test_chunks_split_large_types_evenly():
+    chunks = fanout_chunks([("single_select", 23), ("short_answer", 4), ("match_following", 0)], chunk_size=10)
+    assert chunks == [
+        ("single_select", 8, 1, 3), ("single_select", 8, 2, 3), ("single_select", 7, 3, 3),
+        ("short_answer", 4, 1, 1),
+    ]
+
+
+def test_merge_caps_dedups_and_renumbers():
+    merged = merge_generated_chunks([
+        (("single_select", 2, 1, 2), schemas.GenerateAssignmentResponse(generated_questions=[
+            _question("single_select", "What is 2 + 2?"), _question("single_select", "Name a prime."),
+            _question("single_select", "Extra question beyond the count"),
+        ])),
+        (("single_select", 2, 2, 2), schemas.GenerateAssignmentResponse(generated_questions=[
+            _question("single_select", "what is  2 + 2?"), _question("single_select", "Define a set."),
+        ])),
+    ])
+    assert [q.question_text for q in merged.generated_questions] == ["What is 2 + 2?", "Name a prime.", "Define a set."]
+    assert [q.question_number for q in merged.generated_questions] == [1, 2, 3]
+    assert merged.missing_question_counts == {"single_select": 1}
+
+
+def test_merge_fills_shortfall_from_top_ups_within_the_type():
+    chunk_results = [
+        (("single_select", 2, 1, 2), schemas.GenerateAssignmentResponse(generated_questions=[
+            _question("single_select", "What is 2 + 2?"), _question("single_select", "Name a prime."),
+        ])),
+        (("single_select", 2, 2, 2), schemas.GenerateAssignmentResponse(generated_questions=[
+            _question("single_select", "What is 2 + 2?"), _question("single_select", "Name a prime."),
+        ])),
+        (("short_answer", 1, 1, 1), schemas.GenerateAssignmentResponse(generated_questions=[
+            _question("short_answer", "Explain sets."),
+        ])),
+    ]
+    top_up = schemas.GenerateAssignmentResponse(generated_questions=[
+        _question("single_select", "Name a prime."), _question("single_select", "Define a set."),
+    ])
+
+    merged = merge_generated_chunks(chunk_results, [("single_select", top_up)])
+
+    assert [q.question_text for q in merged.generated_questions] == [
+        "What is 2 + 2?", "Name a prime.", "Define a set.", "Explain sets.",
+    ]
+    assert merged.missing_question_counts == {"single_select": 1}  # The top-up repeated one of them too
+
+
+def test_fan_out_generates_each_type_concurrently(monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    monkeypatch.setattr(llm_backend, "_backend", FakeBackend())
+    monkeypatch.setattr(generation_service, "record_llm_usage", lambda *args, **kwargs: True)
+    prompts = []
+    real_prompt = generation_service._generation_prompt
+    monkeypatch.setattr(generation_service, "_generation_prompt",
+                        lambda *args, **kwargs: prompts.append(args[1]) or real_prompt(*args, **kwargs))
+    assignment_format = SimpleNamespace(id=1, name="Term paper", questions=[
+        SimpleNamespace(question_type="single_select", count=3),
+        SimpleNamespace(question_type="short_answer", count=2),
+    ])
+
+    result = asyncio.run(generation_service.generate_assignment_questions(
+        assignment_format=assignment_format,
+        lesson_gs_urls=["gs://fake-bucket/lesson.pdf"],
+        user_id=1,
+        action="generate_questions_fmt_1",
+        no_cache=True,
+        fan_out=True,
+    ))
+
+    assert prompts == [[("single_select", 3)], [("short_answer", 2)]]
+    assert [q.question_type.value for q in result.generated_questions] == ["single_select"] * 3 + ["short_answer"] * 2
+    assert [q.question_number for q in result.generated_questions] == [1, 2, 3, 4, 5]
+
+
+def test_split_type_keeps_full_count_on_fake_backend(monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    monkeypatch.setattr(llm_backend, "_backend", FakeBackend())
+    monkeypatch.setattr(generation_service, "record_llm_usage", lambda *args, **kwargs: True)
+    monkeypatch.setattr(generation_service, "GENERATION_FANOUT_CHUNK_SIZE", 10)
+    assignment_format = SimpleNamespace(id=2, name="Final exam", questions=[
+        SimpleNamespace(question_type="single_select", count=23),
+    ])
+
+    result = asyncio.run(generation_service.generate_assignment_questions(
+        assignment_format=assignment_format,
+        lesson_gs_urls=["gs://fake-bucket/lesson.pdf"],
+        user_id=1,
+        action="generate_questions_fmt_2",
+        no_cache=True,
+        fan_out=True,
+    ))
+
+    assert len(result.generated_questions) == 23  # Three parts, none lost to dedup
+    assert len({q.question_text for q in result.generated_questions}) == 23
+    assert [q.question_number for q in result.generated_questions] == list(range(1, 24))
+
+
+def _fake_questions(question_type, texts):
+    return json.dumps({"generated_questions": [{"question_type": question_type, "question_text": t} for t in texts]})
+
+
+def _generate_with_canned(monkeypatch, tmp_path, canned):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    responses_path = tmp_path / "responses.json"
+    responses_path.write_text(json.dumps(canned))
+    monkeypatch.setattr(llm_backend, "_backend", FakeBackend(str(responses_path)))
+    monkeypatch.setattr(generation_service, "record_llm_usage", lambda *args, **kwargs: True)
+    monkeypatch.setattr(generation_service, "GENERATION_FANOUT_CHUNK_SIZE", 3)
+    assignment_format = SimpleNamespace(id=3, name="Quiz", questions=[SimpleNamespace(question_type="short_answer", count=6)])
+    return asyncio.run(generation_service.generate_assignment_questions(
+        assignment_format=assignment_format,
+        lesson_gs_urls=["gs://fake-bucket/lesson.pdf"],
+        user_id=1,
+        action="generate_questions_fmt_3",
+        no_cache=True,
+        fan_out=True,
+    ))
+
+
+# Both parts of the split type come back with the same three questions, so dedup leaves three missing
+_REPEATED_PARTS = {"match": "questions of type 'short_answer'", "text": _fake_questions("short_answer", ["A?", "B?", "C?"])}
+
+
+def test_questions_lost_to_dedup_are_re_requested(monkeypatch, tmp_path):
+    result = _generate_with_canned(monkeypatch, tmp_path, [
+        {"match": "replace repeats", "text": _fake_questions("short_answer", ["D?", "E?", "F?"])},
+        _REPEATED_PARTS,
+    ])
+
+    assert [q.question_text for q in result.generated_questions] == ["A?", "B?", "C?", "D?", "E?", "F?"]
+    assert result.missing_question_counts == {}
+
+
+def test_shortfall_the_top_up_cannot_fill_is_reported(monkeypatch, tmp_path):
+    result = _generate_with_canned(monkeypatch, tmp_path, [
+        {"match": "replace repeats", "text": _fake_questions("short_answer", ["A?", "D?"])},
+        _REPEATED_PARTS,
+    ])
+
+    assert [q.question_text for q in result.generated_questions] == ["A?", "B?", "C?", "D?"]
+    assert result.missing_question_counts == {"short_answer": 2}
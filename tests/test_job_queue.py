@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.job_queue import JobQueue, parse_kind_limits
+
+
+@pytest.fixture
+def factory(sqlite_db):
+    _, factory = sqlite_db(models.User, models.GenerationJob)
+    db = factory()
+    db.add(models.User(id=1, username="alice", user_type="Teacher"))
+    db.commit()
+    db.close()
+    return factory
+
+
+def _queue(factory, **kwargs):
+    queue = JobQueue(session_factory=factory, concurrency=2, kind_limits={}, poll_interval=0.05, **kwargs)
+
+    @queue.handler("echo")
+    async def echo(job):
+        await job.progress(50, "halfway")
+        if job.payload.get("fail"):
+            raise ValueError("boom")
+        return {"echo": job.payload["value"]}
+
+    return queue
+
+
+def _wait_for(queue, job_id, timeout=5.0):
+    async def poll():
+        deadline = asyncio.get_running_loop().time() + timeout
+        while asyncio.get_running_loop().time() < deadline:
+            job = await asyncio.to_thread(queue.fetch, job_id)
+            if job.status in ("succeeded", "failed"):
+                return job
+            await asyncio.sleep(0.02)
+        raise AssertionError("job did not finish")
+    return poll()
+
+
+def test_jobs_run_and_results_persist(factory):
+    queue = _queue(factory)
+
+    async def main():
+        queue.start()
+        db = factory()
+        ok_id = queue.enqueue(db, "echo", 1, {"value": 7}).id
+        bad_id = queue.enqueue(db, "echo", 1, {"fail": True}).id
+        db.close()
+        results = [await _wait_for(queue, ok_id), await _wait_for(queue, bad_id)]
+        await queue.stop()
+        return results
+
+    ok, bad = asyncio.run(main())
+    assert (ok.status, ok.result, ok.progress, ok.attempts) == ("succeeded", {"echo": 7}, 100, 1)
+    assert (bad.status, bad.error) == ("failed", "boom")
+    snapshot = queue.snapshot()
+    assert (snapshot["succeeded"], snapshot["failed"], snapshot["queue_wait_ms"]["count"]) == (1, 1, 2)
+
+
+def test_a_job_is_claimed_once_and_stale_jobs_are_requeued(factory):
+    first, second = _queue(factory, stale_seconds=60), _queue(factory, stale_seconds=60)
+    db = factory()
+    job_id = first.enqueue(db, "echo", 1, {"value": 1}).id
+    assert first._claim()["id"] == job_id
+    assert second._claim() is None
+
+    # The first worker dies: once its heartbeat is stale the job goes back to the queue
+    db.query(models.GenerationJob).update({models.GenerationJob.heartbeat_at: datetime.utcnow() - timedelta(minutes=5)})
+    db.commit()
+    second._last_stale_check = 0
+    assert second._claim()["id"] == job_id
+    db.close()
+    assert second.fetch(job_id).attempts == 2
+
+
+def test_parse_kind_limits():
+    assert parse_kind_limits("a=2, b=1,") == {"a": 2, "b": 1}
+    assert parse_kind_limits("") == {}
@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from backend import llm_backend, llm_fake
+from backend.llm_fake import FakeBackend
+
+
+def test_fake_chat_streams_and_records_history(monkeypatch):
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    backend = FakeBackend()
+    chat = backend.get_model(None, None, "fake-model").start_chat()
+
+    async def collect():
+        stream = await chat.send_message_async([backend.text_part("Explain circles")], stream=True)
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    assert chunks[-1].usage_metadata.prompt_token_count > 0
+    assert all(chunk.usage_metadata is None for chunk in chunks[:-1])
+    assert [content.role for content in chat.history] == ["user", "model"]
+
+
+def test_generation_service_runs_offline_on_fake_backend(monkeypatch):
+    from backend.services import generation_service
+
+    monkeypatch.setattr(llm_fake, "LLM_FAKE_LATENCY_MS", 0)
+    monkeypatch.setattr(llm_backend, "_backend", FakeBackend())
+    monkeypatch.setattr(generation_service, "record_llm_usage", lambda *args, **kwargs: True)
+    assignment_format = SimpleNamespace(
+        id=1,
+        name="Weekly quiz",
+        questions=[
+            SimpleNamespace(question_type="single_select", count=2),
+            SimpleNamespace(question_type="short_answer", count=1),
+        ],
+    )
+
+    result = asyncio.run(generation_service.generate_assignment_questions(
+        assignment_format=assignment_format,
+        lesson_gs_urls=["gs://bucket/lesson.pdf"],
+        user_id=1,
+        action="generate_questions_fmt_1",
+    ))
+    assert [q.question_type.value for q in result.generated_questions] == ["single_select", "single_select", "short_answer"]
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from backend.llm_resilience import LLMDeadlineExceeded, LLMResilience, action_family
+from backend.llm_scheduler import LLMScheduler
+
+
+def _resilience(**kwargs):
+    options = dict(max_attempts=3, base_delay_ms=1, max_delay_ms=5, deadlines={}, default_deadline=5)
+    options.update(kwargs)
+    return LLMResilience(**options)
+
+
+def test_transient_errors_are_retried():
+    resilience = _resilience()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise google_exceptions.ServiceUnavailable("unavailable")
+        return "ok"
+
+    assert resilience.call("generate_questions_fmt_4", flaky) == "ok"
+    counters = resilience.snapshot()["actions"]["generate_questions_fmt"]
+    assert (counters["calls"], counters["retries"], counters["failures"]) == (1, 2, 0)
+
+
+def test_non_retryable_errors_fail_immediately():
+    resilience = _resilience()
+    calls = []
+
+    async def bad_request():
+        calls.append(1)
+        raise google_exceptions.InvalidArgument("bad prompt")
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        asyncio.run(resilience.call_async("ask_question", bad_request))
+    assert len(calls) == 1
+
+
+def test_deadline_covers_all_attempts():
+    resilience = _resilience(deadlines={"ask_question": 0.05})
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(resilience.call_async("ask_question", slow))
+    assert resilience.snapshot()["actions"]["ask_question"]["deadline_exceeded"] == 1
+
+
+def test_slow_call_is_hedged_and_loser_cancelled():
+    resilience = _resilience(hedge_enabled=True, hedge_min_samples=3)
+    for _ in range(3):
+        resilience._record_latency("analyze_assignment_sample", 0.01)
+    delays = [1.0, 0.0]
+    cancelled = []
+
+    async def attempt():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert asyncio.run(resilience.call_async("analyze_assignment_sample", attempt, hedge=True)) == 0.0
+    assert cancelled == [1.0]
+    counters = resilience.snapshot()["actions"]["analyze_assignment_sample"]
+    assert (counters["hedges"], counters["hedge_wins"]) == (1, 1)
+
+
+def _scheduler():
+    return LLMScheduler(max_concurrent=1, batch_max_concurrent=1, per_user=1, rpm=6000, rpm_overrides={}, burst=100)
+
+
+def test_queue_wait_is_outside_deadline_and_latency():
+    scheduler = _scheduler()
+    resilience = _resilience(deadlines={"ask_question": 0.1}, scheduler=scheduler)
+
+    async def quick():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def main():
+        async def occupy():
+            async with scheduler.slot_async("m", 2, "ask_question"):
+                await asyncio.sleep(0.2)  # Longer than the deadline
+
+        holder = asyncio.create_task(occupy())
+        await asyncio.sleep(0)
+        result = await resilience.call_async("ask_question", quick, model_name="m", user_id=1)
+        await holder
+        return result
+
+    assert asyncio.run(main()) == "ok"
+    assert resilience.hedge_after("ask_question") is None
+    assert resilience.latencies["ask_question"][0] < 0.1
+
+
+def test_hedge_is_skipped_when_no_slot_is_free():
+    scheduler = _scheduler()
+    resilience = _resilience(hedge_enabled=True, hedge_min_samples=1, scheduler=scheduler)
+    resilience._record_latency("analyze_assignment_sample", 0.01)
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    result = asyncio.run(resilience.call_async("analyze_assignment_sample", attempt, hedge=True, model_name="m", user_id=1))
+    assert result == "primary" and len(calls) == 1
+    counters = resilience.snapshot()["actions"]["analyze_assignment_sample"]
+    assert (counters["hedges"], counters["hedges_skipped"]) == (0, 1)
+
+
+def test_action_family():
+    assert action_family("generate_questions_fmt_12") == "generate_questions_fmt"
+    assert action_family("ask_question") == "ask_question"
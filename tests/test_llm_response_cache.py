@@ -0,0 +1,33 @@
+import time
+
+from backend.services.llm_response_cache import LLMResponseCache, response_cache_key
+
+
+def test_key_is_stable_under_param_and_file_order():
+    a = response_cache_key("gemini", "1", {"x": 1, "y": [1, 2]}, ["h2", "h1"])
+    b = response_cache_key("gemini", "1", {"y": [1, 2], "x": 1}, ["h1", "h2"])
+    assert a == b
+    assert a != response_cache_key("gemini", "2", {"x": 1, "y": [1, 2]}, ["h1", "h2"])
+    assert a != response_cache_key("gemini", "1", {"x": 1, "y": [1, 2]}, ["h1", "h3"])
+
+
+def test_hits_misses_ttl_and_byte_cap(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=0.1, max_bytes=25, enabled=True)
+    assert cache.get("k1", "gen") is None
+    cache.put("k1", "gen", "a" * 10)
+    assert cache.get("k1", "gen") == "a" * 10
+
+    cache.put("k2", "gen", "b" * 10)
+    cache.get("k1", "gen")  # k2 is now least recently used
+    cache.put("k3", "gen", "c" * 10)  # 30 bytes > 25: evicts k2
+    assert cache.get("k2", "gen") is None
+    assert cache.get("k1", "gen") is not None
+
+    time.sleep(0.12)
+    assert cache.get("k3", "gen") is None  # expired
+    cache.record_bypass("analyze")
+
+    snapshot = cache.snapshot()
+    assert snapshot["actions"]["gen"]["hits"] == 3
+    assert snapshot["actions"]["gen"]["misses"] == 3
+    assert snapshot["actions"]["analyze"]["bypassed"] == 1
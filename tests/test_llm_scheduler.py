@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from backend.llm_scheduler import BATCH, INTERACTIVE, LLMQueueTimeout, LLMScheduler, lane_for_action
+
+
+def _scheduler(**kwargs):
+    options = dict(max_concurrent=1, batch_max_concurrent=1, per_user=1, rpm=6000, rpm_overrides={}, burst=100)
+    options.update(kwargs)
+    return LLMScheduler(**options)
+
+
+def test_lane_for_action():
+    assert lane_for_action("generate_questions_fmt_3") == BATCH
+    assert lane_for_action("ask_question") == INTERACTIVE
+
+
+def test_interactive_calls_are_admitted_before_waiting_batch_calls():
+    scheduler = _scheduler()
+    order = []
+
+    async def call(name, user, action, hold=0.0):
+        async with scheduler.slot_async("m", user, action):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def main():
+        first = asyncio.create_task(call("first", 1, "ask_question", hold=0.05))
+        await asyncio.sleep(0.01)
+        batch = asyncio.create_task(call("batch", 2, "generate_questions_fmt_1"))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call("interactive", 3, "ask_question"))
+        await asyncio.gather(first, batch, interactive)
+
+    asyncio.run(main())
+    assert order == ["first", "interactive", "batch"]
+    snapshot = scheduler.snapshot()
+    assert snapshot["lanes"][BATCH]["queue_wait_ms"]["count"] == 1
+    assert snapshot["lanes"][INTERACTIVE]["admitted"] == 2
+
+
+def test_per_user_cap_lets_other_users_through():
+    scheduler = _scheduler(max_concurrent=4, per_user=1)
+    order = []
+
+    async def call(name, user, hold):
+        async with scheduler.slot_async("m", user, "ask_question"):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def main():
+        await asyncio.gather(call("a1", "a", 0.05), call("a2", "a", 0), call("b1", "b", 0))
+
+    asyncio.run(main())
+    assert order == ["a1", "b1", "a2"]
+
+
+def test_rate_limit_and_queue_timeout():
+    scheduler = _scheduler(max_concurrent=4, per_user=4, rpm=60, burst=1, queue_timeouts={INTERACTIVE: 0.05, BATCH: 0.05})
+    with scheduler.slot("m", 1, "ask_question"):
+        pass
+    with pytest.raises(LLMQueueTimeout):  # The bucket refills one call per second
+        with scheduler.slot("m", 1, "ask_question"):
+            pass
+    lane = scheduler.snapshot()["lanes"][INTERACTIVE]
+    assert (lane["timeouts"], lane["rate_limited"], lane["waiting"]) == (1, 1, 0)
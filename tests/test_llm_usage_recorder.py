@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from backend import models
+from backend.batch_writer import BatchedInsertWriter
+from backend.services import llm_usage_recorder
+
+
+def _response(prompt_tokens=12, candidate_tokens=30, finish_reason="STOP"):
+    return SimpleNamespace(
+        usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=candidate_tokens),
+        candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name=finish_reason))],
+    )
+
+
+def test_usage_rows_are_batched_with_latency_and_finish_reason(sqlite_db, monkeypatch):
+    engine, _ = sqlite_db(models.User, models.LLMTokenUsage)
+    writer = BatchedInsertWriter(
+        name="test-usage",
+        table_factory=lambda: models.LLMTokenUsage.__table__,
+        engine_factory=lambda: engine,
+        flush_interval_ms=50,
+        batch_size=10,
+        queue_max=10,
+        enqueue_timeout_ms=10,
+    )
+    monkeypatch.setattr(llm_usage_recorder, "usage_writer", writer)
+
+    assert llm_usage_recorder.record_llm_usage(
+        _response(), user_id="7", action="chat", model_name="gemini-test", latency_ms=123.4, session_id="s1"
+    )
+    assert not llm_usage_recorder.record_llm_usage(
+        _response(), user_id="anonymous", action="chat", model_name="gemini-test"
+    )
+    writer.shutdown(timeout=10)
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(models.LLMTokenUsage.__table__)).mappings().all()
+    assert len(rows) == 1
+    row = rows[0]
+    assert (row["user_id"], row["session_id"], row["total_tokens"]) == (7, "s1", 42)
+    assert (row["latency_ms"], row["finish_reason"], row["model_name"]) == (123, "STOP", "gemini-test")
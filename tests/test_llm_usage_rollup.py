@@ -0,0 +1,120 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from backend import models
+from backend.routes.llm_usage import read_llm_usage_summary
+from backend.schemas import LLMUsageGroupByEnum
+from backend.services.llm_usage_rollup import apply_usage_rollups, rebuild_usage_rollups
+
+
+def _row(user_id, action, timestamp, tokens=10, latency_ms=100, model_name="gemini"):
+    return {
+        "timestamp": timestamp, "user_id": user_id, "action": action, "model_name": model_name,
+        "input_tokens": tokens, "output_tokens": tokens, "total_tokens": 2 * tokens, "latency_ms": latency_ms,
+    }
+
+
+@pytest.fixture
+def db(sqlite_db):
+    _, Session = sqlite_db(models.User, models.LLMTokenUsage, models.LLMUsageHourly, models.LLMUsageDaily)
+    db = Session()
+    db.add_all([
+        models.User(id=1, username="alice", user_type="Teacher"),
+        models.User(id=2, username="bob", user_type="Student"),
+    ])
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_rollups_accumulate_across_batches(db):
+    conn = db.connection()
+    apply_usage_rollups(conn, [_row(1, "chat", datetime(2025, 3, 1, 9, 15)), _row(1, "chat", datetime(2025, 3, 1, 9, 45))])
+    apply_usage_rollups(conn, [_row(1, "chat", datetime(2025, 3, 1, 10, 5)), _row(2, "notes", datetime(2025, 3, 2, 8, 0))])
+    db.commit()
+
+    hourly = db.execute(select(models.LLMUsageHourly).order_by(models.LLMUsageHourly.bucket_start)).scalars().all()
+    assert [(h.bucket_start.hour, h.request_count) for h in hourly] == [(9, 2), (10, 1), (8, 1)]
+    daily = db.execute(
+        select(models.LLMUsageDaily).where(models.LLMUsageDaily.bucket_date == date(2025, 3, 1))
+    ).scalars().one()
+    assert (daily.request_count, daily.total_tokens, daily.latency_ms_total) == (3, 60, 300)
+
+
+def test_summary_groups_from_rollups(db):
+    apply_usage_rollups(db.connection(), [
+        _row(1, "chat", datetime(2025, 3, 1, 9)),
+        _row(2, "chat", datetime(2025, 3, 1, 9), tokens=5),
+        _row(2, "notes", datetime(2025, 3, 2, 9), tokens=5, latency_ms=300),
+        _row(2, "notes", datetime(2025, 3, 2, 10), tokens=0, latency_ms=None),  # Counted, but not in the average
+    ])
+    db.commit()
+    admin = models.User(id=99, username="admin", user_type="Admin")
+
+    def summary(group_by, **filters):
+        params = dict(start_date=None, end_date=None, user_id=None, action=None, model_name=None)
+        params.update(filters)
+        return read_llm_usage_summary(group_by, admin_user=admin, db=db, **params)
+
+    by_user = summary(LLMUsageGroupByEnum.user)
+    assert [(i.key, i.username, i.total_tokens, i.avg_latency_ms) for i in by_user] == [
+        ("1", "alice", 20, 100.0), ("2", "bob", 20, 200.0)
+    ]
+    by_day = summary(LLMUsageGroupByEnum.day, start_date=date(2025, 3, 2))
+    assert [(i.key, i.request_count) for i in by_day] == [("2025-03-02", 2)]
+    by_action = summary(LLMUsageGroupByEnum.action)
+    assert {i.key: i.request_count for i in by_action} == {"chat": 2, "notes": 2}
+
+
+def test_summary_has_no_average_latency_without_latency_rows(db):
+    apply_usage_rollups(db.connection(), [_row(1, "chat", datetime(2025, 3, 1, 9), latency_ms=None)])
+    db.commit()
+    admin = models.User(id=99, username="admin", user_type="Admin")
+
+    [item] = read_llm_usage_summary(
+        LLMUsageGroupByEnum.user, start_date=None, end_date=None, user_id=None, action=None, model_name=None,
+        admin_user=admin, db=db,
+    )
+    assert (item.request_count, item.avg_latency_ms) == (1, None)
+
+
+def test_rebuild_recomputes_from_raw_rows(db):
+    for i in range(3):
+        db.add(models.LLMTokenUsage(
+            user_id=1, action="chat", model_name="gemini", timestamp=datetime(2025, 3, 1, 9, i),
+            input_tokens=1, output_tokens=1, total_tokens=2,
+        ))
+    db.commit()
+
+    assert rebuild_usage_rollups(db, chunk_size=2) == 3
+    daily = db.execute(select(models.LLMUsageDaily)).scalars().one()
+    assert (daily.request_count, daily.total_tokens) == (3, 6)
+
+
+def test_portable_upsert_matches_native(db):
+    from backend.services.llm_usage_rollup import _aggregate, _upsert_portable
+
+    conn = db.connection()
+    for batch in ([_row(1, "chat", datetime(2025, 3, 1, 9, 15))],
+                  [_row(1, "chat", datetime(2025, 3, 1, 9, 45)), _row(2, "notes", datetime(2025, 3, 1, 9, 50))]):
+        hourly, daily = _aggregate(batch)
+        _upsert_portable(conn, models.LLMUsageHourly.__table__, "bucket_start", hourly)
+        _upsert_portable(conn, models.LLMUsageDaily.__table__, "bucket_date", daily)
+    db.commit()
+
+    hourly = db.execute(select(models.LLMUsageHourly).order_by(models.LLMUsageHourly.user_id)).scalars().all()
+    assert [(h.user_id, h.request_count, h.total_tokens) for h in hourly] == [(1, 2, 40), (2, 1, 20)]
+
+
+def test_rollup_failure_keeps_raw_rows(db, monkeypatch):
+    from backend.services import llm_usage_recorder, llm_usage_rollup
+
+    conn = db.connection()
+    monkeypatch.setattr(llm_usage_rollup, "apply_usage_rollups", lambda conn, rows: 1 / 0)
+    row = _row(1, "chat", datetime(2025, 3, 1, 9))
+    conn.execute(models.LLMTokenUsage.__table__.insert().values(session_id="s", **row))
+    llm_usage_recorder._update_rollups(conn, [row])
+    db.commit()
+    assert db.query(models.LLMTokenUsage).count() == 1
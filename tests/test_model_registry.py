@@ -0,0 +1,38 @@
+from backend import model_registry as registry_module
+from backend.model_registry import ModelRegistry
+
+
+class _FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeVertex:
+    def __init__(self):
+        self.inits = []
+
+    def init(self, project, location):
+        self.inits.append((project, location))
+
+
+def test_models_are_built_once_per_key(monkeypatch):
+    fake_vertex = _FakeVertex()
+    monkeypatch.setattr(registry_module, "vertexai", fake_vertex)
+    monkeypatch.setattr(registry_module, "GenerativeModel", _FakeModel)
+    registry = ModelRegistry()
+
+    first = registry.get("proj", "us-central1", "gemini")
+    assert registry.get("proj", "us-central1", "gemini") is first
+    other = registry.get("proj", "europe-west1", "gemini")
+    assert other is not first
+    assert fake_vertex.inits == [("proj", "us-central1"), ("proj", "europe-west1")]
+
+    snapshot = registry.snapshot()
+    assert snapshot["created"] == 2 and snapshot["hits"] == 1
+
+
+def test_warmup_counts_failures_without_raising(monkeypatch):
+    monkeypatch.setattr(registry_module, "GenerativeModel", None)
+    registry = ModelRegistry()
+    registry.warmup([("proj", "us-central1", "gemini")])
+    assert registry.snapshot()["warmup_errors"] == 1
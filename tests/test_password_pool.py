@@ -0,0 +1,90 @@
+from backend import utils
+from backend.password_pool import PasswordHashPool
+
+
+def test_hash_and_verify_round_trip_through_pool(monkeypatch):
+    pool = PasswordHashPool(workers=1, max_pending=2, queue_timeout=30)
+    monkeypatch.setattr(utils, "password_pool", pool)
+    try:
+        hashed = utils.hash_password("s3cret")
+        assert utils.verify_password("s3cret", hashed)
+        assert not utils.verify_password("wrong", hashed)
+    finally:
+        pool.shutdown()
+
+    snapshot = pool.snapshot()
+    assert snapshot["completed"] == 3
+    assert snapshot["pending"] == 0
+    assert snapshot["max_pending_seen"] == 1
+    assert snapshot["run_ms"]["count"] == 3
+
+
+def test_zero_workers_runs_inline():
+    pool = PasswordHashPool(workers=0, max_pending=1, queue_timeout=1)
+    assert pool.run(len, "abc") == 3
+    assert pool.snapshot()["completed"] == 0
+
+
+def test_busy_pool_is_a_503_with_retry_after():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from backend.password_pool import PasswordPoolBusyError, password_pool_busy_handler
+
+    app = FastAPI()
+    app.add_exception_handler(PasswordPoolBusyError, password_pool_busy_handler)
+
+    @app.post("/users")
+    def create_user():
+        raise PasswordPoolBusyError("saturated")
+
+    response = TestClient(app).post("/users")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_hash_password_async_round_trip(monkeypatch):
+    import asyncio
+
+    pool = PasswordHashPool(workers=1, max_pending=2, queue_timeout=30)
+    monkeypatch.setattr(utils, "password_pool", pool)
+    try:
+        hashed = asyncio.run(utils.hash_password_async("s3cret"))
+        assert utils.verify_password("s3cret", hashed)
+    finally:
+        pool.shutdown()
+    assert pool.snapshot()["completed"] == 2
+    assert pool.snapshot()["pending"] == 0
+
+
+def test_run_async_waits_for_a_slot_off_the_event_loop():
+    import asyncio
+
+    import pytest
+
+    from backend.password_pool import PasswordPoolBusyError
+
+    pool = PasswordHashPool(workers=1, max_pending=1, queue_timeout=0.3)
+    pool._slots.acquire()  # Another caller holds the only slot
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        try:
+            with pytest.raises(PasswordPoolBusyError):
+                await pool.run_async(len, "abc")
+        finally:
+            ticking.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10  # The loop kept running while the slot wait timed out
+    snapshot = pool.snapshot()
+    assert snapshot["rejected"] == 1
+    assert snapshot["waiting_for_slot"] == 0
@@ -0,0 +1,42 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from backend import models
+from backend.dependencies import decode_access_token, get_current_principal, get_current_student
+from backend.utils import create_access_token
+
+
+def test_access_token_carries_principal_claims():
+    token = create_access_token(
+        "stu", expires_delta=timedelta(minutes=5), user_type="Student", entity_id=7, section_id=3
+    )
+    token_data = decode_access_token(token)
+    assert (token_data.username, token_data.user_type, token_data.entity_id, token_data.section_id) == (
+        "stu", "Student", 7, 3
+    )
+
+
+def test_principal_prefers_claims_and_falls_back_to_profile():
+    user = models.User(id=1, username="stu", user_type="Student")
+    user.student = models.Student(id=9, user_id=1)
+
+    with_claims = create_access_token("stu", user_type="Student", entity_id=7, section_id=3)
+    principal = asyncio.run(get_current_principal(with_claims, user))
+    assert (principal.entity_id, principal.section_id) == (7, 3)
+
+    legacy = create_access_token("stu")
+    principal = asyncio.run(get_current_principal(legacy, user))
+    assert (principal.entity_id, principal.section_id) == (9, None)
+
+
+def test_role_dependency_rejects_other_roles():
+    user = models.User(id=2, username="teach", user_type="Teacher")
+    principal = asyncio.run(
+        get_current_principal(create_access_token("teach", user_type="Teacher", entity_id=4), user)
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_student(principal))
+    assert exc_info.value.status_code == 403
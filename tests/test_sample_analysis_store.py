@@ -0,0 +1,80 @@
+import pytest
+
+from backend import models, schemas
+from backend.routes import assignment_samples
+from backend.services import analysis_service
+from backend.services.analysis_service import get_stored_analysis, store_analysis
+
+
+@pytest.fixture
+def db(sqlite_db):
+    _, Session = sqlite_db(models.AssignmentSampleAnalysis)
+    db = Session()
+    yield db
+    db.close()
+
+
+def _analysis(count):
+    return schemas.QuestionAnalysisResponse(question_counts=[{"type": "single_select", "count": count}])
+
+
+def test_stored_analysis_is_reused_only_for_the_same_file(db, monkeypatch):
+    store_analysis(db, 7, "sha256-aaa", _analysis(3))
+    assert get_stored_analysis(db, 7, "sha256-aaa").question_counts[0].count == 3
+    assert get_stored_analysis(db, 7, "sha256-bbb") is None  # File replaced
+    assert get_stored_analysis(db, 7, None) is None  # Hash unknown
+
+    store_analysis(db, 7, "sha256-bbb", _analysis(5))
+    assert get_stored_analysis(db, 7, "sha256-bbb").question_counts[0].count == 5
+    assert db.query(models.AssignmentSampleAnalysis).count() == 1
+
+    monkeypatch.setattr(analysis_service, "ANALYSIS_PROMPT_VERSION", "next")
+    assert get_stored_analysis(db, 7, "sha256-bbb") is None  # Prompt changed
+
+
+def _object_keys(monkeypatch, keys):
+    """Serves content keys for gs:// objects from `keys` instead of GCS metadata."""
+    monkeypatch.setattr(assignment_samples, "content_keys", lambda gs_urls: [keys[gs_url] for gs_url in gs_urls])
+
+
+def test_content_hash_is_the_gcs_content_key(tmp_path, monkeypatch):
+    keys = {"gs://bucket/3.pdf": "gen-1"}
+    _object_keys(monkeypatch, keys)
+    monkeypatch.setattr(assignment_samples, "UPLOAD_DIR", tmp_path)
+    (tmp_path / "3.pdf").write_bytes(b"%PDF-1 local copy")  # Not what analysis reads, so ignored
+
+    assert assignment_samples._sample_content_hash(3, "gs://bucket/3.pdf") == "gen-1"
+    keys["gs://bucket/3.pdf"] = "gen-2"  # Object overwritten
+    assert assignment_samples._sample_content_hash(3, "gs://bucket/3.pdf") == "gen-2"
+    assert assignment_samples._sample_content_hash(3, "mysql://assignments/1") is None
+    assert assignment_samples._sample_content_hash(3, None) is None
+
+    monkeypatch.setattr(assignment_samples, "content_keys", lambda gs_urls: None)  # Outside GCP
+    assert assignment_samples._sample_content_hash(3, "gs://bucket/3.pdf") is None
+
+
+def test_result_is_not_stored_if_file_changed_during_analysis(db, monkeypatch):
+    monkeypatch.setattr(assignment_samples, "SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    keys = {"gs://bucket/3.pdf": "gen-1"}
+    _object_keys(monkeypatch, keys)
+    analyzed_hash = assignment_samples._sample_content_hash(3, "gs://bucket/3.pdf")
+
+    keys["gs://bucket/3.pdf"] = "gen-2"
+    assignment_samples._save_analysis(3, "gs://bucket/3.pdf", analyzed_hash, _analysis(2))
+    assert db.get(models.AssignmentSampleAnalysis, 3) is None
+
+    current_hash = assignment_samples._sample_content_hash(3, "gs://bucket/3.pdf")
+    assignment_samples._save_analysis(3, "gs://bucket/3.pdf", current_hash, _analysis(2))
+    assert get_stored_analysis(db, 3, current_hash).question_counts[0].count == 2
+
+
+def test_local_uploads_are_not_precomputed(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    queued = []
+    monkeypatch.setattr(assignment_samples, "_enqueue_analysis", lambda *args, **kwargs: queued.append(args))
+    sample = SimpleNamespace(id=3, urls=[SimpleNamespace(url="mysql://assignments/1", url_type=schemas.UrlTypeEnum.GS.value)])
+    asyncio.run(assignment_samples._precompute_analysis(None, sample, SimpleNamespace(id=1, username="t")))
+    assert queued == []
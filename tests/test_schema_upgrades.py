@@ -0,0 +1,52 @@
+from sqlalchemy import inspect, text
+
+from backend import models
+from backend.database import add_missing_columns
+
+
+def test_missing_usage_columns_are_added_once(sqlite_db):
+    engine, _ = sqlite_db()
+    with engine.begin() as conn:
+        # llm_token_usage as it was before latency_ms / finish_reason existed
+        conn.execute(text(
+            "CREATE TABLE llm_token_usage (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, session_id VARCHAR(255), "
+            "timestamp DATETIME, action VARCHAR(100) NOT NULL, model_name VARCHAR(100), "
+            "input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, total_tokens INTEGER NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO llm_token_usage (user_id, action, input_tokens, output_tokens, total_tokens) VALUES (1, 'chat', 1, 2, 3)"
+        ))
+
+    assert add_missing_columns(engine, models.Base.metadata) == [
+        "llm_token_usage.latency_ms", "llm_token_usage.finish_reason",
+    ]
+    assert add_missing_columns(engine, models.Base.metadata) == []
+
+    columns = {column["name"] for column in inspect(engine).get_columns("llm_token_usage")}
+    assert {"latency_ms", "finish_reason"} <= columns
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT latency_ms, finish_reason FROM llm_token_usage")).one() == (None, None)
+
+
+def test_tables_that_do_not_exist_yet_are_skipped(sqlite_db):
+    engine, _ = sqlite_db()
+    assert add_missing_columns(engine, models.Base.metadata) == []
+
+
+def test_rollup_latency_count_is_added_with_a_default(sqlite_db):
+    engine, _ = sqlite_db()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE llm_usage_daily (id INTEGER PRIMARY KEY, bucket_date DATE NOT NULL, user_id INTEGER NOT NULL, "
+            "action VARCHAR(100) NOT NULL, model_name VARCHAR(100) NOT NULL, request_count INTEGER NOT NULL, "
+            "input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, total_tokens INTEGER NOT NULL, "
+            "latency_ms_total INTEGER NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO llm_usage_daily (bucket_date, user_id, action, model_name, request_count, input_tokens, "
+            "output_tokens, total_tokens, latency_ms_total) VALUES ('2025-03-01', 1, 'chat', '', 1, 1, 2, 3, 40)"
+        ))
+
+    assert add_missing_columns(engine, models.Base.metadata) == ["llm_usage_daily.latency_count"]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT latency_count FROM llm_usage_daily")).scalar_one() == 0
@@ -0,0 +1,64 @@
+import time
+
+from backend.session_store import ChatSessionStore
+
+
+def _factory():
+    return object()
+
+
+def test_lru_and_per_user_cap():
+    store = ChatSessionStore(max_sessions=3, max_per_user=2, idle_ttl_seconds=0, max_bytes=0)
+    store.get_or_create(("u1", "a"), _factory)
+    store.get_or_create(("u1", "b"), _factory)
+    store.get_or_create(("u1", "c"), _factory)  # evicts u1/a (per-user cap)
+    assert ("u1", "a") not in store
+
+    store.get_or_create(("u2", "a"), _factory)
+    store.get_or_create(("u1", "b"), _factory)  # touch: u1/c is now least recently used
+    store.get_or_create(("u3", "a"), _factory)  # evicts u1/c (global LRU)
+    assert ("u1", "c") not in store
+    assert ("u1", "b") in store
+
+    snapshot = store.snapshot()
+    assert snapshot["live_sessions"] == 3
+    assert snapshot["evictions"]["per_user_cap"] == 1
+    assert snapshot["evictions"]["lru"] == 1
+
+
+def test_idle_ttl_and_byte_budget():
+    store = ChatSessionStore(max_sessions=10, max_per_user=10, idle_ttl_seconds=0.05, max_bytes=100)
+    store.get_or_create(("u1", "a"), _factory)
+    time.sleep(0.06)
+    store.get_or_create(("u1", "b"), _factory)
+    assert ("u1", "a") not in store
+    assert store.snapshot()["evictions"]["idle"] == 1
+
+    store.add_bytes(("u1", "b"), 80)
+    store.get_or_create(("u1", "c"), _factory)
+    store.add_bytes(("u1", "c"), 40)  # over budget: evicts u1/b, keeps the session just used
+    assert ("u1", "b") not in store
+    assert ("u1", "c") in store
+    snapshot = store.snapshot()
+    assert snapshot["approx_bytes"] == 40
+    assert snapshot["evictions"]["memory"] == 1
+
+
+def test_async_lock_orders_calls_within_a_session():
+    import asyncio
+
+    store = ChatSessionStore(max_sessions=10, max_per_user=10, idle_ttl_seconds=0, max_bytes=0)
+    order = []
+
+    async def call(name, delay):
+        entry = store.get_or_create(("u1", "a"), _factory)
+        async with entry.async_lock:
+            order.append(f"{name}-start")
+            await asyncio.sleep(delay)
+            order.append(f"{name}-end")
+
+    async def main():
+        await asyncio.gather(call("first", 0.02), call("second", 0))
+
+    asyncio.run(main())
+    assert order == ["first-start", "first-end", "second-start", "second-end"]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from backend.single_flight import SingleFlight, flight_key
+
+
+def test_flight_key_ignores_keyword_order():
+    assert flight_key(a=1, b=[1, 2]) == flight_key(b=[1, 2], a=1)
+    assert flight_key(a=1) != flight_key(a=2)
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"questions": 3}
+
+    async def main():
+        results = await asyncio.gather(*(flights.run("k", work) for _ in range(5)))
+        later = await flights.run("k", work)  # After completion a new call runs again
+        return results, later
+
+    results, later = asyncio.run(main())
+    assert results == [{"questions": 3}] * 5
+    assert later == {"questions": 3}
+    assert len(calls) == 2
+    snapshot = flights.snapshot()
+    assert snapshot["coalesced"] == 4 and snapshot["in_flight"] == 0
+
+
+def test_errors_reach_every_waiter_and_cancelled_waiters_do_not_cancel_the_call():
+    flights = SingleFlight("test")
+
+    async def failing():
+        await asyncio.sleep(0.02)
+        raise ValueError("model failed")
+
+    async def main():
+        first = asyncio.ensure_future(flights.run("k", failing))
+        second = asyncio.ensure_future(flights.run("k", failing))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(ValueError):
+            await second
+
+    asyncio.run(main())
+
+
+def test_no_cache_generation_does_not_join_a_cached_flight(monkeypatch):
+    from types import SimpleNamespace
+
+    from backend.routes import assignment_formats
+
+    calls = []
+
+    async def generate(**kwargs):
+        calls.append(kwargs["no_cache"])
+        await asyncio.sleep(0.02)
+        return kwargs["no_cache"]
+
+    monkeypatch.setattr(assignment_formats, "generate_assignment_questions", generate)
+    assignment_format = SimpleNamespace(id=1, name="Quiz", questions=[SimpleNamespace(question_type="short_answer", count=3)])
+
+    async def main():
+        return await asyncio.gather(*(
+            assignment_formats._generate_from_format(assignment_format, ["gs://b/l.pdf"], 7, "s", no_cache)
+            for no_cache in (False, True, True)
+        ))
+
+    assert asyncio.run(main()) == [False, True, True]
+    assert sorted(calls) == [False, True]  # The two regenerate requests still share one call
@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+from backend.sse import sse_event
+
+
+def test_sse_event_keeps_multiline_text_in_one_data_line():
+    event = sse_event("token", {"text": "line one\nline two"})
+    assert event.startswith("event: token\ndata: ")
+    assert event.endswith("\n\n")
+    data_line = event.split("\n")[1]
+    assert json.loads(data_line[len("data: "):]) == {"text": "line one\nline two"}
+
+
+def test_stream_events_reports_errors_and_closes_source():
+    from backend.routes.virtual_teacher import _stream_events
+
+    closed = []
+
+    async def chunks():
+        try:
+            yield "Hello"
+            raise RuntimeError("model failed")
+        finally:
+            closed.append(True)
+
+    async def collect():
+        return [event async for event in _stream_events(chunks(), "ask_question")]
+
+    events = asyncio.run(collect())
+    assert events[0].startswith("event: token")
+    assert events[-1].startswith("event: error")
+    assert closed == [True]